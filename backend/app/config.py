@@ -24,6 +24,12 @@ class Settings:
     UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "./uploads")
     MAX_UPLOAD_SIZE_MB: int = int(os.getenv("MAX_UPLOAD_SIZE_MB", "50"))
 
+    # Background jobs
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_STALE_SECONDS: int = int(os.getenv("JOB_STALE_SECONDS", "600"))
+    # How often the stats rollup is reconciled against the tables (0 = never)
+    STATS_RECONCILE_SECONDS: int = int(os.getenv("STATS_RECONCILE_SECONDS", "3600"))
+
     # Gemini API (optional)
     GEMINI_API_KEY: str | None = os.getenv("GEMINI_API_KEY")
 
@@ -34,6 +40,16 @@ class Settings:
     OPENAI_API_KEY: str | None = os.getenv("OPENAI_API_KEY")
     ANTHROPIC_API_KEY: str | None = os.getenv("ANTHROPIC_API_KEY")
 
+    # Insight summarization: "anthropic", or "fake" (no API calls) for load tests
+    SUMMARY_BACKEND: str = os.getenv("SUMMARY_BACKEND", "anthropic")
+    SUMMARY_FAKE_LATENCY_SECONDS: float = float(os.getenv("SUMMARY_FAKE_LATENCY_SECONDS", "1.0"))
+    SUMMARY_CONCURRENCY: int = int(os.getenv("SUMMARY_CONCURRENCY", "5"))
+    SUMMARY_RATE_PER_MINUTE: float = float(os.getenv("SUMMARY_RATE_PER_MINUTE", "50"))
+    SUMMARY_TIMEOUT_SECONDS: float = float(os.getenv("SUMMARY_TIMEOUT_SECONDS", "30"))
+    SUMMARY_MAX_RETRIES: int = int(os.getenv("SUMMARY_MAX_RETRIES", "3"))
+    # Stored summaries no longer served are deleted after this many days unused
+    SUMMARY_RETENTION_DAYS: int = int(os.getenv("SUMMARY_RETENTION_DAYS", "30"))
+
     # Environment
     ENVIRONMENT: str = os.getenv("ENVIRONMENT", "development")
 
@@ -0,0 +1,204 @@
+"""
+Dialect-native bulk loading for the claims and anomaly_flags tables.
+
+Each loader takes a validated DataFrame chunk and returns how many rows
+were actually inserted. Deduplication on claim_id happens in the database
+(ON CONFLICT (claim_id) DO NOTHING), so callers never hold the set of
+existing claim_ids in memory.
+
+insert_flags() writes scored anomalies the same way: Core executemany in
+fixed-size chunks, ignoring claims that are already flagged, and adds
+what it inserted to the pipeline_stats rollup (or to the caller's
+StatsDelta, for writers that apply it just before committing).
+"""
+
+import io
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+
+import pandas as pd
+from sqlalchemy import insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.db.models import Claim, AnomalyFlag
+from app.services.stats_service import StatsDelta, record_flags
+
+LOAD_COLUMNS = [
+    "claim_id", "patient_id", "provider_id", "cpt_code", "icd10_code",
+    "billed_amount", "allowed_amount", "paid_amount", "service_date", "claim_status",
+]
+
+FLAG_INSERT_CHUNK = 10_000
+
+_UPSERT_DIALECTS = {"sqlite": sqlite, "postgresql": postgresql}
+
+
+class ClaimBulkLoader(ABC):
+    """Base loader — subclasses implement load() for one SQL dialect."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    @abstractmethod
+    def load(self, df: pd.DataFrame) -> int:
+        """Insert a chunk, skipping existing claim_ids. Returns rows inserted."""
+
+
+class SQLiteClaimLoader(ClaimBulkLoader):
+    """INSERT ... ON CONFLICT (claim_id) DO NOTHING via a single executemany per chunk."""
+
+    def load(self, df: pd.DataFrame) -> int:
+        conn = self.db.connection()
+        created_at_type = Claim.__table__.c.created_at.type.dialect_impl(conn.dialect)
+        created_at = created_at_type.bind_processor(conn.dialect)(datetime.now(timezone.utc))
+
+        columns = LOAD_COLUMNS + ["created_at"]
+        placeholders = ", ".join("?" for _ in columns)
+        # Only claim_id conflicts are skipped (SQLite 3.24+); unlike INSERT OR
+        # IGNORE, NOT NULL / CHECK violations still raise
+        sql = (
+            f"INSERT INTO claims ({', '.join(columns)}) "
+            f"VALUES ({placeholders}) ON CONFLICT (claim_id) DO NOTHING"
+        )
+
+        values = [
+            df["service_date"].dt.strftime("%Y-%m-%d").tolist()
+            if col == "service_date" else df[col].tolist()
+            for col in LOAD_COLUMNS
+        ]
+        rows = [(*row, created_at) for row in zip(*values)]
+        result = conn.exec_driver_sql(sql, rows)
+        return max(result.rowcount, 0)
+
+
+class PostgresClaimLoader(ClaimBulkLoader):
+    """COPY into a temp staging table, then INSERT ... ON CONFLICT DO NOTHING."""
+
+    STAGING_TABLE = "claims_staging"
+
+    def load(self, df: pd.DataFrame) -> int:
+        columns = ", ".join(LOAD_COLUMNS)
+        dbapi_conn = self.db.connection().connection.dbapi_connection
+
+        buf = io.StringIO()
+        df.to_csv(buf, columns=LOAD_COLUMNS, index=False, header=False, date_format="%Y-%m-%d")
+        buf.seek(0)
+
+        with dbapi_conn.cursor() as cur:
+            cur.execute(
+                f"CREATE TEMP TABLE IF NOT EXISTS {self.STAGING_TABLE} "
+                "(claim_id text, patient_id text, provider_id text, cpt_code text, "
+                "icd10_code text, billed_amount double precision, "
+                "allowed_amount double precision, paid_amount double precision, "
+                "service_date date, claim_status text) ON COMMIT DELETE ROWS"
+            )
+            cur.copy_expert(
+                f"COPY {self.STAGING_TABLE} ({columns}) FROM STDIN WITH (FORMAT csv)", buf
+            )
+            cur.execute(
+                f"INSERT INTO claims ({columns}, created_at) "
+                f"SELECT {columns}, %s FROM {self.STAGING_TABLE} "
+                "ON CONFLICT (claim_id) DO NOTHING",
+                (datetime.now(timezone.utc),),
+            )
+            inserted = cur.rowcount
+            cur.execute(f"TRUNCATE {self.STAGING_TABLE}")
+        return max(inserted, 0)
+
+
+_LOADERS: dict[str, type[ClaimBulkLoader]] = {
+    "sqlite": SQLiteClaimLoader,
+    "postgresql": PostgresClaimLoader,
+}
+
+
+def register_claim_loader(dialect: str, loader: type[ClaimBulkLoader]):
+    """Register a bulk loader for an additional SQL dialect."""
+    _LOADERS[dialect] = loader
+
+
+def get_claim_loader(db: Session) -> ClaimBulkLoader:
+    """Return the bulk loader matching the session's database dialect."""
+    dialect = db.get_bind().dialect.name
+    if dialect not in _LOADERS:
+        raise ValueError(f"No claims bulk loader registered for dialect '{dialect}'")
+    return _LOADERS[dialect](db)
+
+
+def _claim_attributes(db: Session, claim_ids: list[str]) -> dict[str, tuple]:
+    """claim_id -> (provider_id, cpt_code, service_date) for one bounded chunk."""
+    rows = db.execute(
+        select(Claim.claim_id, Claim.provider_id, Claim.cpt_code, Claim.service_date)
+        .where(Claim.claim_id.in_(claim_ids))
+    )
+    return {claim_id: attrs for claim_id, *attrs in rows}
+
+
+def insert_flags(
+    db: Session,
+    claim_ids: list[str],
+    scores: list[float],
+    reasons: list[str],
+    flagged_at: datetime | None = None,
+    provider_ids: list[str] | None = None,
+    cpt_codes: list[str] | None = None,
+    service_dates: list | None = None,
+    stats: StatsDelta | None = None,
+) -> int:
+    """
+    Insert anomaly flags, skipping claims that already have one.
+
+    Rows go in as Core executemany batches of FLAG_INSERT_CHUNK with
+    ON CONFLICT (claim_id) DO NOTHING, so re-scoring a claim is
+    idempotent. RETURNING reports exactly which scores were inserted,
+    and that delta is added to the stats rollup in the same transaction,
+    or to ``stats`` when given. Returns the number of flags inserted.
+
+    Each flag carries its claim's provider_id, cpt_code and service_date.
+    Callers that already hold them (the scorers) pass them in; otherwise
+    they are looked up one chunk at a time.
+    """
+    attributes_given = provider_ids is not None and cpt_codes is not None and service_dates is not None
+    flagged_at = flagged_at or datetime.now(timezone.utc)
+    dialect = db.get_bind().dialect.name
+    upsert = dialect in _UPSERT_DIALECTS
+    if upsert:
+        stmt = _UPSERT_DIALECTS[dialect].insert(AnomalyFlag).on_conflict_do_nothing(
+            index_elements=["claim_id"]
+        ).returning(AnomalyFlag.anomaly_score)
+    else:
+        stmt = insert(AnomalyFlag)
+
+    conn = db.connection()
+    inserted = 0
+    score_sum = 0.0
+    for start in range(0, len(claim_ids), FLAG_INSERT_CHUNK):
+        end = start + FLAG_INSERT_CHUNK
+        chunk_ids = claim_ids[start:end]
+        if attributes_given:
+            attributes = zip(provider_ids[start:end], cpt_codes[start:end], service_dates[start:end])
+        else:
+            lookup = _claim_attributes(db, chunk_ids)
+            attributes = (lookup.get(claim_id, (None, None, None)) for claim_id in chunk_ids)
+        rows = [
+            {"claim_id": claim_id, "anomaly_score": score, "flag_reason": reason,
+             "reviewed": False, "flagged_at": flagged_at,
+             "provider_id": provider_id, "cpt_code": cpt_code, "service_date": service_date}
+            for claim_id, score, reason, (provider_id, cpt_code, service_date)
+            in zip(chunk_ids, scores[start:end], reasons[start:end], attributes)
+        ]
+        result = conn.execute(stmt, rows)
+        if upsert:
+            inserted_scores = result.scalars().all()
+            inserted += len(inserted_scores)
+            score_sum += sum(inserted_scores)
+        else:
+            inserted += max(result.rowcount, 0)
+            score_sum += sum(row["anomaly_score"] for row in rows)
+
+    if stats is not None:
+        stats.add_flags(inserted, score_sum)
+    else:
+        record_flags(db, inserted, score_sum)
+    return inserted
@@ -0,0 +1,232 @@
+"""
+Schema Migrations
+
+Versioned, forward-only schema changes for the claims pipeline tables.
+Applied versions are recorded in schema_migrations; on startup (and via
+the CLI) every pending migration runs in order, each in its own
+transaction together with its schema_migrations row.
+
+Migration 1 creates any missing tables from the ORM models, so a new
+database reaches the current schema in one step. Later migrations bring
+databases created by older releases up to date. Each migration checks
+what already exists (columns via the inspector, indexes with IF NOT
+EXISTS), so it is safe on both new and old databases and harmless if
+two workers race at startup. On PostgreSQL the run also holds an
+advisory lock.
+
+Data backfills that are too large for one startup transaction run
+separately, in batches (see the backfill command).
+
+Usage (from backend/):
+    python -m app.db.migrations             # apply pending migrations
+    python -m app.db.migrations status      # list applied / pending
+    python -m app.db.migrations backfill    # copy claim attributes onto legacy flags
+"""
+
+import argparse
+from datetime import datetime, timezone
+from typing import Callable
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from app.db.database import Base
+
+# Arbitrary constant identifying this app's migration lock
+PG_LOCK_KEY = 7_310_419
+
+_meta = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _meta,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+# ── Helpers ──────────────────────────────────────────────────────
+
+def _columns(conn: Connection, table: str) -> set[str]:
+    return {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+def _indexes(conn: Connection, table: str) -> dict[str, dict]:
+    return {ix["name"]: ix for ix in inspect(conn).get_indexes(table)}
+
+
+def _add_column(conn: Connection, table: str, column: str, ddl_type: str):
+    if column not in _columns(conn, table):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+
+def _create_index(conn: Connection, name: str, table: str, columns: str, where: str | None = None, unique: bool = False):
+    sql = f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({columns})"
+    if where:
+        sql += f" WHERE {where}"
+    conn.execute(text(sql))
+
+
+# ── Migrations ───────────────────────────────────────────────────
+
+def _create_tables(conn: Connection):
+    from app.db import models  # noqa: F401 — register every model on Base
+    Base.metadata.create_all(bind=conn)
+
+
+def _claim_scoring_state(conn: Connection):
+    # Incremental scoring: stamp + model version, partial index over unscored ids
+    _add_column(conn, "claims", "scored_at", "TIMESTAMP")
+    _add_column(conn, "claims", "model_version", "VARCHAR")
+    _create_index(conn, "ix_claims_unscored", "claims", "id", where="scored_at IS NULL")
+
+
+def _unique_flag_per_claim(conn: Connection):
+    # Flag writers rely on ON CONFLICT (claim_id); keep the first flag per claim
+    existing = _indexes(conn, "anomaly_flags").get("ix_anomaly_flags_claim_id")
+    if existing and existing["unique"]:
+        return
+    conn.execute(text(
+        "DELETE FROM anomaly_flags WHERE id NOT IN "
+        "(SELECT MIN(id) FROM anomaly_flags GROUP BY claim_id)"
+    ))
+    if existing:
+        conn.execute(text("DROP INDEX ix_anomaly_flags_claim_id"))
+    _create_index(conn, "ix_anomaly_flags_claim_id", "anomaly_flags", "claim_id", unique=True)
+
+
+def _review_queue_indexes(conn: Connection):
+    # Keyset pagination of GET /api/anomalies, with and without ?reviewed=
+    _create_index(conn, "ix_anomaly_flags_reviewed_score", "anomaly_flags", "reviewed, anomaly_score, id")
+    _create_index(conn, "ix_anomaly_flags_score", "anomaly_flags", "anomaly_score, id")
+    _create_index(conn, "ix_anomaly_flags_flagged_at", "anomaly_flags", "flagged_at, id")
+    _create_index(conn, "ix_anomaly_flags_reviewed_flagged_at", "anomaly_flags", "reviewed, flagged_at, id")
+    # min/max(service_date) for /api/anomalies/stats
+    _create_index(conn, "ix_claims_service_date", "claims", "service_date")
+
+
+def _pipeline_stats(conn: Connection):
+    # O(1) rollup for /metrics and /api/anomalies/stats, seeded from the tables
+    from app.db.models import PipelineStats
+    PipelineStats.__table__.create(bind=conn, checkfirst=True)
+    conn.execute(text(
+        "INSERT INTO pipeline_stats (id, claims_total, flags_total, flags_reviewed, flag_score_sum, "
+        "service_date_min, service_date_max, updated_at, reconciled_at) "
+        "SELECT 1, c.n, f.n, COALESCE(f.reviewed, 0), COALESCE(f.score_sum, 0), c.date_min, c.date_max, "
+        "CURRENT_TIMESTAMP, CURRENT_TIMESTAMP "
+        "FROM (SELECT COUNT(*) AS n, MIN(service_date) AS date_min, MAX(service_date) AS date_max "
+        "      FROM claims) c, "
+        "     (SELECT COUNT(*) AS n, SUM(CASE WHEN reviewed THEN 1 ELSE 0 END) AS reviewed, "
+        "      SUM(anomaly_score) AS score_sum FROM anomaly_flags) f "
+        "WHERE NOT EXISTS (SELECT 1 FROM pipeline_stats WHERE id = 1)"
+    ))
+
+
+def _flag_claim_attributes(conn: Connection):
+    # Denormalized claim attributes on flags; existing rows are filled by
+    # the flag_backfill job (or: python -m app.db.migrations backfill)
+    _add_column(conn, "anomaly_flags", "provider_id", "VARCHAR")
+    _add_column(conn, "anomaly_flags", "cpt_code", "VARCHAR")
+    _add_column(conn, "anomaly_flags", "service_date", "DATE")
+    _create_index(conn, "ix_anomaly_flags_provider_score", "anomaly_flags", "provider_id, anomaly_score")
+    _create_index(conn, "ix_anomaly_flags_cpt_score", "anomaly_flags", "cpt_code, anomaly_score")
+    _create_index(conn, "ix_anomaly_flags_service_date", "anomaly_flags", "service_date")
+
+
+def _provider_summaries(conn: Connection):
+    # Persistent, content-addressed insight summaries shared by all workers
+    from app.db.models import ProviderSummary
+    ProviderSummary.__table__.create(bind=conn, checkfirst=True)
+
+
+def _provider_stats(conn: Connection):
+    # Incremental Layer 3 rollup, seeded from the scored claims. Every
+    # provider starts unflagged, so the first provider refresh judges them
+    # all and backfills the anomalous ones (existing flags are kept).
+    from app.db.models import ProviderStats
+    ProviderStats.__table__.create(bind=conn, checkfirst=True)
+    conn.execute(text(
+        "INSERT INTO provider_stats (provider_id, claim_count, billed_sum, ratio_sum, ratio_sumsq, "
+        "flagged, updated_at) "
+        "SELECT provider_id, COUNT(*), SUM(billed_amount), SUM(r.ratio), SUM(r.ratio * r.ratio), "
+        "FALSE, CURRENT_TIMESTAMP "
+        "FROM (SELECT provider_id, billed_amount, "
+        "      CASE WHEN allowed_amount > 0 THEN billed_amount / allowed_amount ELSE 1.0 END AS ratio "
+        "      FROM claims WHERE scored_at IS NOT NULL) r "
+        "WHERE NOT EXISTS (SELECT 1 FROM provider_stats) "
+        "GROUP BY provider_id"
+    ))
+
+
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "create_tables", _create_tables),
+    (2, "claim_scoring_state", _claim_scoring_state),
+    (3, "unique_flag_per_claim", _unique_flag_per_claim),
+    (4, "review_queue_indexes", _review_queue_indexes),
+    (5, "pipeline_stats", _pipeline_stats),
+    (6, "flag_claim_attributes", _flag_claim_attributes),
+    (7, "provider_summaries", _provider_summaries),
+    (8, "provider_stats", _provider_stats),
+]
+
+
+# ── Runner ───────────────────────────────────────────────────────
+
+def applied_versions(engine: Engine) -> set[int]:
+    with engine.connect() as conn:
+        if not inspect(conn).has_table("schema_migrations"):
+            return set()
+        return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def run_migrations(engine: Engine) -> list[str]:
+    """Apply every pending migration in order; returns the names applied."""
+    _meta.create_all(bind=engine)
+    applied = []
+    for version, name, migrate in MIGRATIONS:
+        with engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PG_LOCK_KEY})
+            done = conn.execute(
+                select(schema_migrations.c.version).where(schema_migrations.c.version == version)
+            ).first()
+            if done:
+                continue
+            migrate(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=version, name=name, applied_at=datetime.now(timezone.utc),
+            ))
+            applied.append(name)
+    return applied
+
+
+def main():
+    from app.db.database import engine
+
+    parser = argparse.ArgumentParser(description="Apply or inspect schema migrations.")
+    parser.add_argument("command", nargs="?", choices=["upgrade", "status", "backfill"], default="upgrade")
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        from app.db.database import SessionLocal
+        from app.services.claim_analysis_service import backfill_flag_attributes
+
+        db = SessionLocal()
+        try:
+            result = backfill_flag_attributes(db)
+        finally:
+            db.close()
+        print(f"Backfilled {result['flags_updated']:,} flags.")
+        return
+
+    if args.command == "status":
+        done = applied_versions(engine)
+        for version, name, _ in MIGRATIONS:
+            print(f"{version:>4}  {'applied' if version in done else 'pending':<8} {name}")
+        return
+
+    applied = run_migrations(engine)
+    print(f"Applied: {', '.join(applied)}" if applied else "Schema is up to date.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
-"""SQLAlchemy ORM models for audit logging, claims, and anomaly flags."""
+"""
+SQLAlchemy ORM models for audit logging, claims, anomaly flags, stats, and background jobs.
 
-from sqlalchemy import Column, String, DateTime, Integer, Float, Boolean, ForeignKey, Date
+Schema changes to existing tables also need a migration in app/db/migrations.py.
+"""
+
+from sqlalchemy import Column, String, DateTime, Integer, BigInteger, Float, Boolean, ForeignKey, Date, Text, Index, text
 from datetime import datetime, timezone
 from app.db.database import Base
 
@@ -36,18 +40,139 @@ class Claim(Base):
     billed_amount = Column(Float, nullable=False)
     allowed_amount = Column(Float, nullable=False)
     paid_amount = Column(Float, nullable=False)
-    service_date = Column(Date, nullable=False)
+    service_date = Column(Date, nullable=False, index=True)
     claim_status = Column(String, nullable=False)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    scored_at = Column(DateTime, nullable=True)
+    model_version = Column(String, nullable=True)
+
+    __table_args__ = (
+        # Partial index: only unscored claims, so the incremental scoring
+        # query stays proportional to new data rather than table size.
+        Index(
+            "ix_claims_unscored", "id",
+            sqlite_where=text("scored_at IS NULL"),
+            postgresql_where=text("scored_at IS NULL"),
+        ),
+    )
 
 
 class AnomalyFlag(Base):
     __tablename__ = "anomaly_flags"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    claim_id = Column(String, ForeignKey("claims.claim_id"), nullable=False, index=True)
+    # One flag per claim; flag writers rely on ON CONFLICT (claim_id)
+    claim_id = Column(String, ForeignKey("claims.claim_id"), nullable=False, unique=True, index=True)
     anomaly_score = Column(Float, nullable=False)
     flag_reason = Column(String, nullable=False)
     reviewed = Column(Boolean, default=False, nullable=False)
     flagged_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    # Copied from the claim at write time so rollups need no join
+    # (NULL only on legacy rows until backfill_flag_attributes runs)
+    provider_id = Column(String, nullable=True)
+    cpt_code = Column(String, nullable=True)
+    service_date = Column(Date, nullable=True)
+
+    __table_args__ = (
+        # Keyset pagination of the review queue (see flag_query_service)
+        Index("ix_anomaly_flags_reviewed_score", "reviewed", "anomaly_score", "id"),
+        Index("ix_anomaly_flags_score", "anomaly_score", "id"),
+        Index("ix_anomaly_flags_flagged_at", "flagged_at", "id"),
+        Index("ix_anomaly_flags_reviewed_flagged_at", "reviewed", "flagged_at", "id"),
+        # Provider / CPT rollups and per-provider worst-first retrieval
+        Index("ix_anomaly_flags_provider_score", "provider_id", "anomaly_score"),
+        Index("ix_anomaly_flags_cpt_score", "cpt_code", "anomaly_score"),
+        Index("ix_anomaly_flags_service_date", "service_date"),
+    )
+
+
+class PipelineStats(Base):
+    """
+    Single-row rollup of claim and flag totals (id is always 1).
+
+    Writers apply deltas in the same transaction as the rows they add or
+    change; reconcile_stats() recomputes it from the source tables.
+    """
+    __tablename__ = "pipeline_stats"
+
+    id = Column(Integer, primary_key=True)
+    claims_total = Column(BigInteger, default=0, nullable=False)
+    flags_total = Column(BigInteger, default=0, nullable=False)
+    flags_reviewed = Column(BigInteger, default=0, nullable=False)
+    flag_score_sum = Column(Float, default=0.0, nullable=False)
+    service_date_min = Column(Date, nullable=True)
+    service_date_max = Column(Date, nullable=True)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    reconciled_at = Column(DateTime, nullable=True)
+
+
+class ProviderStats(Base):
+    """
+    Layer 3 sufficient statistics for one provider's scored claims.
+
+    Batch scoring adds each batch's sums in the transaction that stamps
+    the claims scored; refresh_provider_flags() judges providers from
+    these rows and records the verdict in ``flagged``. reconcile_stats()
+    rebuilds the sums from the claims table.
+    """
+    __tablename__ = "provider_stats"
 
+    provider_id = Column(String, primary_key=True)
+    claim_count = Column(BigInteger, default=0, nullable=False)
+    billed_sum = Column(Float, default=0.0, nullable=False)
+    ratio_sum = Column(Float, default=0.0, nullable=False)
+    ratio_sumsq = Column(Float, default=0.0, nullable=False)
+    flagged = Column(Boolean, default=False, nullable=False)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class ProviderSummary(Base):
+    """
+    A generated provider insight, content-addressed by what produced it.
+
+    A row is reused as long as the provider's flag_hash (see
+    ml.summarizer.flag_set_hash), the prompt template version and the
+    model all match, so unchanged providers are never re-summarized.
+    is_current / rank mark the set last generated, which GET
+    /api/insights serves to every worker. used_at is refreshed whenever
+    a row is served; rows unused for SUMMARY_RETENTION_DAYS are pruned.
+    """
+    __tablename__ = "provider_summaries"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    provider_id = Column(String, nullable=False)
+    flag_hash = Column(String(64), nullable=False)
+    prompt_version = Column(Integer, nullable=False)
+    model = Column(String, nullable=False)
+    summary = Column(Text, nullable=False)
+    claim_count = Column(Integer, nullable=False)
+    avg_anomaly_score = Column(Float, nullable=False)
+    source = Column(String, nullable=False)
+    generated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    used_at = Column(DateTime, nullable=True)
+    is_current = Column(Boolean, default=False, nullable=False)
+    rank = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        Index("ux_provider_summaries_key", "provider_id", "flag_hash", "prompt_version", "model", unique=True),
+        Index("ix_provider_summaries_current", "is_current", "rank"),
+    )
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(String, primary_key=True)
+    kind = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="queued", index=True)
+    phase = Column(String, nullable=True)
+    rows_processed = Column(Integer, default=0, nullable=False)
+    rows_total = Column(Integer, nullable=True)
+    params = Column(Text, nullable=True)
+    result = Column(Text, nullable=True)
+    error = Column(String, nullable=True)
+    cancel_requested = Column(Boolean, default=False, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    started_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    finished_at = Column(DateTime, nullable=True)
@@ -8,9 +8,11 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import settings
-from app.db.database import engine, Base
-from app.db.models import Claim, AnomalyFlag  # noqa: F401 — ensure models are registered
-from app.routers import upload, risk, fraud, anomaly, forecast, payment_plan, audit, auth, ingest, analyze, summarize, metrics
+from app.db.database import SessionLocal, engine
+from app.db.migrations import run_migrations
+from app.routers import upload, risk, fraud, anomaly, forecast, payment_plan, audit, auth, ingest, analyze, summarize, metrics, jobs, score
+from app.services.job_service import recover_jobs, submit_unique_job
+from app.services.stats_service import start_stats_reconciler
 
 app = FastAPI(
     title="ClearCollect AI",
@@ -18,10 +20,36 @@ app = FastAPI(
     version="1.0.0",
 )
 
-# Auto-create tables on startup
+# Create tables and apply pending schema migrations on startup
 @app.on_event("startup")
-def create_tables():
-    Base.metadata.create_all(bind=engine)
+def migrate_schema():
+    applied = run_migrations(engine)
+    if "flag_claim_attributes" in applied:
+        # Existing flags get provider/CPT/date in the background
+        db = SessionLocal()
+        try:
+            submit_unique_job(db, "flag_backfill")
+        finally:
+            db.close()
+
+
+# Load and compile the anomaly model once so it is off the request path
+@app.on_event("startup")
+def warm_detector():
+    from ml.serving import get_realtime_scorer
+    get_realtime_scorer()
+
+
+# Resume background jobs interrupted by a restart
+@app.on_event("startup")
+def resume_jobs():
+    recover_jobs()
+
+
+# Periodically correct any drift in the stats rollup
+@app.on_event("startup")
+def schedule_stats_reconcile():
+    start_stats_reconciler()
 
 # CORS — allow frontend dev server
 app.add_middleware(
@@ -44,6 +72,8 @@ app.include_router(audit.router, prefix="/api/audit", tags=["Audit & Security"])
 app.include_router(ingest.router, prefix="/api/ingest", tags=["Data Ingestion"])
 app.include_router(analyze.router, prefix="/api", tags=["ML Analysis"])
 app.include_router(summarize.router, prefix="/api/insights", tags=["AI Insights"])
+app.include_router(score.router, prefix="/api/score", tags=["ML Analysis"])
+app.include_router(jobs.router, prefix="/api/jobs", tags=["Background Jobs"])
 app.include_router(metrics.router, tags=["Observability"])
 
 
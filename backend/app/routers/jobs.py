@@ -0,0 +1,48 @@
+"""
+Background job endpoints.
+
+GET  /api/jobs              — recent jobs
+GET  /api/jobs/{id}         — phase, rows processed, throughput and ETA
+POST /api/jobs/{id}/cancel  — request cancellation
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.db.database import get_db
+from app.db.models import Job
+from app.services.job_service import job_to_dict, request_cancel
+
+router = APIRouter()
+
+
+@router.get("/")
+def list_jobs(
+    limit: int = Query(20, ge=1, le=100),
+    status: str | None = None,
+    db: Session = Depends(get_db),
+):
+    """Return the most recently created jobs."""
+    query = db.query(Job)
+    if status:
+        query = query.filter(Job.status == status)
+    jobs = query.order_by(Job.created_at.desc()).limit(limit).all()
+    return {"jobs": [job_to_dict(j) for j in jobs]}
+
+
+@router.get("/{job_id}")
+def get_job(job_id: str, db: Session = Depends(get_db)):
+    """Return the current state of a background job."""
+    job = db.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_to_dict(job)
+
+
+@router.post("/{job_id}/cancel")
+def cancel_job(job_id: str, db: Session = Depends(get_db)):
+    """Request cancellation. Running jobs stop at their next checkpoint."""
+    job = db.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_to_dict(request_cancel(db, job))
@@ -1,17 +1,22 @@
 """
 Prometheus-compatible metrics endpoint.
 
+Claim and flag figures come from the pipeline_stats rollup (one row
+read per scrape, not table aggregates).
+
 Exposes: claims_ingested_total, anomalies_flagged_total, flagged_percentage,
-avg_anomaly_score, and summarization_latency_seconds.
+avg_anomaly_score, and summarization_latency_seconds, followed by this
+process's detector telemetry (anomaly_layer_seconds, anomaly_layer_rows_total,
+anomaly_cpt_model_seconds, anomaly_cpt_model_rows_total; see ml/telemetry.py).
 """
 
 from fastapi import APIRouter, Depends
 from fastapi.responses import PlainTextResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 
 from app.db.database import get_db
-from app.db.models import Claim, AnomalyFlag
+from app.services.stats_service import get_stats
+from ml import telemetry
 
 router = APIRouter()
 
@@ -19,12 +24,12 @@ router = APIRouter()
 @router.get("/metrics", response_class=PlainTextResponse)
 def prometheus_metrics(db: Session = Depends(get_db)):
     """Return Prometheus-format metrics."""
-    total_claims = db.query(func.count(Claim.id)).scalar() or 0
-    total_flagged = db.query(func.count(AnomalyFlag.id)).scalar() or 0
+    stats = get_stats(db)
+    total_claims = stats.claims_total
+    total_flagged = stats.flags_total
     flagged_pct = round(total_flagged / total_claims * 100, 2) if total_claims else 0
-    avg_score = db.query(func.avg(AnomalyFlag.anomaly_score)).scalar()
-    avg_score_val = round(float(avg_score), 4) if avg_score else 0
-    reviewed = db.query(func.count(AnomalyFlag.id)).filter(AnomalyFlag.reviewed == True).scalar() or 0
+    avg_score_val = round(stats.flag_score_sum / total_flagged, 4) if total_flagged else 0
+    reviewed = stats.flags_reviewed
 
     # Import summarization latency
     try:
@@ -58,6 +63,7 @@ def prometheus_metrics(db: Session = Depends(get_db)):
         "# TYPE summarization_latency_seconds gauge",
         f"summarization_latency_seconds {latency}",
         "",
+        telemetry.render(),
     ]
 
     return "\n".join(lines)
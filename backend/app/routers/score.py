@@ -0,0 +1,37 @@
+"""
+Real-time scoring endpoint.
+
+POST /api/score — score one or a few claims at submission time
+
+Runs Layer 1 (in-request duplicates, CPT/ICD-10 mismatch) and Layer 2
+(per-CPT Isolation Forest) against compiled forests held in memory.
+Nothing is written to the database; Layer 3 needs a provider's history
+and is left to POST /api/analyze.
+"""
+
+import time
+
+from fastapi import APIRouter, HTTPException
+
+from app.schemas.claims import ScoreRequest, ScoreResponse
+from ml.serving import get_realtime_scorer
+
+router = APIRouter()
+
+
+@router.post("/", response_model=ScoreResponse)
+def score_claims(request: ScoreRequest):
+    """Score submitted claims without persisting them."""
+    scorer = get_realtime_scorer()
+    if scorer is None:
+        raise HTTPException(status_code=503, detail="No trained model. Run POST /api/analyze first.")
+
+    start = time.perf_counter()
+    results = scorer.score([claim.model_dump() for claim in request.claims])
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        "model_version": scorer.version,
+        "scoring_ms": round(elapsed_ms, 3),
+        "results": results,
+    }
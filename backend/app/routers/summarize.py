@@ -2,24 +2,21 @@
 Insights endpoints — LLM-generated provider summaries.
 
 POST /api/insights/generate — generate summaries from current anomaly flags
-GET  /api/insights          — return cached summaries
+GET  /api/insights          — return the latest stored summaries
 """
 
 import time
-from collections import defaultdict
 
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
 from app.db.database import get_db
-from app.db.models import AnomalyFlag, Claim
 from app.config import settings
+from app.services import insights_service
 
 router = APIRouter()
 
-# In-memory cache for generated summaries (persists across requests)
-_cached_summaries: list[dict] = []
-_last_generation_time: float | None = None
+# Latency of this worker's last generation run (summaries themselves live in provider_summaries)
 _last_latency: float | None = None
 
 
@@ -30,64 +27,57 @@ def get_summarization_latency() -> float | None:
 
 @router.post("/generate")
 def generate_insights(db: Session = Depends(get_db)):
-    """Generate AI summaries grouped by provider from current anomaly flags."""
-    global _cached_summaries, _last_generation_time, _last_latency
-    from ml.summarizer import generate_summaries
-
-    flags = db.query(AnomalyFlag).all()
-    if not flags:
-        raise HTTPException(status_code=404, detail="No anomaly flags found. Run /api/analyze first.")
-
-    # Group by provider via claim lookup
-    claim_map = {}
-    claim_ids = [f.claim_id for f in flags]
-    claims = db.query(Claim).filter(Claim.claim_id.in_(claim_ids)).all()
-    for c in claims:
-        claim_map[c.claim_id] = c.provider_id
-
-    grouped: dict[str, list[dict]] = defaultdict(list)
-    for f in flags:
-        provider = claim_map.get(f.claim_id, "UNKNOWN")
-        grouped[provider].append({
-            "claim_id": f.claim_id,
-            "anomaly_score": f.anomaly_score,
-            "flag_reason": f.flag_reason,
-            "reviewed": f.reviewed,
-        })
-
-    # Sort providers by total flags descending and cap at top 20
-    sorted_providers = sorted(grouped.items(), key=lambda x: len(x[1]), reverse=True)[:20]
-    top_grouped = dict(sorted_providers)
+    """Generate AI summaries for the most-flagged providers, reusing stored ones whose flags are unchanged."""
+    global _last_latency
+    from ml.summarizer import SummarizerOptions, make_backend
+
+    try:
+        backend = make_backend(
+            settings.SUMMARY_BACKEND,
+            api_key=getattr(settings, "ANTHROPIC_API_KEY", None),
+            fake_latency=settings.SUMMARY_FAKE_LATENCY_SECONDS,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    options = SummarizerOptions(
+        concurrency=settings.SUMMARY_CONCURRENCY,
+        rate_per_minute=settings.SUMMARY_RATE_PER_MINUTE,
+        timeout=settings.SUMMARY_TIMEOUT_SECONDS,
+        max_retries=settings.SUMMARY_MAX_RETRIES,
+    )
 
+    # Ranking and top-K selection happen in SQL; only changed providers
+    # are summarized, concurrently (sync route: runs in a worker thread)
     start = time.time()
-    summaries = generate_summaries(
-        top_grouped,
-        api_key=getattr(settings, "ANTHROPIC_API_KEY", None),
-    )
+    try:
+        result = insights_service.generate_insights(db, backend, options)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     _last_latency = round(time.time() - start, 2)
 
-    _cached_summaries = summaries
-    _last_generation_time = time.time()
-
     return {
         "status": "complete",
-        "summaries": summaries,
-        "providers_analyzed": len(summaries),
+        "summaries": result["summaries"],
+        "providers_analyzed": len(result["summaries"]),
+        "providers_regenerated": result["regenerated"],
+        "providers_failed": result["failed"],
+        "providers_cached": result["cached"],
         "generation_time_seconds": _last_latency,
     }
 
 
 @router.get("/")
-def get_insights():
-    """Return the most recently generated summaries."""
-    if not _cached_summaries:
+def get_insights(db: Session = Depends(get_db)):
+    """Return the most recently generated summaries (shared by all workers)."""
+    summaries = insights_service.current_summaries(db)
+    if not summaries:
         return {
             "summaries": [],
             "message": "No summaries generated yet. Call POST /api/insights/generate first.",
         }
 
     return {
-        "summaries": _cached_summaries,
-        "generated_at": _last_generation_time,
-        "providers_count": len(_cached_summaries),
+        "summaries": summaries,
+        "generated_at": max(s["generated_at"] for s in summaries if s["generated_at"]),
+        "providers_count": len(summaries),
     }
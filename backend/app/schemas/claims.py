@@ -54,3 +54,61 @@ class IngestResponse(BaseModel):
     records_inserted: int
     duplicates_skipped: int
     errors: list[str]
+    records_scored: int = 0
+    new_flags: int = 0
+    model_version: str | None = None
+
+
+class ScoreClaimIn(BaseModel):
+    """A claim submitted for real-time scoring."""
+    claim_id: str
+    provider_id: str | None = None
+    cpt_code: str
+    icd10_code: str
+    billed_amount: float = Field(ge=0)
+    allowed_amount: float = Field(ge=0)
+    paid_amount: float = Field(ge=0)
+
+
+class ScoreRequest(BaseModel):
+    claims: list[ScoreClaimIn] = Field(min_length=1, max_length=100)
+
+
+class ClaimScoreOut(BaseModel):
+    """Layer 1 + 2 result for one submitted claim."""
+    claim_id: str
+    anomaly_score: float
+    is_anomaly: bool
+    if_score: float | None
+    duplicate_in_request: bool
+    cpt_icd_mismatch: bool
+    statistical_outlier: bool
+
+
+class ScoreResponse(BaseModel):
+    model_version: str | None
+    scoring_ms: float
+    results: list[ClaimScoreOut]
+
+
+class ReviewFilter(BaseModel):
+    """Selects flags for a bulk review; every given field must match."""
+    provider_id: str | None = None
+    flag_reason: str | None = Field(None, description="Substring of flag_reason, e.g. 'coding mismatch'")
+    min_score: float | None = None
+    max_score: float | None = None
+    currently_reviewed: bool | None = None
+
+
+class BulkReviewRequest(BaseModel):
+    """Set ``reviewed`` on the given flag ids, or on every flag matching ``filter``."""
+    reviewed: bool = True
+    flag_ids: list[int] | None = Field(None, min_length=1, max_length=10_000)
+    filter: ReviewFilter | None = None
+
+
+class BulkReviewResponse(BaseModel):
+    reviewed: bool
+    matched: int
+    updated: int
+    not_found: list[int] = []
@@ -0,0 +1,445 @@
+"""
+Claim Analysis Service
+
+Runs three-layer anomaly detection over claims in the database and
+persists the resulting AnomalyFlag rows. Shared by the synchronous
+POST /api/analyze endpoint and the background job runner.
+
+Scoring is incremental: every scored claim is stamped with scored_at and
+the model version, and each run only pulls claims that are still
+unscored — through the partial ix_claims_unscored index, in keyset
+batches.
+
+Layer 3 judges each provider on its whole history, which a batch does
+not hold. Instead of aggregating the claims table, every batch adds its
+claims' sums to provider_stats (see stats_service) and flags the claims
+of providers already marked anomalous there. refresh_provider_flags()
+then re-judges the providers from those per-provider rows and backfills
+only providers that have just become anomalous. A run therefore costs
+its new claims plus one pass over providers (not claims), plus the
+history of any newly flagged provider.
+
+The same batch writer backs score-on-ingest: freshly loaded claims are
+scored inside the ingest transaction, and the provider refresh follows
+in a background job.
+"""
+
+import math
+import random
+from datetime import datetime, timezone
+from typing import Callable
+
+import pandas as pd
+from sqlalchemy import select, update, func, case, insert, literal, exists, tablesample
+from sqlalchemy.orm import Session
+
+from app.db.bulk_load import insert_flags
+from app.db.models import Claim, AnomalyFlag, ProviderStats
+from app.services.stats_service import PROVIDER_SUMS, StatsDelta
+
+SCORE_BATCH_SIZE = 50_000
+
+# Layer 3 reason and score floor, as applied by AnomalyDetector.score
+PROVIDER_REASON = "anomalous provider pattern"
+PROVIDER_SCORE = -0.12
+
+# Rows the first model is trained on: the whole table, or a sample spread
+# evenly across it when larger
+TRAIN_SAMPLE_ROWS = 500_000
+
+SCORING_COLUMNS = [
+    Claim.id, Claim.claim_id, Claim.patient_id, Claim.provider_id, Claim.cpt_code,
+    Claim.icd10_code, Claim.billed_amount, Claim.allowed_amount, Claim.paid_amount,
+    Claim.service_date,  # Not scored; copied onto flags
+]
+
+BACKFILL_BATCH_SIZE = 50_000
+
+LAYER_COLUMNS = {
+    "duplicates": "_layer1_dup",
+    "cpt_icd_mismatches": "_layer1_mismatch",
+    "statistical_outliers": "_layer2_if",
+    "provider_anomalies": "_layer3_provider",
+}
+
+
+def iter_unscored_batches(db: Session, batch_size: int = SCORE_BATCH_SIZE):
+    """
+    Yield DataFrames of unscored claims in id order.
+
+    Each batch is a keyset query (id > last seen) over the partial
+    unscored index, streamed from the driver with yield_per. The upper
+    id bound is fixed at the start so claims arriving mid-run wait for
+    the next run.
+    """
+    max_id = db.query(func.max(Claim.id)).filter(Claim.scored_at.is_(None)).scalar()
+    if max_id is None:
+        return
+
+    last_id = 0
+    while last_id < max_id:
+        stmt = (
+            select(*SCORING_COLUMNS)
+            .where(Claim.scored_at.is_(None), Claim.id > last_id, Claim.id <= max_id)
+            .order_by(Claim.id)
+            .limit(batch_size)
+            .execution_options(yield_per=batch_size)
+        )
+        result = db.execute(stmt)
+        columns = list(result.keys())
+        rows = [row for partition in result.partitions() for row in partition]
+        if not rows:
+            return
+
+        batch = pd.DataFrame(rows, columns=columns)
+        last_id = int(batch["id"].iloc[-1])
+        yield batch
+
+
+def flagged_provider_ids(db: Session) -> list[str]:
+    """Providers marked anomalous by the last provider refresh."""
+    return list(db.scalars(select(ProviderStats.provider_id).where(ProviderStats.flagged == True)))  # noqa: E712
+
+
+def score_and_flag_batch(
+    db: Session, batch: pd.DataFrame, detector, stats: StatsDelta | None = None,
+) -> tuple[pd.DataFrame, int]:
+    """
+    Score a batch of stored claims, add its flags and stamp it as scored.
+
+    ``batch`` holds SCORING_COLUMNS rows that are contiguous in the
+    unscored id sequence. Nothing is committed, so callers can make the
+    writes part of a larger transaction. Layer 3 flags the claims of
+    providers already flagged in provider_stats, and the batch's sums
+    are added there for the next refresh_provider_flags(). New flags and
+    provider sums go into ``stats`` when given, for the caller to flush
+    before it commits; otherwise they are applied here. Returns the
+    scored frame and the number of flags actually inserted (claims that
+    already had a flag are not counted).
+    """
+    from ml.anomaly_detector import flag_reasons
+
+    delta = stats if stats is not None else StatsDelta()
+    provider_flags = batch["provider_id"].isin(flagged_provider_ids(db))
+    scored = detector.score(batch, provider_flags=provider_flags)
+    anomalies = scored[scored["is_anomaly"]]
+
+    # Reasons are built column-wise; flags go in as chunked Core inserts
+    inserted = 0
+    if len(anomalies):
+        inserted = insert_flags(
+            db,
+            anomalies["claim_id"].tolist(),
+            anomalies["anomaly_score"].round(4).tolist(),
+            flag_reasons(anomalies).tolist(),
+            provider_ids=anomalies["provider_id"].tolist(),
+            cpt_codes=anomalies["cpt_code"].tolist(),
+            service_dates=anomalies["service_date"].tolist(),
+            stats=delta,
+        )
+    delta.add_providers(batch)
+
+    # Stamp the whole batch as scored; an id range selects exactly these rows.
+    db.execute(
+        update(Claim)
+        .where(
+            Claim.id.between(int(batch["id"].iloc[0]), int(batch["id"].iloc[-1])),
+            Claim.scored_at.is_(None),
+        )
+        .values(scored_at=datetime.now(timezone.utc), model_version=detector.version)
+    )
+    if stats is None:
+        delta.flush(db)
+    return scored, inserted
+
+
+def score_claims_after(
+    db: Session, after_id: int, detector, stats: StatsDelta | None = None,
+) -> tuple[pd.DataFrame, int] | None:
+    """
+    Score-on-ingest: score the unscored claims with id > after_id.
+
+    Called right after a chunk is bulk-loaded, in the same transaction,
+    so the claims and their flags become visible together. Returns
+    (scored frame, flags inserted), or None when the chunk inserted
+    nothing.
+    """
+    result = db.execute(
+        select(*SCORING_COLUMNS)
+        .where(Claim.scored_at.is_(None), Claim.id > after_id)
+        .order_by(Claim.id)
+    )
+    batch = pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+    if batch.empty:
+        return None
+    return score_and_flag_batch(db, batch, detector, stats=stats)
+
+
+def max_claim_id(db: Session) -> int:
+    return db.query(func.max(Claim.id)).scalar() or 0
+
+
+def record_new_claims(db: Session, after_id: int, count: int, stats: StatsDelta):
+    """Add ``count`` claims just loaded above ``after_id`` to ``stats``."""
+    date_min, date_max = db.query(
+        func.min(Claim.service_date), func.max(Claim.service_date)
+    ).filter(Claim.id > after_id).one()
+    stats.add_claims(count, date_min, date_max)
+
+
+def training_sample(db: Session, max_rows: int = TRAIN_SAMPLE_ROWS) -> pd.DataFrame:
+    """
+    Every claim, or about ``max_rows`` claims sampled across the table
+    when there are more.
+
+    The table size is estimated from the id range (two index lookups).
+    PostgreSQL samples with TABLESAMPLE BERNOULLI; elsewhere every k-th
+    id from a random offset is taken. Neither sorts the table.
+    """
+    id_min, id_max = db.query(func.min(Claim.id), func.max(Claim.id)).one()
+    span = (id_max - id_min + 1) if id_max is not None else 0
+    if span <= max_rows:
+        stmt = select(*SCORING_COLUMNS)
+    elif db.get_bind().dialect.name == "postgresql":
+        sampled = tablesample(Claim.__table__, func.bernoulli(100.0 * max_rows / span))
+        stmt = select(*(sampled.c[col.key] for col in SCORING_COLUMNS)).limit(max_rows)
+    else:
+        stride = math.ceil(span / max_rows)
+        stmt = (
+            select(*SCORING_COLUMNS)
+            .where(Claim.id % stride == random.randrange(stride))
+            .limit(max_rows)
+        )
+    result = db.execute(stmt)
+    return pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+
+
+def count_unscored(db: Session) -> int:
+    """Count claims awaiting scoring (served by the partial index)."""
+    return db.query(func.count(Claim.id)).filter(Claim.scored_at.is_(None)).scalar() or 0
+
+
+def run_claim_analysis(
+    db: Session,
+    progress: Callable[..., None] | None = None,
+    batch_size: int = SCORE_BATCH_SIZE,
+) -> dict:
+    """
+    Score all unscored claims batch by batch and write flags.
+
+    Each batch's flags, scored_at markers and provider sums are committed
+    together. Layer 3 compares every provider's whole history, so the
+    provider verdicts are refreshed once at the end from provider_stats
+    (refresh_provider_flags) rather than from each batch's slice; within
+    a batch, claims of providers flagged earlier are flagged directly.
+    ``progress`` is called as
+    progress(rows_processed, phase, rows_total) after every batch. Raises
+    LookupError when there are no claims.
+    """
+    from ml.registry import ModelRegistry
+    from ml.serving import get_detector
+
+    if db.query(Claim.id).first() is None:
+        raise LookupError("No claims in database. Ingest data first.")
+
+    total = count_unscored(db)
+    if not total:
+        return {"status": "complete", "message": "All claims already scored", "new_flags": 0}
+
+    if progress:
+        progress(0, "scoring", total)
+
+    # Shared cached model; the first run trains the registry's initial
+    # version on the whole table (or a random sample of it)
+    detector = get_detector()
+    if detector is None:
+        if progress:
+            progress(0, "training", total)
+        ModelRegistry().retrain(training_sample(db))
+        detector = get_detector()
+
+    scored_rows = 0
+    flag_count = 0
+    breakdown = {key: 0 for key in LAYER_COLUMNS}
+
+    stats = StatsDelta()
+    for batch in iter_unscored_batches(db, batch_size):
+        scored, inserted = score_and_flag_batch(db, batch, detector, stats=stats)
+        stats.flush(db)
+        db.commit()
+
+        scored_rows += len(batch)
+        flag_count += inserted
+        for key, col in LAYER_COLUMNS.items():
+            breakdown[key] += int(scored[col].sum())
+
+        if progress:
+            progress(scored_rows, "scoring", total)
+
+    if progress:
+        progress(scored_rows, "provider_refresh", total)
+    provider = refresh_provider_flags(db)
+    flag_count += provider["new_flags"]
+    breakdown["provider_anomalies"] += provider["new_flags"] + provider["updated_flags"]
+
+    return {
+        "status": "complete",
+        "total_scored": scored_rows,
+        "new_flags": flag_count,
+        "flagged_percentage": round(flag_count / scored_rows * 100, 1) if scored_rows else 0,
+        "model_version": detector.version,
+        "layer_breakdown": breakdown,
+    }
+
+
+def load_provider_stats(db: Session) -> pd.DataFrame:
+    """Every provider's Layer 3 sums and current verdict, indexed by provider_id."""
+    result = db.execute(select(
+        ProviderStats.provider_id, *(getattr(ProviderStats, col) for col in PROVIDER_SUMS), ProviderStats.flagged,
+    ))
+    return pd.DataFrame(result.fetchall(), columns=list(result.keys())).set_index("provider_id")
+
+
+def refresh_provider_flags(db: Session, z_threshold: float = 3.0) -> dict:
+    """
+    Re-judge every provider from provider_stats and flag the claims of
+    providers that have just become anomalous.
+
+    Anomalous providers are picked with the same rule as batch scoring,
+    from the per-provider sums, so the cost grows with the number of
+    providers rather than claims. Claims of providers that were already
+    flagged got the provider reason when they were scored. For newly
+    flagged providers, scored claims that carry no flag yet are flagged
+    with one INSERT ... SELECT; claims already flagged by Layers 1 or 2
+    get the provider reason appended and their score floored at -0.12,
+    exactly as in-batch scoring would have combined them. Providers that
+    no longer look anomalous are unmarked; their flags stay. Safe to run
+    repeatedly.
+    """
+    from ml.anomaly_detector import flag_providers
+
+    aggregates = load_provider_stats(db)
+    if int(aggregates["claim_count"].sum()) < 50:
+        return {"status": "complete", "flagged_providers": 0, "newly_flagged": 0,
+                "new_flags": 0, "updated_flags": 0}
+
+    flagged = {str(p) for p in flag_providers(aggregates, z_threshold)}
+    previously = set(aggregates.index[aggregates["flagged"].astype(bool)])
+    providers = sorted(flagged - previously)
+    cleared = sorted(previously - flagged)
+    new_flags = updated_flags = 0
+    stats = StatsDelta()
+    if providers:
+        provider_claims = select(Claim.claim_id).where(
+            Claim.provider_id.in_(providers), Claim.scored_at.is_not(None),
+        )
+        missing_reason = (
+            AnomalyFlag.claim_id.in_(provider_claims),
+            ~AnomalyFlag.flag_reason.contains(PROVIDER_REASON),
+        )
+        score_delta = db.query(func.sum(case(
+            (AnomalyFlag.anomaly_score > PROVIDER_SCORE, PROVIDER_SCORE - AnomalyFlag.anomaly_score),
+            else_=0.0,
+        ))).filter(*missing_reason).scalar() or 0.0
+        result = db.execute(
+            update(AnomalyFlag)
+            .where(*missing_reason)
+            .values(
+                # Provider is the last reason bit, so appending keeps the canonical order
+                flag_reason=case(
+                    (AnomalyFlag.flag_reason == "multivariate anomaly", PROVIDER_REASON),
+                    else_=AnomalyFlag.flag_reason + "; " + PROVIDER_REASON,
+                ),
+                anomaly_score=case(
+                    (AnomalyFlag.anomaly_score > PROVIDER_SCORE, PROVIDER_SCORE),
+                    else_=AnomalyFlag.anomaly_score,
+                ),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        updated_flags = max(result.rowcount, 0)
+        stats.add_rescores(float(score_delta))
+
+        unflagged = (
+            select(
+                Claim.claim_id,
+                literal(PROVIDER_SCORE),
+                literal(PROVIDER_REASON),
+                literal(False),
+                literal(datetime.now(timezone.utc), AnomalyFlag.flagged_at.type),
+                Claim.provider_id,
+                Claim.cpt_code,
+                Claim.service_date,
+            )
+            .where(
+                Claim.provider_id.in_(providers),
+                Claim.scored_at.is_not(None),
+                # Also guaranteed by the unique claim_id; filtering keeps rowcount exact
+                ~exists().where(AnomalyFlag.claim_id == Claim.claim_id),
+            )
+        )
+        result = db.execute(
+            insert(AnomalyFlag).from_select(
+                ["claim_id", "anomaly_score", "flag_reason", "reviewed", "flagged_at",
+                 "provider_id", "cpt_code", "service_date"],
+                unflagged,
+            )
+        )
+        new_flags = result.rowcount or 0
+        stats.add_flags(new_flags, PROVIDER_SCORE * new_flags)
+
+    for provider_ids, verdict in ((providers, True), (cleared, False)):
+        if provider_ids:
+            db.execute(
+                update(ProviderStats)
+                .where(ProviderStats.provider_id.in_(provider_ids))
+                .values(flagged=verdict)
+                .execution_options(synchronize_session=False)
+            )
+    # The rollup row is locked from here to the commit only
+    stats.flush(db)
+    db.commit()
+
+    return {
+        "status": "complete",
+        "flagged_providers": len(flagged),
+        "newly_flagged": len(providers),
+        "new_flags": new_flags,
+        "updated_flags": updated_flags,
+    }
+
+
+def backfill_flag_attributes(
+    db: Session,
+    batch_size: int = BACKFILL_BATCH_SIZE,
+    progress: Callable[..., None] | None = None,
+) -> dict:
+    """
+    Copy provider_id, cpt_code and service_date from claims onto flags
+    written before those columns existed.
+
+    Walks anomaly_flags in id ranges, one UPDATE ... FROM claims and one
+    commit per range, so locks stay short and an interrupted run resumes
+    where it stopped. Safe to rerun; only rows with no provider_id are
+    touched.
+    """
+    max_id = db.query(func.max(AnomalyFlag.id)).scalar() or 0
+    updated = 0
+    for low in range(0, max_id, batch_size):
+        result = db.execute(
+            update(AnomalyFlag)
+            .where(
+                AnomalyFlag.id > low,
+                AnomalyFlag.id <= low + batch_size,
+                AnomalyFlag.provider_id.is_(None),
+                AnomalyFlag.claim_id == Claim.claim_id,
+            )
+            .values(provider_id=Claim.provider_id, cpt_code=Claim.cpt_code, service_date=Claim.service_date)
+            .execution_options(synchronize_session=False)
+        )
+        updated += max(result.rowcount, 0)
+        db.commit()
+        if progress:
+            progress(min(low + batch_size, max_id), "backfilling", max_id)
+
+    return {"status": "complete", "flags_updated": updated}
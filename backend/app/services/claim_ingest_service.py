@@ -0,0 +1,188 @@
+"""
+Claim Ingest Service
+
+Streams a billing CSV into the claims table in bounded chunks.
+Each chunk is validated column-wise with NumPy masks rather than
+building a Pydantic model per row, so memory stays flat regardless
+of file size.
+
+With score=True ingest is pipelined: each loaded chunk is scored with
+Layers 1 and 2 by the shared cached detector and its flags are written
+in the same transaction, so claims arrive already flagged.
+"""
+
+from dataclasses import dataclass, field
+from typing import BinaryIO, Callable
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from app.db.bulk_load import get_claim_loader
+from app.services.stats_service import StatsDelta
+
+STRING_COLUMNS = [
+    "claim_id", "patient_id", "provider_id", "cpt_code", "icd10_code", "claim_status",
+]
+AMOUNT_COLUMNS = ["billed_amount", "allowed_amount", "paid_amount"]
+DATE_COLUMN = "service_date"
+
+REQUIRED_COLUMNS = set(STRING_COLUMNS) | set(AMOUNT_COLUMNS) | {DATE_COLUMN}
+
+DEFAULT_CHUNK_SIZE = 50_000
+MAX_REPORTED_ERRORS = 100
+
+
+@dataclass
+class IngestResult:
+    """Outcome of a streaming ingest run."""
+    records_inserted: int = 0
+    duplicates_skipped: int = 0
+    rows_read: int = 0
+    errors: list[str] = field(default_factory=list)
+    errors_truncated: bool = False
+    records_scored: int = 0
+    flags_created: int = 0
+    model_version: str | None = None
+
+    def add_error(self, message: str):
+        """Record a row-level error, capping how many are kept."""
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(message)
+        elif not self.errors_truncated:
+            self.errors.append("... (truncated, too many errors)")
+            self.errors_truncated = True
+
+
+def read_claim_chunks(source: BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Yield raw claim chunks from a CSV file object.
+
+    Identifier columns are read as strings so codes like CPT 99213 keep
+    their textual form. Raises ValueError on unparseable input or
+    missing required columns.
+    """
+    try:
+        reader = pd.read_csv(
+            source,
+            chunksize=chunk_size,
+            dtype={col: str for col in STRING_COLUMNS},
+        )
+        for chunk in reader:
+            missing = REQUIRED_COLUMNS - set(chunk.columns)
+            if missing:
+                raise ValueError(f"Missing required columns: {', '.join(sorted(missing))}")
+            yield chunk
+    except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as e:
+        raise ValueError(f"Failed to parse CSV: {e}") from e
+
+
+def validate_chunk(chunk: pd.DataFrame, result: IngestResult) -> pd.DataFrame:
+    """
+    Validate a raw chunk column-wise and return only the valid rows.
+
+    Mirrors the ClaimRecord schema: identifiers must be present, amounts
+    must be non-negative numbers and service_date must parse as a date.
+    Row-level problems are recorded on ``result``.
+    """
+    invalid = np.zeros(len(chunk), dtype=bool)
+    problems: list[tuple[np.ndarray, str]] = []
+
+    for col in STRING_COLUMNS:
+        mask = chunk[col].isna().to_numpy()
+        problems.append((mask, f"{col} is required"))
+
+    amounts = {}
+    for col in AMOUNT_COLUMNS:
+        values = pd.to_numeric(chunk[col], errors="coerce").to_numpy(dtype=np.float64)
+        with np.errstate(invalid="ignore"):
+            mask = ~(np.isfinite(values) & (values >= 0))
+        problems.append((mask, f"{col} must be a non-negative number"))
+        amounts[col] = values
+
+    dates = pd.to_datetime(chunk[DATE_COLUMN], errors="coerce", format="ISO8601")
+    problems.append((dates.isna().to_numpy(), f"{DATE_COLUMN} is not a valid date"))
+
+    for mask, _ in problems:
+        invalid |= mask
+
+    if invalid.any() and not result.errors_truncated:
+        row_labels = chunk.index.to_numpy()
+        for pos in np.flatnonzero(invalid):
+            reasons = [msg for mask, msg in problems if mask[pos]]
+            result.add_error(f"Row {row_labels[pos]}: {'; '.join(reasons)}")
+            if result.errors_truncated:
+                break
+
+    valid = ~invalid
+    clean = chunk.loc[valid, STRING_COLUMNS].copy()
+    for col, values in amounts.items():
+        clean[col] = values[valid]
+    clean[DATE_COLUMN] = dates[valid].dt.normalize()
+    return clean
+
+
+def ingest_claims_csv(
+    db: Session,
+    source: BinaryIO,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Callable[[int, str], None] | None = None,
+    score: bool = False,
+) -> IngestResult:
+    """
+    Stream a claims CSV into the database.
+
+    - Reads the file in ``chunk_size`` row chunks
+    - Validates each chunk with vectorized masks
+    - Loads each chunk through the dialect's bulk loader, which skips
+      claim_ids already in the DB or repeated within the file
+    - Totals the inserted rows' stats in memory and applies them to the
+      rollup with one UPDATE right before committing, so the shared
+      pipeline_stats row is not locked for the whole upload
+    - Commits once at the end
+
+    duplicates_skipped is derived from database row counts: rows offered
+    minus rows the loader actually inserted. ``progress`` is called with
+    the running row count after every chunk; it may commit (job
+    checkpoints do), so the stats are applied before each call.
+
+    With ``score``, every chunk's new claims are scored (Layers 1 + 2)
+    and flagged before the next chunk is read. If no model has been
+    trained yet, claims are left unscored for POST /api/analyze.
+    """
+    from app.services.claim_analysis_service import max_claim_id, record_new_claims, score_claims_after
+
+    result = IngestResult()
+    loader = get_claim_loader(db)
+    stats = StatsDelta()
+    detector = None
+    if score:
+        from ml.serving import get_detector
+        detector = get_detector()
+        result.model_version = detector.version if detector else None
+
+    for chunk in read_claim_chunks(source, chunk_size):
+        result.rows_read += len(chunk)
+        clean = validate_chunk(chunk, result)
+        if not clean.empty:
+            last_id = max_claim_id(db)
+            inserted = loader.load(clean)
+            result.records_inserted += inserted
+            result.duplicates_skipped += len(clean) - inserted
+            if inserted:
+                record_new_claims(db, last_id, inserted, stats)
+
+            if detector and inserted:
+                scored = score_claims_after(db, last_id, detector, stats)
+                if scored is not None:
+                    scored_frame, inserted = scored
+                    result.records_scored += len(scored_frame)
+                    result.flags_created += inserted
+
+        if progress:
+            stats.flush(db)
+            progress(result.rows_read, "ingesting")
+
+    stats.flush(db)
+    db.commit()
+    return result
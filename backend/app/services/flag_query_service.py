@@ -0,0 +1,175 @@
+"""
+Flag Query Service
+
+Lists anomaly flags for the review queue, in either of two modes:
+
+- page mode (page / per_page): OFFSET pagination with an exact total, as
+  the dashboard has always used. Cost grows with page depth.
+- cursor mode: keyset pagination. Each page is an index range scan that
+  starts right after (or before) the row the cursor points at, so page
+  latency is the same on page 1 and page 100,000. Totals are opt-in.
+
+Each sort_by option pages over a unique key — (anomaly_score, id),
+(flagged_at, id) or claim_id — so rows with equal scores or timestamps
+are never skipped or repeated across pages. Cursors are opaque
+url-safe tokens; a cursor is only valid for the sort it was issued for.
+
+flag_rollup() groups flags by provider or CPT code using the columns
+copied onto each flag, so it is one indexed aggregate with no join.
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from sqlalchemy import case, func, literal, tuple_
+from sqlalchemy.orm import Session
+
+from app.db.models import AnomalyFlag
+
+# sort_by -> (key columns, descending)
+SORT_KEYS = {
+    "anomaly_score": ((AnomalyFlag.anomaly_score, AnomalyFlag.id), False),  # lowest score first
+    "flagged_at": ((AnomalyFlag.flagged_at, AnomalyFlag.id), True),         # newest first
+    "claim_id": ((AnomalyFlag.claim_id,), False),
+}
+
+
+def encode_cursor(sort_by: str, flag: AnomalyFlag, direction: str) -> str:
+    columns, _ = SORT_KEYS[sort_by]
+    key = [getattr(flag, column.key) for column in columns]
+    key = [value.isoformat() if isinstance(value, datetime) else value for value in key]
+    payload = json.dumps({"s": sort_by, "d": direction, "k": key}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str) -> tuple[str, list]:
+    """Return (direction, key values); raises ValueError for malformed or foreign cursors."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction, key = payload["d"], list(payload["k"])
+        issued_for = payload["s"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise ValueError("Invalid pagination cursor")
+
+    columns, _ = SORT_KEYS[sort_by]
+    if issued_for != sort_by or direction not in ("next", "prev") or len(key) != len(columns):
+        raise ValueError(f"Cursor was not issued for sort_by={sort_by}")
+    if sort_by == "flagged_at":
+        try:
+            key[0] = datetime.fromisoformat(key[0])
+        except (TypeError, ValueError):
+            raise ValueError("Invalid pagination cursor")
+    return direction, key
+
+
+def _serialize(flag: AnomalyFlag) -> dict:
+    return {
+        "id": flag.id,
+        "claim_id": flag.claim_id,
+        "anomaly_score": flag.anomaly_score,
+        "flag_reason": flag.flag_reason,
+        "reviewed": flag.reviewed,
+        "flagged_at": flag.flagged_at.isoformat() if flag.flagged_at else None,
+        "provider_id": flag.provider_id,
+        "cpt_code": flag.cpt_code,
+        "service_date": str(flag.service_date) if flag.service_date else None,
+    }
+
+
+def list_flags(
+    db: Session,
+    sort_by: str = "anomaly_score",
+    per_page: int = 25,
+    reviewed: bool | None = None,
+    page: int | None = None,
+    cursor: str | None = None,
+    include_total: bool | None = None,
+) -> dict:
+    """
+    One page of flags plus pagination metadata.
+
+    With ``cursor`` the page is fetched by keyset; otherwise by ``page``
+    (default 1). Both modes return next/prev cursors, so a client can
+    start on a numbered page and continue by cursor. ``include_total``
+    defaults to True in page mode and False in cursor mode.
+    """
+    columns, descending = SORT_KEYS[sort_by]
+    base = db.query(AnomalyFlag)
+    if reviewed is not None:
+        base = base.filter(AnomalyFlag.reviewed == reviewed)
+
+    def ordered(reverse: bool):
+        desc = descending != reverse
+        return base.order_by(*[c.desc() if desc else c.asc() for c in columns])
+
+    if cursor is not None:
+        direction, key = decode_cursor(cursor, sort_by)
+        backwards = direction == "prev"
+        values = [literal(value, column.type) for value, column in zip(key, columns)]
+        row_key = tuple_(*columns) if len(columns) > 1 else columns[0]
+        cursor_key = tuple_(*values) if len(columns) > 1 else values[0]
+        # Rows strictly after the cursor in the requested direction of travel
+        after = row_key < cursor_key if descending != backwards else row_key > cursor_key
+        rows = ordered(backwards).filter(after).limit(per_page + 1).all()
+        more = len(rows) > per_page
+        rows = rows[:per_page]
+        if backwards:
+            rows.reverse()
+        has_next, has_prev = (True, more) if backwards else (more, True)
+        page = None
+    else:
+        page = page or 1
+        rows = ordered(False).offset((page - 1) * per_page).limit(per_page + 1).all()
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_prev = page > 1
+
+    if include_total is None:
+        include_total = cursor is None
+
+    pagination = {
+        "per_page": per_page,
+        "sort_by": sort_by,
+        "next_cursor": encode_cursor(sort_by, rows[-1], "next") if rows and has_next else None,
+        "prev_cursor": encode_cursor(sort_by, rows[0], "prev") if rows and has_prev else None,
+    }
+    if page is not None:
+        pagination["page"] = page
+    if include_total:
+        total = base.with_entities(func.count(AnomalyFlag.id)).scalar() or 0
+        pagination["total"] = total
+        pagination["total_pages"] = (total + per_page - 1) // per_page
+
+    return {"flags": [_serialize(flag) for flag in rows], "pagination": pagination}
+
+
+ROLLUP_KEYS = {"provider": AnomalyFlag.provider_id, "cpt": AnomalyFlag.cpt_code}
+
+
+def flag_rollup(db: Session, by: str = "provider", limit: int = 50, reviewed: bool | None = None) -> list[dict]:
+    """Flag counts and score stats per provider or CPT code, most-flagged first."""
+    key = ROLLUP_KEYS[by]
+    flags = func.count(AnomalyFlag.id).label("flags")
+    query = db.query(
+        key.label("key"),
+        flags,
+        func.sum(case((AnomalyFlag.reviewed == False, 1), else_=0)).label("pending"),  # noqa: E712
+        func.avg(AnomalyFlag.anomaly_score).label("avg_score"),
+        func.min(AnomalyFlag.anomaly_score).label("min_score"),
+    )
+    if reviewed is not None:
+        query = query.filter(AnomalyFlag.reviewed == reviewed)
+    rows = query.group_by(key).order_by(flags.desc(), key).limit(limit).all()
+    return [
+        {
+            by: row.key,
+            "flags": row.flags,
+            "pending_review": int(row.pending or 0),
+            "avg_anomaly_score": round(float(row.avg_score), 4),
+            "min_anomaly_score": round(float(row.min_score), 4),
+        }
+        for row in rows
+    ]
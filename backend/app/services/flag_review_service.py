@@ -0,0 +1,83 @@
+"""
+Flag Review Service
+
+Review-queue writes for anomaly flags. bulk_review() sets ``reviewed``
+on a list of flag ids, or on every flag matching a filter (provider,
+reason, score range), with one set-based UPDATE.
+
+Semantics are "set", not "toggle": only flags whose state actually
+changes are written, so a retried request updates nothing the second
+time, and that count of changed rows is exactly the delta recorded in
+the stats rollup, in the same transaction.
+"""
+
+from sqlalchemy import and_, func, select, update
+from sqlalchemy.orm import Session
+
+from app.db.models import AnomalyFlag
+from app.services.stats_service import record_reviews
+
+
+def review_conditions(
+    provider_id: str | None = None,
+    flag_reason: str | None = None,
+    min_score: float | None = None,
+    max_score: float | None = None,
+    currently_reviewed: bool | None = None,
+) -> list:
+    """WHERE clauses for a review filter; raises ValueError when it selects nothing specific."""
+    conditions = []
+    if provider_id is not None:
+        conditions.append(AnomalyFlag.provider_id == provider_id)
+    if flag_reason:
+        conditions.append(AnomalyFlag.flag_reason.contains(flag_reason))
+    if min_score is not None:
+        conditions.append(AnomalyFlag.anomaly_score >= min_score)
+    if max_score is not None:
+        conditions.append(AnomalyFlag.anomaly_score <= max_score)
+    if not conditions:
+        # currently_reviewed alone would sweep the whole queue
+        raise ValueError("A review filter needs provider_id, flag_reason, min_score or max_score")
+    if currently_reviewed is not None:
+        conditions.append(AnomalyFlag.reviewed == currently_reviewed)
+    return conditions
+
+
+def bulk_review(
+    db: Session,
+    reviewed: bool = True,
+    flag_ids: list[int] | None = None,
+    filters: dict | None = None,
+) -> dict:
+    """
+    Set ``reviewed`` on flags selected by ``flag_ids`` or ``filters`` and commit.
+
+    Returns matched (flags selected), updated (flags whose state changed)
+    and, for id lists, the ids that do not exist. Raises ValueError
+    unless exactly one selector is given.
+    """
+    if (flag_ids is None) == (filters is None):
+        raise ValueError("Provide either flag_ids or filter")
+
+    not_found: list[int] = []
+    if flag_ids is not None:
+        ids = sorted(set(flag_ids))
+        selector = AnomalyFlag.id.in_(ids)
+        existing = set(db.execute(select(AnomalyFlag.id).where(selector)).scalars())
+        not_found = [i for i in ids if i not in existing]
+        matched = len(existing)
+    else:
+        selector = and_(*review_conditions(**filters))
+        matched = db.execute(select(func.count(AnomalyFlag.id)).where(selector)).scalar() or 0
+
+    result = db.execute(
+        update(AnomalyFlag)
+        .where(selector, AnomalyFlag.reviewed != reviewed)
+        .values(reviewed=reviewed)
+        .execution_options(synchronize_session=False)
+    )
+    updated = max(result.rowcount, 0)
+    record_reviews(db, updated if reviewed else -updated)
+    db.commit()
+
+    return {"reviewed": reviewed, "matched": matched, "updated": updated, "not_found": not_found}
@@ -0,0 +1,275 @@
+"""
+Insights Service
+
+Selects what POST /api/insights/generate sends to the summarizer
+without pulling every flag into Python:
+
+- rank_providers(): GROUP BY provider_id ORDER BY count DESC LIMIT n
+- top_flags_per_provider(): the k most anomalous flags of each ranked
+  provider, via ROW_NUMBER() OVER (PARTITION BY provider_id ...)
+- reason_counts(): per-provider reason mix for those providers only
+
+All three run on the provider_id copied onto anomaly_flags and its
+(provider_id, anomaly_score) index, so at most n * k flag rows leave the
+database however large the flag table grows.
+
+generate_insights() then summarizes only what changed. Every summary is
+stored in provider_summaries under (provider_id, flag_set_hash,
+PROMPT_VERSION, model); a provider whose key already has a row reuses
+it, so a repeat run over unchanged flags makes no model calls. Failed
+model calls are returned but never stored, so the next run retries
+them; meanwhile the provider keeps the summary it was last served with
+(or a rule-based one if it never had any). The summaries of the latest
+run are marked current, and current_summaries() serves them to every
+worker. Rows that are no longer current and have not been used for
+SUMMARY_RETENTION_DAYS are pruned at the end of each run.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func, insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db.models import AnomalyFlag, ProviderSummary
+from ml.summarizer import (
+    DISCLAIMER, MAX_PROMPT_FLAGS, PROMPT_VERSION, RULE_BASED_MODEL,
+    SummarizerOptions, flag_set_hash, generate_fallback_summaries, generate_summaries,
+)
+
+TOP_PROVIDERS = 20
+
+
+def rank_providers(db: Session, limit: int = TOP_PROVIDERS) -> dict[str, dict]:
+    """provider_id -> {claim_count, avg_anomaly_score} for the most-flagged providers, in rank order."""
+    flags = func.count(AnomalyFlag.id).label("flags")
+    rows = db.execute(
+        select(AnomalyFlag.provider_id, flags, func.avg(AnomalyFlag.anomaly_score).label("avg_score"))
+        .where(AnomalyFlag.provider_id.is_not(None))
+        .group_by(AnomalyFlag.provider_id)
+        .order_by(flags.desc(), AnomalyFlag.provider_id)
+        .limit(limit)
+    )
+    return {
+        row.provider_id: {"claim_count": row.flags, "avg_anomaly_score": round(float(row.avg_score), 4)}
+        for row in rows
+    }
+
+
+def top_flags_per_provider(db: Session, providers: list[str], k: int = MAX_PROMPT_FLAGS) -> dict[str, list[dict]]:
+    """Up to ``k`` flags per provider, lowest (most anomalous) score first."""
+    rank = func.row_number().over(
+        partition_by=AnomalyFlag.provider_id,
+        order_by=(AnomalyFlag.anomaly_score, AnomalyFlag.id),
+    ).label("rank")
+    ranked = (
+        select(
+            AnomalyFlag.provider_id, AnomalyFlag.claim_id, AnomalyFlag.anomaly_score,
+            AnomalyFlag.flag_reason, AnomalyFlag.reviewed, rank,
+        )
+        .where(AnomalyFlag.provider_id.in_(providers))
+        .subquery()
+    )
+    rows = db.execute(
+        select(ranked).where(ranked.c.rank <= k).order_by(ranked.c.provider_id, ranked.c.rank)
+    )
+
+    grouped: dict[str, list[dict]] = {provider: [] for provider in providers}
+    for row in rows:
+        grouped[row.provider_id].append({
+            "claim_id": row.claim_id,
+            "anomaly_score": row.anomaly_score,
+            "flag_reason": row.flag_reason,
+            "reviewed": row.reviewed,
+        })
+    return grouped
+
+
+def reason_counts(db: Session, providers: list[str]) -> dict[str, dict[str, int]]:
+    """provider_id -> {single reason: flag count}, splitting combined reasons."""
+    rows = db.execute(
+        select(AnomalyFlag.provider_id, AnomalyFlag.flag_reason, func.count(AnomalyFlag.id))
+        .where(AnomalyFlag.provider_id.in_(providers))
+        .group_by(AnomalyFlag.provider_id, AnomalyFlag.flag_reason)
+    )
+    counts: dict[str, dict[str, int]] = {provider: {} for provider in providers}
+    for provider_id, flag_reason, n in rows:
+        for reason in flag_reason.split("; "):
+            counts[provider_id][reason] = counts[provider_id].get(reason, 0) + n
+    return counts
+
+
+def load_insight_inputs(
+    db: Session,
+    top_providers: int = TOP_PROVIDERS,
+    flags_per_provider: int = MAX_PROMPT_FLAGS,
+) -> tuple[dict[str, list[dict]], dict[str, dict]]:
+    """
+    Flags and whole-provider statistics for the top providers.
+
+    Returns (grouped_flags, provider_stats) as accepted by
+    ml.summarizer.generate_summaries, both in rank order. Raises
+    LookupError when there are no flags to summarize.
+    """
+    stats = rank_providers(db, top_providers)
+    if not stats:
+        raise LookupError("No anomaly flags found. Run /api/analyze first.")
+
+    providers = list(stats)
+    grouped = top_flags_per_provider(db, providers, flags_per_provider)
+    for provider_id, reasons in reason_counts(db, providers).items():
+        stats[provider_id]["reason_counts"] = reasons
+    return grouped, stats
+
+
+# ── Summary cache ────────────────────────────────────────────────
+
+_UPSERT_DIALECTS = {"sqlite": sqlite, "postgresql": postgresql}
+
+
+def _summary_dict(row: ProviderSummary) -> dict:
+    return {
+        "provider_id": row.provider_id,
+        "summary": row.summary,
+        "claim_count": row.claim_count,
+        "avg_anomaly_score": row.avg_anomaly_score,
+        "generated_at": row.generated_at.isoformat() if row.generated_at else None,
+        "source": row.source,
+        "disclaimer": DISCLAIMER,
+    }
+
+
+def _store_summaries(db: Session, rows: list[dict]):
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect in _UPSERT_DIALECTS:
+        # Another worker may have stored the same key meanwhile; either copy will do
+        stmt = _UPSERT_DIALECTS[dialect].insert(ProviderSummary).on_conflict_do_nothing(
+            index_elements=["provider_id", "flag_hash", "prompt_version", "model"]
+        )
+    else:
+        stmt = insert(ProviderSummary)
+    db.execute(stmt, rows)
+
+
+def _summary_row(provider_id: str, flag_hash: str, model: str, summary: dict, now: datetime) -> dict:
+    return {
+        "provider_id": provider_id, "flag_hash": flag_hash,
+        "prompt_version": PROMPT_VERSION, "model": model,
+        "summary": summary["summary"], "claim_count": summary["claim_count"],
+        "avg_anomaly_score": summary["avg_anomaly_score"], "source": summary["source"],
+        "generated_at": now, "used_at": now, "is_current": False,
+    }
+
+
+def prune_summaries(db: Session, retention_days: int | None = None) -> int:
+    """Delete summaries that are not current and unused for ``retention_days``; returns the count."""
+    retention_days = settings.SUMMARY_RETENTION_DAYS if retention_days is None else retention_days
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    result = db.execute(delete(ProviderSummary).where(
+        ProviderSummary.is_current == False,  # noqa: E712
+        or_(ProviderSummary.used_at.is_(None), ProviderSummary.used_at < cutoff),
+    ))
+    return max(result.rowcount, 0)
+
+
+def generate_insights(db: Session, backend=None, options: SummarizerOptions | None = None) -> dict:
+    """
+    Summaries for the top providers, regenerating only those whose flag
+    set, prompt version or model changed since they were last stored.
+
+    ``backend`` None means rule-based summaries. Returns {"summaries",
+    "regenerated", "failed", "cached", "pruned"}; each summary has
+    ``cached`` set. Raises LookupError when there are no flags.
+    """
+    grouped, provider_stats = load_insight_inputs(db)
+    model = backend.model if backend is not None else RULE_BASED_MODEL
+    keys = {provider_id: flag_set_hash(flags, provider_stats[provider_id]) for provider_id, flags in grouped.items()}
+
+    stored = {
+        row.provider_id: row
+        for row in db.query(ProviderSummary).filter(
+            ProviderSummary.provider_id.in_(list(keys)),
+            ProviderSummary.flag_hash.in_(list(keys.values())),
+            ProviderSummary.prompt_version == PROMPT_VERSION,
+            ProviderSummary.model == model,
+        )
+        if keys[row.provider_id] == row.flag_hash
+    }
+    stale = {provider_id: flags for provider_id, flags in grouped.items() if provider_id not in stored}
+    fresh = {}
+    if stale:
+        if backend is None:
+            generated = generate_fallback_summaries(stale, provider_stats)
+        else:
+            generated = generate_summaries(stale, provider_stats=provider_stats, backend=backend, options=options)
+        fresh = {summary["provider_id"]: summary for summary in generated}
+
+    failed = [provider_id for provider_id, summary in fresh.items() if summary.get("error")]
+    now = datetime.now(timezone.utc)
+    _store_summaries(db, [
+        _summary_row(provider_id, keys[provider_id], model, summary, now)
+        for provider_id, summary in fresh.items()
+        if not summary.get("error")
+    ])
+
+    # A failed provider keeps serving its current summary; one that has
+    # none gets a rule-based summary rather than dropping out of the set
+    kept = {}
+    if failed:
+        kept = dict(db.query(ProviderSummary.provider_id, ProviderSummary.id).filter(
+            ProviderSummary.is_current == True,  # noqa: E712
+            ProviderSummary.provider_id.in_(failed),
+        ).all())
+        uncovered = {provider_id: grouped[provider_id] for provider_id in failed if provider_id not in kept}
+        if uncovered:
+            _store_summaries(db, [
+                _summary_row(summary["provider_id"], keys[summary["provider_id"]], RULE_BASED_MODEL, summary, now)
+                for summary in generate_fallback_summaries(uncovered, provider_stats)
+            ])
+
+    # This run's summaries become the set GET /api/insights serves
+    db.execute(update(ProviderSummary).where(ProviderSummary.is_current == True).values(  # noqa: E712
+        is_current=False, rank=None,
+    ))
+    for rank, provider_id in enumerate(grouped):
+        if provider_id in kept:
+            match = (ProviderSummary.id == kept[provider_id],)
+        else:
+            row_model = RULE_BASED_MODEL if provider_id in failed else model
+            match = (
+                ProviderSummary.provider_id == provider_id,
+                ProviderSummary.flag_hash == keys[provider_id],
+                ProviderSummary.prompt_version == PROMPT_VERSION,
+                ProviderSummary.model == row_model,
+            )
+        db.execute(update(ProviderSummary).where(*match).values(is_current=True, rank=rank, used_at=now))
+    pruned = prune_summaries(db)
+    db.commit()
+
+    summaries = []
+    for provider_id in grouped:
+        if provider_id in stored:
+            summaries.append({**_summary_dict(stored[provider_id]), "cached": True})
+        else:
+            summaries.append({**fresh[provider_id], "cached": False})
+    return {
+        "summaries": summaries,
+        "regenerated": len(fresh) - len(failed),
+        "failed": len(failed),
+        "cached": len(stored),
+        "pruned": pruned,
+    }
+
+
+def current_summaries(db: Session) -> list[dict]:
+    """The summaries from the latest generate_insights run, in rank order."""
+    rows = (
+        db.query(ProviderSummary)
+        .filter(ProviderSummary.is_current == True)  # noqa: E712
+        .order_by(ProviderSummary.rank)
+        .all()
+    )
+    return [_summary_dict(row) for row in rows]
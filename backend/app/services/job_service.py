@@ -0,0 +1,312 @@
+"""
+Background Job Service
+
+Runs long ingest/analyze work on an in-process thread pool while the
+job's state lives in the ``jobs`` table. Handlers report progress and
+commit at batch boundaries through a JobContext, which is also where
+cancellation is observed. Because state is persisted, any worker can
+answer status polls, and jobs interrupted by a restart are re-queued
+on startup.
+"""
+
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db.database import SessionLocal
+from app.db.models import Job
+
+JOB_INPUT_DIR = os.path.join(settings.UPLOAD_DIR, "jobs")
+
+ACTIVE_STATUSES = ("queued", "running")
+
+_executor = ThreadPoolExecutor(max_workers=settings.JOB_WORKERS, thread_name_prefix="job")
+_cancel_events: dict[str, threading.Event] = {}
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler when its job has been cancelled."""
+
+
+class JobContext:
+    """Progress reporting and cancellation hook passed to job handlers."""
+
+    def __init__(self, db: Session, job_id: str):
+        self.db = db
+        self.job_id = job_id
+
+    def progress(self, rows_processed: int, phase: str | None = None, rows_total: int | None = None):
+        """Record progress and checkpoint: commit pending work, then check for cancel."""
+        values = {"rows_processed": rows_processed, "updated_at": _now()}
+        if phase:
+            values["phase"] = phase
+        if rows_total is not None:
+            values["rows_total"] = rows_total
+        self.db.query(Job).filter(Job.id == self.job_id).update(values)
+        self.db.commit()
+        self.raise_if_cancelled()
+
+    def raise_if_cancelled(self):
+        event = _cancel_events.get(self.job_id)
+        if event is not None and event.is_set():
+            raise JobCancelled()
+        requested = self.db.query(Job.cancel_requested).filter(Job.id == self.job_id).scalar()
+        if requested:
+            raise JobCancelled()
+
+
+# ── Handlers ─────────────────────────────────────────────────────
+
+def _run_ingest_job(db: Session, params: dict, ctx: JobContext) -> dict:
+    from app.services.claim_ingest_service import ingest_claims_csv
+
+    path = params["input_path"]
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Job input file is missing: {path}")
+
+    ctx.progress(0, "ingesting", _count_data_rows(path))
+    with open(path, "rb") as source:
+        result = ingest_claims_csv(
+            db, source, chunk_size=params["chunk_size"], progress=ctx.progress,
+            score=params.get("score", False),
+        )
+
+    if result.records_scored:
+        submit_provider_refresh(db)
+    return {
+        "records_inserted": result.records_inserted,
+        "duplicates_skipped": result.duplicates_skipped,
+        "records_scored": result.records_scored,
+        "new_flags": result.flags_created,
+        "errors": result.errors,
+    }
+
+
+def _run_analyze_job(db: Session, params: dict, ctx: JobContext) -> dict:
+    from app.services.claim_analysis_service import run_claim_analysis
+    return run_claim_analysis(db, progress=ctx.progress)
+
+
+def _run_provider_refresh_job(db: Session, params: dict, ctx: JobContext) -> dict:
+    from app.services.claim_analysis_service import refresh_provider_flags
+    ctx.progress(0, "aggregating")
+    return refresh_provider_flags(db)
+
+
+def _run_stats_reconcile_job(db: Session, params: dict, ctx: JobContext) -> dict:
+    from app.services.stats_service import reconcile_stats
+    return reconcile_stats(db)
+
+
+def _run_flag_backfill_job(db: Session, params: dict, ctx: JobContext) -> dict:
+    from app.services.claim_analysis_service import backfill_flag_attributes
+    return backfill_flag_attributes(db, progress=ctx.progress)
+
+
+JOB_HANDLERS: dict[str, Callable[[Session, dict, JobContext], dict]] = {
+    "ingest": _run_ingest_job,
+    "analyze": _run_analyze_job,
+    "provider_refresh": _run_provider_refresh_job,
+    "stats_reconcile": _run_stats_reconcile_job,
+    "flag_backfill": _run_flag_backfill_job,
+}
+
+
+# ── Submission & lifecycle ───────────────────────────────────────
+
+def submit_job(db: Session, kind: str, params: dict | None = None, job_id: str | None = None) -> Job:
+    """Persist a queued job and hand it to the executor. Returns immediately."""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    job = Job(id=job_id or uuid.uuid4().hex, kind=kind, status="queued", params=json.dumps(params or {}))
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    _schedule(job.id)
+    return job
+
+
+def submit_unique_job(db: Session, kind: str) -> Job:
+    """
+    Queue a parameterless job unless one of the same kind is already queued.
+
+    A queued job has not read any tables yet, so it also covers whatever
+    prompted the second submission.
+    """
+    queued = db.query(Job).filter(Job.kind == kind, Job.status == "queued").first()
+    return queued or submit_job(db, kind)
+
+
+def submit_provider_refresh(db: Session) -> Job:
+    """
+    Queue a Layer 3 provider refresh after score-on-ingest.
+
+    Ingests arriving in quick succession share one queued refresh.
+    """
+    return submit_unique_job(db, "provider_refresh")
+
+
+def new_job_input_path(job_id: str, suffix: str = ".csv") -> str:
+    """Path where a job's uploaded input is persisted until it completes."""
+    os.makedirs(JOB_INPUT_DIR, exist_ok=True)
+    return os.path.join(JOB_INPUT_DIR, f"{job_id}{suffix}")
+
+
+def _discard_job_input(params: str | None):
+    """Delete a finished job's uploaded input; kept only while the job can still run."""
+    path = json.loads(params or "{}").get("input_path")
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def request_cancel(db: Session, job: Job) -> Job:
+    """Flag a job for cancellation; queued jobs are cancelled outright."""
+    if job.status not in ACTIVE_STATUSES:
+        return job
+
+    job.cancel_requested = True
+    cancelled_outright = job.status == "queued"
+    if cancelled_outright:
+        job.status = "cancelled"
+        job.finished_at = _now()
+    job.updated_at = _now()
+    db.commit()
+    db.refresh(job)
+    if cancelled_outright:
+        _discard_job_input(job.params)
+
+    event = _cancel_events.get(job.id)
+    if event is not None:
+        event.set()
+    return job
+
+
+def recover_jobs():
+    """
+    Re-queue jobs left behind by a previous worker process.
+
+    Queued jobs are rescheduled. Running jobs whose last heartbeat is older
+    than JOB_STALE_SECONDS are reset to queued and rescheduled; ingest and
+    analyze are both idempotent, so a resumed job skips work already
+    committed.
+    """
+    stale_before = _now() - timedelta(seconds=settings.JOB_STALE_SECONDS)
+    db = SessionLocal()
+    try:
+        jobs = db.query(Job).filter(Job.status.in_(ACTIVE_STATUSES)).all()
+        to_schedule = []
+        for job in jobs:
+            if job.status == "running":
+                if _as_utc(job.updated_at) > stale_before:
+                    continue
+                job.status = "queued"
+                job.phase = "resumed"
+            to_schedule.append(job.id)
+        db.commit()
+    finally:
+        db.close()
+
+    for job_id in to_schedule:
+        _schedule(job_id)
+
+
+def job_to_dict(job: Job) -> dict:
+    """Serialize a job with derived throughput and ETA."""
+    throughput = None
+    eta_seconds = None
+    if job.started_at and job.rows_processed:
+        end = _as_utc(job.finished_at or job.updated_at)
+        elapsed = (end - _as_utc(job.started_at)).total_seconds()
+        if elapsed > 0:
+            throughput = round(job.rows_processed / elapsed, 1)
+            if job.status == "running" and job.rows_total:
+                remaining = max(job.rows_total - job.rows_processed, 0)
+                eta_seconds = round(remaining / throughput, 1)
+
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "phase": job.phase,
+        "rows_processed": job.rows_processed,
+        "rows_total": job.rows_total,
+        "rows_per_second": throughput,
+        "eta_seconds": eta_seconds,
+        "cancel_requested": job.cancel_requested,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def _schedule(job_id: str):
+    _cancel_events[job_id] = threading.Event()
+    _executor.submit(_run_job, job_id)
+
+
+def _run_job(job_id: str):
+    db = SessionLocal()
+    try:
+        # Claim the job atomically so only one worker process runs it
+        claimed = db.query(Job).filter(Job.id == job_id, Job.status == "queued").update({
+            "status": "running", "started_at": _now(), "updated_at": _now(),
+        })
+        db.commit()
+        if not claimed:
+            return
+
+        job = db.get(Job, job_id)
+        ctx = JobContext(db, job_id)
+        try:
+            result = JOB_HANDLERS[job.kind](db, json.loads(job.params or "{}"), ctx)
+            status, error = "succeeded", None
+        except JobCancelled:
+            db.rollback()
+            result, status, error = None, "cancelled", None
+        except Exception as e:
+            db.rollback()
+            result, status, error = None, "failed", str(e)
+
+        db.query(Job).filter(Job.id == job_id).update({
+            "status": status,
+            "result": json.dumps(result, default=str) if result is not None else None,
+            "error": error,
+            "updated_at": _now(),
+            "finished_at": _now(),
+        })
+        db.commit()
+        # Terminal in every case; a job interrupted by a crash never gets
+        # here and keeps its input for recover_jobs()
+        _discard_job_input(job.params)
+    finally:
+        db.close()
+        _cancel_events.pop(job_id, None)
+
+
+def _count_data_rows(path: str) -> int:
+    """Count CSV data rows by scanning newlines in fixed-size blocks."""
+    lines = 0
+    with open(path, "rb") as f:
+        while block := f.read(1 << 20):
+            lines += block.count(b"\n")
+    return max(lines - 1, 0)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(value: datetime) -> datetime:
+    """SQLite returns naive datetimes; treat them as UTC."""
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
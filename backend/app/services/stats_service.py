@@ -0,0 +1,315 @@
+"""
+Pipeline Stats Service
+
+Keeps the pipeline_stats rollup (claim and flag totals, reviewed count,
+score sum, service-date range) that GET /metrics and
+GET /api/anomalies/stats read instead of aggregating the claims and
+anomaly_flags tables on every request.
+
+Every writer records its delta in its own transaction with a relative
+UPDATE (``flags_total = flags_total + :n``), so concurrent writers never
+lose each other's increments and a rolled-back write leaves no trace.
+Writers that hold a transaction open for long (ingest, batch scoring,
+the provider refresh) collect their deltas in a StatsDelta and apply
+them with one UPDATE right before committing, so the single rollup row
+is locked only for the tail of the transaction rather than all of it.
+reconcile_stats() recomputes the row from the source tables and reports
+any drift; a background job runs it every STATS_RECONCILE_SECONDS.
+
+The same deltas keep provider_stats, the per-provider Layer 3 sums over
+scored claims: batch scoring adds each batch's sums (add_providers) and
+flush() upserts them with ``claim_count = claim_count + excluded...``
+after the rollup row, so writers queue on that row first and always
+touch provider rows in provider_id order. reconcile_stats() rebuilds
+the sums from the claims table too.
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+
+import pandas as pd
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db.models import AnomalyFlag, Claim, PipelineStats, ProviderStats
+
+STATS_ID = 1
+
+PROVIDER_SUMS = ["claim_count", "billed_sum", "ratio_sum", "ratio_sumsq"]
+
+_UPSERT_DIALECTS = {"sqlite": sqlite, "postgresql": postgresql}
+
+
+def _apply(db: Session, **values):
+    db.execute(
+        update(PipelineStats)
+        .where(PipelineStats.id == STATS_ID)
+        .values(updated_at=datetime.now(timezone.utc), **values)
+    )
+
+
+def _widen(column, bound: date | None, lower: bool):
+    if bound is None:
+        return column
+    beyond = bound < column if lower else bound > column
+    return case((column.is_(None) | beyond, bound), else_=column)
+
+
+def provider_sums(claims: pd.DataFrame) -> pd.DataFrame:
+    """Layer 3 sums per provider for a frame of claims, indexed by provider_id in sorted order."""
+    billed = claims["billed_amount"].astype("float64")
+    allowed = claims["allowed_amount"].astype("float64")
+    # billed / allowed, or 1.0 when nothing was allowed, as rebuild_provider_stats computes it
+    ratio = (billed / allowed.where(allowed > 0)).fillna(1.0)
+    return pd.DataFrame({
+        "provider_id": claims["provider_id"].astype(str),
+        "claim_count": 1,
+        "billed_sum": billed,
+        "ratio_sum": ratio,
+        "ratio_sumsq": ratio * ratio,
+    }).groupby("provider_id").sum()
+
+
+def _write_provider_sums(db: Session, sums: pd.DataFrame, replace: bool = False):
+    """Add ``sums`` to provider_stats (or overwrite the sums when ``replace``), inserting new providers."""
+    if sums.empty:
+        return
+    now = datetime.now(timezone.utc)
+    rows = [
+        {"provider_id": provider_id, "claim_count": int(count), "billed_sum": float(billed),
+         "ratio_sum": float(ratio), "ratio_sumsq": float(ratio_sq), "flagged": False, "updated_at": now}
+        for provider_id, count, billed, ratio, ratio_sq in sums[PROVIDER_SUMS].itertuples()
+    ]
+    dialect = db.get_bind().dialect.name
+    if dialect in _UPSERT_DIALECTS:
+        stmt = _UPSERT_DIALECTS[dialect].insert(ProviderStats)
+        values = {
+            col: stmt.excluded[col] if replace else getattr(ProviderStats, col) + stmt.excluded[col]
+            for col in PROVIDER_SUMS
+        }
+        db.execute(
+            stmt.on_conflict_do_update(index_elements=["provider_id"], set_={**values, "updated_at": now}),
+            rows,
+        )
+        return
+    for row in rows:
+        values = {col: row[col] if replace else getattr(ProviderStats, col) + row[col] for col in PROVIDER_SUMS}
+        result = db.execute(
+            update(ProviderStats)
+            .where(ProviderStats.provider_id == row["provider_id"])
+            .values(**values, updated_at=now)
+        )
+        if not result.rowcount:
+            db.execute(insert(ProviderStats).values(**row))
+
+
+@dataclass
+class StatsDelta:
+    """Rollup changes held in memory until flush() applies them with one UPDATE."""
+
+    claims: int = 0
+    date_min: date | None = None
+    date_max: date | None = None
+    flags: int = 0
+    score_sum: float = 0.0
+    providers: pd.DataFrame | None = None
+
+    def add_claims(self, count: int, date_min: date | None = None, date_max: date | None = None):
+        if not count:
+            return
+        self.claims += count
+        if date_min is not None and (self.date_min is None or date_min < self.date_min):
+            self.date_min = date_min
+        if date_max is not None and (self.date_max is None or date_max > self.date_max):
+            self.date_max = date_max
+
+    def add_flags(self, count: int, score_sum: float):
+        if count:
+            self.flags += count
+            self.score_sum += score_sum
+
+    def add_rescores(self, score_delta: float):
+        self.score_sum += score_delta
+
+    def add_providers(self, claims: pd.DataFrame):
+        """Add newly scored ``claims`` to their providers' Layer 3 sums."""
+        sums = provider_sums(claims)
+        self.providers = sums if self.providers is None else self.providers.add(sums, fill_value=0)
+
+    def flush(self, db: Session):
+        """Apply the accumulated changes (nothing is committed) and reset."""
+        values = {}
+        if self.claims:
+            values.update(
+                claims_total=PipelineStats.claims_total + self.claims,
+                service_date_min=_widen(PipelineStats.service_date_min, self.date_min, lower=True),
+                service_date_max=_widen(PipelineStats.service_date_max, self.date_max, lower=False),
+            )
+        if self.flags:
+            values["flags_total"] = PipelineStats.flags_total + self.flags
+        if self.score_sum:
+            values["flag_score_sum"] = PipelineStats.flag_score_sum + self.score_sum
+        if values:
+            _apply(db, **values)
+        if self.providers is not None:
+            _write_provider_sums(db, self.providers)
+        self.claims, self.date_min, self.date_max = 0, None, None
+        self.flags, self.score_sum = 0, 0.0
+        self.providers = None
+
+
+def record_claims(db: Session, count: int, date_min: date | None = None, date_max: date | None = None):
+    """Add ``count`` new claims whose service dates span [date_min, date_max]."""
+    delta = StatsDelta()
+    delta.add_claims(count, date_min, date_max)
+    delta.flush(db)
+
+
+def record_flags(db: Session, count: int, score_sum: float):
+    """Add ``count`` new, unreviewed flags whose scores total ``score_sum``."""
+    delta = StatsDelta()
+    delta.add_flags(count, score_sum)
+    delta.flush(db)
+
+
+def record_rescores(db: Session, score_delta: float):
+    """Adjust the score sum for existing flags whose scores changed by ``score_delta`` in total."""
+    delta = StatsDelta()
+    delta.add_rescores(score_delta)
+    delta.flush(db)
+
+
+def record_reviews(db: Session, delta: int):
+    """Adjust the reviewed count (+n marked reviewed, -n unmarked)."""
+    if delta:
+        _apply(db, flags_reviewed=PipelineStats.flags_reviewed + delta)
+
+
+def compute_stats(db: Session) -> dict:
+    """The rollup's values, aggregated from the source tables."""
+    claims_total, date_min, date_max = db.query(
+        func.count(Claim.id), func.min(Claim.service_date), func.max(Claim.service_date),
+    ).one()
+    flags_total, flags_reviewed, score_sum = db.query(
+        func.count(AnomalyFlag.id),
+        func.sum(case((AnomalyFlag.reviewed == True, 1), else_=0)),  # noqa: E712
+        func.sum(AnomalyFlag.anomaly_score),
+    ).one()
+    return {
+        "claims_total": claims_total or 0,
+        "flags_total": flags_total or 0,
+        "flags_reviewed": int(flags_reviewed or 0),
+        "flag_score_sum": float(score_sum or 0.0),
+        "service_date_min": date_min,
+        "service_date_max": date_max,
+    }
+
+
+def rebuild_provider_stats(db: Session) -> dict:
+    """
+    Overwrite provider_stats' sums with ones aggregated from the scored
+    claims (nothing is committed; ``flagged`` is kept). Returns the
+    scored-claim count stored before and after, for drift reporting.
+    """
+    stored = db.query(func.sum(ProviderStats.claim_count)).scalar() or 0
+    ratio = case((Claim.allowed_amount > 0, Claim.billed_amount / Claim.allowed_amount), else_=1.0)
+    result = db.execute(
+        select(
+            Claim.provider_id,
+            func.count().label("claim_count"),
+            func.sum(Claim.billed_amount).label("billed_sum"),
+            func.sum(ratio).label("ratio_sum"),
+            func.sum(ratio * ratio).label("ratio_sumsq"),
+        )
+        .where(Claim.scored_at.is_not(None))
+        .group_by(Claim.provider_id)
+        .order_by(Claim.provider_id)
+    )
+    sums = pd.DataFrame(result.fetchall(), columns=list(result.keys())).set_index("provider_id")
+    _write_provider_sums(db, sums, replace=True)
+    return {"stored": int(stored), "actual": int(sums["claim_count"].sum())}
+
+
+def reconcile_stats(db: Session) -> dict:
+    """
+    Recompute the rollup and provider_stats from the source tables and
+    commit them.
+
+    Returns the drift that was corrected: stored and actual values for
+    every field that disagreed, with provider_stats' total under
+    "provider_claims".
+    """
+    # Lock first: writers block on the row until we commit, so no delta
+    # lands between the recount and the overwrite
+    stats = db.get(PipelineStats, STATS_ID, with_for_update=True)
+    actual = compute_stats(db)
+    drift = {}
+    if stats is None:
+        stats = PipelineStats(id=STATS_ID)
+        db.add(stats)
+    else:
+        for key, value in actual.items():
+            stored = getattr(stats, key)
+            differs = abs(stored - value) > 1e-6 if key == "flag_score_sum" else stored != value
+            if differs:
+                drift[key] = {"stored": stored, "actual": value}
+
+    provider_claims = rebuild_provider_stats(db)
+    if provider_claims["stored"] != provider_claims["actual"]:
+        drift["provider_claims"] = provider_claims
+
+    now = datetime.now(timezone.utc)
+    for key, value in actual.items():
+        setattr(stats, key, value)
+    stats.updated_at = now
+    stats.reconciled_at = now
+    db.commit()
+    return {"status": "complete", "drift": drift}
+
+
+def get_stats(db: Session) -> PipelineStats:
+    """The current rollup row, built from the source tables if it does not exist yet."""
+    stats = db.get(PipelineStats, STATS_ID)
+    if stats is None:
+        reconcile_stats(db)
+        stats = db.get(PipelineStats, STATS_ID)
+    return stats
+
+
+# ── Periodic reconciliation ──────────────────────────────────────
+
+_reconciler: threading.Thread | None = None
+
+
+def start_stats_reconciler(interval: float | None = None) -> threading.Thread | None:
+    """
+    Queue a stats_reconcile job every ``interval`` seconds from a daemon
+    thread (default STATS_RECONCILE_SECONDS; 0 disables). One per process;
+    workers share a single queued job.
+    """
+    global _reconciler
+    interval = settings.STATS_RECONCILE_SECONDS if interval is None else interval
+    if interval <= 0 or _reconciler is not None:
+        return _reconciler
+
+    from app.db.database import SessionLocal
+    from app.services.job_service import submit_unique_job
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            db = SessionLocal()
+            try:
+                submit_unique_job(db, "stats_reconcile")
+            except Exception:
+                db.rollback()  # Retry on the next tick
+            finally:
+                db.close()
+
+    _reconciler = threading.Thread(target=loop, name="stats-reconciler", daemon=True)
+    _reconciler.start()
+    return _reconciler
@@ -0,0 +1,342 @@
+"""
+Anomaly Detector Benchmarks
+
+Times AnomalyDetector.train / score and each detection layer on its own
+at several synthetic data scales, and records wall time, rows per second
+and peak RSS per case. Every (case, scale) runs in a fresh subprocess so
+peak memory is attributable to that case alone; data generation happens
+before the peak-RSS counter is reset and is never timed. Layer 2 and
+full scoring are measured twice: through a sklearn model.joblib, and
+through the model registry's memory-mapped CompiledForests, which is
+the path production scoring takes.
+
+Results are written as JSON and can be compared against a stored
+baseline: a case regresses when its time or peak RSS grows by more than
+--tolerance (default 25%). Times are compared relative to a fixed
+calibration loop run on each machine, so a baseline recorded on one
+machine stays meaningful on faster or slower hardware. Calibration is
+single-threaded, so it cannot correct for core count: cases that fan
+out (n_jobs, process pools) are only comparable between machines with
+the same cpu_count, and a mismatch is reported. Record baselines on the
+CI runner and describe it with --note. The exit status
+is 1 on any regression, so the suite can gate CI.
+
+Usage (from backend/):
+    python -m benchmarks.run                                  # 50k + 1m, compare to baseline.json
+    python -m benchmarks.run --scales 50k,1m,10m --out results.json
+    python -m benchmarks.run --save-baseline --note "CI runner, 8 vCPU"  # overwrite benchmarks/baseline.json
+
+The 10m scale needs roughly 8 GB of RAM.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+
+SCALES = {"50k": 50_000, "1m": 1_000_000, "10m": 10_000_000}
+DEFAULT_SCALES = "50k,1m"
+DEFAULT_TOLERANCE = 0.25
+
+# Cases that need a trained model; each is fitted once on 50K rows and shared
+MODEL_CASES = {"score", "layer2_isolation_forest"}
+REGISTRY_CASES = {"score_registry", "layer2_compiled_forest"}
+CASES = [
+    "features",
+    "layer1_duplicates",
+    "layer1_crosswalk",
+    "layer2_isolation_forest",
+    "layer2_compiled_forest",
+    "layer3_provider",
+    "train",
+    "score",
+    "score_registry",
+]
+
+MODEL_TRAIN_ROWS = 50_000
+CALIBRATION_REPEAT = 5
+
+
+# ── Worker side: one case, one process ───────────────────────────
+
+def load_claims(rows: int, seed: int = 42):
+    """Synthetic claims from scripts/generate_data.py, with plain string columns like ingest."""
+    import pandas as pd
+
+    path = os.path.join(BACKEND_DIR, "scripts", "generate_data.py")
+    spec = importlib.util.spec_from_file_location("generate_data", path)
+    generate_data = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(generate_data)
+
+    df = pd.concat(generate_data.ClaimGenerator(rows, seed=seed).partition(0), ignore_index=True)
+    for col in ["cpt_code", "icd10_code", "claim_status"]:
+        df[col] = df[col].astype(str)
+    return df
+
+
+def _reset_peak_rss() -> bool:
+    """Reset the kernel's peak-RSS counter (Linux 4.0+); False when unsupported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _rss_mb(field: str) -> float | None:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def calibrate() -> float:
+    """
+    Seconds for a fixed NumPy + interpreter workload (best of a few runs).
+
+    Stands in for the machine's single-core speed; case times are divided
+    by it before being compared with a baseline.
+    """
+    import numpy as np
+
+    values = np.random.default_rng(0).random(1_000_000)
+    index = np.random.default_rng(1).integers(0, len(values), size=1_000_000)
+    timings = []
+    for _ in range(CALIBRATION_REPEAT):
+        start = time.perf_counter()
+        np.sort(values)
+        values[index].sum()
+        total = 0
+        for i in range(300_000):
+            total += i % 7
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def _case_fn(case: str, df, model_dir: str | None):
+    from ml import anomaly_detector as ad
+    from ml.features import build_feature_matrix
+
+    if case == "features":
+        return lambda: build_feature_matrix(df)
+    if case == "layer1_duplicates":
+        return lambda: ad.detect_duplicates(df)
+    if case == "layer1_crosswalk":
+        crosswalk = ad.load_crosswalk()
+        return lambda: ad.detect_cpt_icd_mismatch(df, crosswalk)
+    if case == "layer3_provider":
+        return lambda: ad.detect_provider_anomalies(df)
+    if case == "train":
+        return lambda: ad.AnomalyDetector().train(df)
+
+    if case in REGISTRY_CASES:
+        from ml.registry import ModelRegistry
+        detector = ModelRegistry(os.path.join(model_dir, "registry")).load()
+    else:
+        detector = ad.AnomalyDetector().load(os.path.join(model_dir, "model.joblib"))
+    if case in ("layer2_isolation_forest", "layer2_compiled_forest"):
+        return lambda: ad.score_with_per_cpt_models(df, detector.models)
+    if case in ("score", "score_registry"):
+        return lambda: detector.score(df)
+    raise ValueError(f"Unknown benchmark case: {case}")
+
+
+def run_case(case: str, rows: int, repeat: int, model_dir: str | None) -> dict:
+    df = load_claims(rows)
+    fn = _case_fn(case, df, model_dir)
+    base_rss = _rss_mb("VmRSS")
+    exact_peak = _reset_peak_rss()
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    peak = _rss_mb("VmHWM") if exact_peak else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    seconds = min(timings)
+    return {
+        "case": case,
+        "rows": rows,
+        "seconds": round(seconds, 4),
+        "rows_per_second": round(rows / seconds) if seconds > 0 else None,
+        "peak_rss_mb": round(peak, 1) if peak is not None else None,
+        "rss_delta_mb": round(peak - base_rss, 1) if peak is not None and base_rss is not None else None,
+        "repeat": repeat,
+    }
+
+
+# ── Driver side ──────────────────────────────────────────────────
+
+def _spawn(case: str, rows: int, repeat: int, model_dir: str) -> dict:
+    cmd = [
+        sys.executable, "-m", "benchmarks.run", "--worker",
+        "--case", case, "--rows", str(rows), "--repeat", str(repeat), "--model-dir", model_dir,
+    ]
+    proc = subprocess.run(cmd, cwd=BACKEND_DIR, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{case} @ {rows:,} rows failed:\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _environment(calibration_seconds: float, note: str | None = None) -> dict:
+    import numpy
+    import pandas
+    import sklearn
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True,
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "pandas": pandas.__version__,
+        "sklearn": sklearn.__version__,
+        "cpu_count": os.cpu_count(),
+        "platform": platform.platform(),
+        "calibration_seconds": round(calibration_seconds, 4),
+        "note": note,
+    }
+
+
+def _write_report(path: str, report: dict):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+
+
+def compare(
+    results: list[dict], baseline: list[dict], tolerance: float, speed_ratio: float = 1.0,
+) -> list[dict]:
+    """
+    Cases whose time or peak RSS exceeds the baseline by more than ``tolerance``.
+
+    ``speed_ratio`` is this machine's calibration time over the baseline's;
+    baseline times are scaled by it before comparing.
+    """
+    reference = {(r["case"], r["rows"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        base = reference.get((result["case"], result["rows"]))
+        if base is None:
+            continue
+        for metric in ("seconds", "peak_rss_mb"):
+            if result.get(metric) is None or not base.get(metric):
+                continue
+            scale = speed_ratio if metric == "seconds" else 1.0
+            ratio = result[metric] / (base[metric] * scale)
+            if ratio > 1 + tolerance:
+                regressions.append({
+                    "case": result["case"], "rows": result["rows"], "metric": metric,
+                    "baseline": base[metric], "current": result[metric], "ratio": round(ratio, 2),
+                })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the anomaly detector.")
+    parser.add_argument("--scales", default=DEFAULT_SCALES, help=f"Comma list of {', '.join(SCALES)}")
+    parser.add_argument("--cases", default=",".join(CASES))
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per case; the fastest is kept")
+    parser.add_argument("--out", help="Write results JSON here")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the baseline")
+    parser.add_argument("--note", help="Describe the machine (stored with the results)")
+    # Internal: run a single case in this process
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    parser.add_argument("--rows", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--model-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_case(args.case, args.rows, args.repeat, args.model_dir)))
+        return
+
+    scales = [SCALES[s.strip()] for s in args.scales.split(",")]
+    cases = [c.strip() for c in args.cases.split(",")]
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        raise SystemExit(f"Unknown cases: {', '.join(sorted(unknown))}")
+
+    calibration_seconds = calibrate()
+    print(f"Calibration loop: {calibration_seconds:.3f}s")
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="anomaly_bench_") as tmp:
+        if MODEL_CASES & set(cases):
+            from ml.anomaly_detector import AnomalyDetector
+            AnomalyDetector().train(load_claims(MODEL_TRAIN_ROWS)).save(os.path.join(tmp, "model.joblib"))
+        if REGISTRY_CASES & set(cases):
+            from ml.registry import ModelRegistry
+            ModelRegistry(os.path.join(tmp, "registry")).retrain(load_claims(MODEL_TRAIN_ROWS), full=True)
+
+        print(f"{'case':<26}{'rows':>12}{'seconds':>10}{'rows/s':>14}{'peak MB':>10}")
+        for rows in scales:
+            for case in cases:
+                result = _spawn(case, rows, args.repeat, tmp)
+                results.append(result)
+                print(f"{case:<26}{rows:>12,}{result['seconds']:>10.3f}"
+                      f"{result['rows_per_second'] or 0:>14,}{result['peak_rss_mb'] or 0:>10.1f}")
+
+    report = {"environment": _environment(calibration_seconds, args.note), "results": results}
+    if args.out:
+        _write_report(args.out, report)
+        print(f"Results written to {args.out}")
+
+    if args.save_baseline:
+        _write_report(args.baseline, report)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against (run with --save-baseline).")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    base_calibration = baseline["environment"].get("calibration_seconds")
+    if base_calibration:
+        speed_ratio = calibration_seconds / base_calibration
+        print(f"This machine runs the calibration loop at x{speed_ratio:.2f} the baseline's time.")
+    else:
+        speed_ratio = 1.0
+        print("Baseline has no calibration time; comparing raw seconds.")
+    base_cpus = baseline["environment"].get("cpu_count")
+    if base_cpus and base_cpus != os.cpu_count():
+        print(f"Baseline ran on {base_cpus} CPUs, this machine has {os.cpu_count()}: "
+              "parallel cases are not comparable.")
+    regressions = compare(results, baseline["results"], args.tolerance, speed_ratio)
+    if not regressions:
+        print(f"No regressions beyond {args.tolerance:.0%} of baseline ({baseline['environment'].get('commit')}).")
+        return
+    print(f"Regressions beyond {args.tolerance:.0%} of baseline:")
+    for r in regressions:
+        print(f"  {r['case']} @ {r['rows']:,} rows: {r['metric']} {r['baseline']} -> {r['current']} (x{r['ratio']})")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,32 +9,46 @@ Each layer is independently explainable. The hybrid approach achieves high
 precision because each detector targets the anomaly type it's best suited for.
 """
 
+import multiprocessing
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
 import joblib
 import numpy as np
 import pandas as pd
 from sklearn.ensemble import IsolationForest
 from sklearn.metrics import precision_score, recall_score, f1_score, classification_report
 
+from ml.compiled_forest import CompiledForest
+from ml.crosswalk import Crosswalk
+from ml.features import NUMERICAL_FEATURES, FeatureMatrix, build_feature_matrix
+from ml.telemetry import layer_timer, observe_layer, record_cpt
+
 
 MODEL_DIR = os.path.dirname(__file__)
 MODEL_PATH = os.path.join(MODEL_DIR, "model.joblib")
 CROSSWALK_PATH = os.path.join(MODEL_DIR, "data", "cpt_icd10_crosswalk.csv")
 
+# Process pool size for per-CPT training/scoring (0 = one per core)
+CPT_WORKERS = int(os.getenv("ANOMALY_CPT_WORKERS", "0")) or (os.cpu_count() or 1)
+# Below this many rows, scoring stays in-process (pool startup would dominate)
+PARALLEL_SCORE_MIN_ROWS = 200_000
+# CPT groups this large are scored by the sklearn estimator behind a
+# CompiledForest; the NumPy walk is only faster on fewer rows
+COMPILED_MAX_ROWS = 1_000
+# CPT groups smaller than this get no forest
+MIN_CPT_TRAIN_ROWS = 20
+
 
 # ═══════════════════════════════════════════════════════════════
 # Layer 1 — Rule-Based Detection
 # ═══════════════════════════════════════════════════════════════
 
-def load_crosswalk(path: str = CROSSWALK_PATH) -> dict[str, set[str]]:
-    """Load CMS CPT-to-ICD-10 crosswalk into a lookup dict."""
-    if not os.path.exists(path):
-        return {}
-    df = pd.read_csv(path)
-    crosswalk = {}
-    for cpt, group in df.groupby("cpt_code"):
-        crosswalk[str(cpt)] = set(group["icd10_code"].astype(str))
-    return crosswalk
+def load_crosswalk(path: str = CROSSWALK_PATH) -> Crosswalk:
+    """Load the CMS CPT-to-ICD-10 crosswalk, compiled for vectorized lookup."""
+    return Crosswalk.from_csv(path)
 
 
 def detect_duplicates(df: pd.DataFrame) -> pd.Series:
@@ -45,121 +59,201 @@ def detect_duplicates(df: pd.DataFrame) -> pd.Series:
     return df.duplicated(subset=["claim_id"], keep=False)
 
 
-def detect_cpt_icd_mismatch(df: pd.DataFrame, crosswalk: dict[str, set[str]]) -> pd.Series:
+def detect_cpt_icd_mismatch(
+    df: pd.DataFrame,
+    crosswalk: Crosswalk | dict[str, set[str]],
+    features: FeatureMatrix | None = None,
+) -> pd.Series:
     """
     Flag claims where the ICD-10 code is not a valid pairing for the CPT code,
     according to the CMS crosswalk reference data.
     """
-    if not crosswalk or "icd10_code" not in df.columns:
-        return pd.Series(False, index=df.index)
-
-    mismatch = pd.Series(False, index=df.index)
-    for idx, row in df.iterrows():
-        cpt = str(row.get("cpt_code", ""))
-        icd = str(row.get("icd10_code", ""))
-        if cpt in crosswalk and icd not in crosswalk[cpt]:
-            mismatch.at[idx] = True
-    return mismatch
+    if isinstance(crosswalk, dict):
+        crosswalk = Crosswalk.from_mapping(crosswalk)
+    return crosswalk.mismatches(df, features)
 
 
 # ═══════════════════════════════════════════════════════════════
 # Layer 2 — Per-CPT Isolation Forest
 # ═══════════════════════════════════════════════════════════════
 
-NUMERICAL_FEATURES = ["billed_amount", "allowed_amount", "paid_amount", "billed_to_paid_ratio"]
-
-
-def engineer_features(df: pd.DataFrame) -> pd.DataFrame:
-    """Add engineered numerical features."""
-    out = df.copy()
-    out["billed_to_paid_ratio"] = np.where(
-        out["paid_amount"] > 0,
-        out["billed_amount"] / out["paid_amount"],
-        out["billed_amount"],
-    )
-    out["billed_to_allowed_ratio"] = np.where(
-        out["allowed_amount"] > 0,
-        out["billed_amount"] / out["allowed_amount"],
-        1.0,
+def _fit_cpt_model(cpt_code: str, contamination: float, X: np.ndarray, n_jobs: int):
+    start = time.perf_counter()
+    model = IsolationForest(
+        n_estimators=200,
+        contamination=contamination,
+        max_features=0.8,
+        random_state=42,
+        n_jobs=n_jobs,
     )
-    return out
-
-
-def train_per_cpt_models(df: pd.DataFrame, contamination: float = 0.08) -> dict:
+    model.fit(X)
+    return cpt_code, model, time.perf_counter() - start
+
+
+def _score_cpt_model(cpt_code: str, model, X: np.ndarray, n_jobs: int):
+    start = time.perf_counter()
+    if isinstance(model, CompiledForest) and len(X) >= COMPILED_MAX_ROWS:
+        model = model.estimator() or model
+    if hasattr(model, "feature_names_in_"):
+        # Models saved before the shared feature matrix were fitted on DataFrames
+        X = pd.DataFrame(X, columns=model.feature_names_in_)
+    if isinstance(model, IsolationForest):
+        # Cap threads at this worker's share of the cores: models trained
+        # earlier (or with n_jobs=-1) would otherwise use every core in
+        # every pool worker. Older sklearn reads model.n_jobs when scoring,
+        # newer releases the joblib context.
+        model.set_params(n_jobs=n_jobs)
+        with joblib.parallel_config(n_jobs=n_jobs):
+            scores = model.decision_function(X)
+    else:
+        scores = model.decision_function(X)  # CompiledForest: single-threaded NumPy
+    return cpt_code, scores, time.perf_counter() - start
+
+
+def _run_cpt_tasks(fn, tasks: list[tuple], n_workers: int) -> list:
+    """
+    Run per-CPT tasks ``fn(cpt_code, ..., X, n_jobs)``, largest groups first.
+    Each task returns ``(cpt_code, result, seconds)``.
+
+    With one worker the tasks run serially in-process. Otherwise they are
+    spread across a process pool; submitting in descending size order keeps
+    the biggest forests from landing last and stretching the tail. Each
+    task receives n_jobs = cores // workers so total threads stay at the
+    core count.
+    """
+    tasks = sorted(tasks, key=lambda t: len(t[-1]), reverse=True)
+    n_workers = max(1, min(n_workers, len(tasks)))
+    n_jobs = max(1, (os.cpu_count() or 1) // n_workers)
+
+    if n_workers == 1:
+        return [fn(*task, n_jobs) for task in tasks]
+
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=context) as pool:
+        futures = [pool.submit(fn, *task, n_jobs) for task in tasks]
+        return [f.result() for f in futures]
+
+
+def train_per_cpt_models(
+    df: pd.DataFrame,
+    contamination: float = 0.08,
+    n_workers: int | None = None,
+    features: FeatureMatrix | None = None,
+    cpt_codes: set[str] | None = None,
+) -> dict:
     """
     Train one Isolation Forest per CPT code group.
     $800 is normal for an MRI but suspicious for a blood draw —
     per-CPT training captures this domain reality.
+
+    Groups are fitted across ``n_workers`` processes (default CPT_WORKERS);
+    every forest is seeded, so results match the serial path exactly.
+    ``cpt_codes`` restricts fitting to those groups (selective retraining).
     """
-    featured = engineer_features(df)
-    models = {}
+    if features is None:
+        features = build_feature_matrix(df)
 
-    for cpt_code, group in featured.groupby("cpt_code"):
-        if len(group) < 20:
+    groups = features.cpt_groups()
+    tasks = []
+    for cpt_code, rows in groups.items():
+        if len(rows) < MIN_CPT_TRAIN_ROWS:
             continue  # Not enough data for meaningful model
+        if cpt_codes is not None and cpt_code not in cpt_codes:
+            continue
+        tasks.append((cpt_code, contamination, features.X[rows]))
+
+    fitted = {}
+    for cpt_code, model, seconds in _run_cpt_tasks(_fit_cpt_model, tasks, n_workers or CPT_WORKERS):
+        fitted[cpt_code] = model
+        record_cpt("train", cpt_code, seconds, len(groups[cpt_code]))
+    # Keep the serial path's CPT ordering
+    return {cpt_code: fitted[cpt_code] for cpt_code, _, _ in tasks}
+
+
+def score_with_per_cpt_models(
+    df: pd.DataFrame,
+    models: dict,
+    n_workers: int | None = None,
+    features: FeatureMatrix | None = None,
+) -> pd.DataFrame:
+    """
+    Score claims using per-CPT Isolation Forest models.
 
-        X = group[NUMERICAL_FEATURES].fillna(0)
-        model = IsolationForest(
-            n_estimators=200,
-            contamination=contamination,
-            max_features=0.8,
-            random_state=42,
-            n_jobs=-1,
-        )
-        model.fit(X)
-        models[str(cpt_code)] = model
-
-    return models
-
-
-def score_with_per_cpt_models(df: pd.DataFrame, models: dict) -> pd.DataFrame:
-    """Score claims using per-CPT Isolation Forest models."""
-    featured = engineer_features(df)
+    Returns only the if_score / if_anomaly columns, aligned with ``df``.
+    Large batches (PARALLEL_SCORE_MIN_ROWS+) are scored across a process
+    pool, largest CPT groups first.
+    """
+    if features is None:
+        features = build_feature_matrix(df)
     scores = np.zeros(len(df))
     anomaly_flags = np.zeros(len(df), dtype=bool)
 
-    for cpt_code, group in featured.groupby("cpt_code"):
-        cpt_str = str(cpt_code)
-        if cpt_str not in models:
-            continue
+    groups = features.cpt_groups()
+    tasks = [
+        (cpt_code, models[cpt_code], features.X[rows])
+        for cpt_code, rows in groups.items() if cpt_code in models
+    ]
 
-        X = group[NUMERICAL_FEATURES].fillna(0)
-        cpt_scores = models[cpt_str].decision_function(X)
-        scores[group.index] = cpt_scores
-        anomaly_flags[group.index] = cpt_scores < -0.1
+    if n_workers is None:
+        n_workers = CPT_WORKERS if len(df) >= PARALLEL_SCORE_MIN_ROWS else 1
 
-    result = df.copy()
-    result["if_score"] = np.round(scores, 4)
-    result["if_anomaly"] = anomaly_flags
-    return result
+    for cpt_code, cpt_scores, seconds in _run_cpt_tasks(_score_cpt_model, tasks, n_workers):
+        rows = groups[cpt_code]
+        record_cpt("score", cpt_code, seconds, len(rows))
+        scores[rows] = cpt_scores
+        anomaly_flags[rows] = cpt_scores < -0.1
+
+    return pd.DataFrame(
+        {"if_score": np.round(scores, 4), "if_anomaly": anomaly_flags},
+        index=df.index,
+    )
 
 
 # ═══════════════════════════════════════════════════════════════
 # Layer 3 — Provider-Level Behavioral Z-Score Analysis
 # ═══════════════════════════════════════════════════════════════
 
-def detect_provider_anomalies(df: pd.DataFrame, z_threshold: float = 3.0) -> pd.Series:
+def provider_aggregates(features: FeatureMatrix) -> pd.DataFrame:
     """
-    Flag claims from providers with statistically anomalous behavior:
+    Per-provider sufficient statistics for Layer 3: claim count plus sums of
+    billed amount and billed-to-allowed ratio (and its square). Sums are
+    additive, so aggregates from separate batches can be combined with
+    ``a.add(b, fill_value=0)``.
+    """
+    codes = features.provider_codes
+    valid = codes >= 0
+    codes = codes[valid]
+    n = len(features.provider_categories)
+    billed = features.billed[valid].astype(np.float64)
+    ratio = features.billed_to_allowed_ratio[valid].astype(np.float64)
+
+    return pd.DataFrame({
+        "claim_count": np.bincount(codes, minlength=n),
+        "billed_sum": np.bincount(codes, weights=billed, minlength=n),
+        "ratio_sum": np.bincount(codes, weights=ratio, minlength=n),
+        "ratio_sumsq": np.bincount(codes, weights=ratio * ratio, minlength=n),
+    }, index=features.provider_categories)
+
+
+def flag_providers(aggregates: pd.DataFrame, z_threshold: float = 3.0) -> pd.Index:
+    """
+    Return provider_ids with statistically anomalous behavior:
     - Claims per day significantly above peers
     - Average billed amount far above peer average for same CPT codes
     - Billed-to-allowed ratio unusually consistent (near 1.0 across all claims)
     """
-    provider_flags = pd.Series(False, index=df.index)
-
-    if "provider_id" not in df.columns or len(df) < 50:
-        return provider_flags
-
-    featured = engineer_features(df)
-
-    # Aggregate per provider
-    provider_stats = featured.groupby("provider_id").agg(
-        claim_count=("claim_id", "count"),
-        avg_billed=("billed_amount", "mean"),
-        std_billed=("billed_amount", "std"),
-        avg_ratio=("billed_to_allowed_ratio", "mean"),
-        std_ratio=("billed_to_allowed_ratio", "std"),
-    ).fillna(0)
+    count = aggregates["claim_count"].astype(np.float64)
+    provider_stats = pd.DataFrame({
+        "claim_count": count,
+        "avg_billed": aggregates["billed_sum"] / count,
+        "avg_ratio": aggregates["ratio_sum"] / count,
+    }, index=aggregates.index)
+
+    # Sample std (ddof=1) from sums; single-claim providers get 0
+    variance = (aggregates["ratio_sumsq"] - aggregates["ratio_sum"] ** 2 / count) / (count - 1)
+    provider_stats["std_ratio"] = np.sqrt(variance.clip(lower=0)).where(count > 1, 0)
+    provider_stats = provider_stats.fillna(0)
 
     # Z-score each metric across providers
     for col in ["claim_count", "avg_billed", "avg_ratio"]:
@@ -184,10 +278,50 @@ def detect_provider_anomalies(df: pd.DataFrame, z_threshold: float = 3.0) -> pd.
         (provider_stats["claim_count"] > 20)
     ].index
 
-    flagged_providers = set(anomalous_providers) | set(consistent_billers)
-    provider_flags = df["provider_id"].isin(flagged_providers)
+    return anomalous_providers.union(consistent_billers)
+
+
+def detect_provider_anomalies(
+    df: pd.DataFrame,
+    z_threshold: float = 3.0,
+    features: FeatureMatrix | None = None,
+) -> pd.Series:
+    """Flag claims from providers whose aggregate behavior is anomalous."""
+    if "provider_id" not in df.columns or len(df) < 50:
+        return pd.Series(False, index=df.index)
+
+    if features is None:
+        features = build_feature_matrix(df)
 
-    return provider_flags
+    flagged = flag_providers(provider_aggregates(features), z_threshold)
+    flagged_codes = features.provider_categories.get_indexer(flagged)
+    return pd.Series(np.isin(features.provider_codes, flagged_codes), index=df.index)
+
+
+# ═══════════════════════════════════════════════════════════════
+# Flag Reasons — one bit per layer, strings precomputed per bitmask
+# ═══════════════════════════════════════════════════════════════
+
+REASON_LAYERS = [
+    ("_layer1_dup", "duplicate claim ID"),
+    ("_layer1_mismatch", "CPT/ICD-10 coding mismatch"),
+    ("_layer2_if", "statistical amount outlier"),
+    ("_layer3_provider", "anomalous provider pattern"),
+]
+
+FLAG_REASONS = np.array([
+    "; ".join(reason for bit, (_, reason) in enumerate(REASON_LAYERS) if code >> bit & 1)
+    or "multivariate anomaly"
+    for code in range(1 << len(REASON_LAYERS))
+], dtype=object)
+
+
+def flag_reasons(scored: pd.DataFrame) -> np.ndarray:
+    """Reason string for every row of a scored frame, built column-wise."""
+    codes = np.zeros(len(scored), dtype=np.intp)
+    for bit, (col, _) in enumerate(REASON_LAYERS):
+        codes |= scored[col].to_numpy(dtype=bool).astype(np.intp) << bit
+    return FLAG_REASONS[codes]
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -197,82 +331,113 @@ def detect_provider_anomalies(df: pd.DataFrame, z_threshold: float = 3.0) -> pd.
 class AnomalyDetector:
     """Three-layer anomaly detection orchestrator."""
 
-    def __init__(self, contamination: float = 0.08):
+    def __init__(self, contamination: float = 0.08, n_workers: int | None = None):
         self.contamination = contamination
+        self.n_workers = n_workers
         self.models = {}
-        self.crosswalk = {}
+        self.crosswalk = Crosswalk.empty()
+        self.version: str | None = None
         self._is_fitted = False
 
     def train(self, df: pd.DataFrame) -> "AnomalyDetector":
         """Train per-CPT Isolation Forest models and load crosswalk."""
-        self.models = train_per_cpt_models(df, self.contamination)
+        n = len(df)
+        start = time.perf_counter()
+        with layer_timer("train", "features", n):
+            features = build_feature_matrix(df)
+        with layer_timer("train", "if", n):
+            self.models = train_per_cpt_models(df, self.contamination, self.n_workers, features)
         self.crosswalk = load_crosswalk()
+        observe_layer("train", "total", time.perf_counter() - start, n)
+        self.version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
         self._is_fitted = True
         return self
 
     def save(self, path: str = MODEL_PATH):
-        """Persist models to disk."""
-        joblib.dump({"models": self.models, "crosswalk": self.crosswalk}, path)
+        """Persist models to disk (write-then-rename so readers never see a partial file)."""
+        tmp_path = f"{path}.tmp"
+        joblib.dump({"models": self.models, "crosswalk": self.crosswalk, "version": self.version}, tmp_path)
+        os.replace(tmp_path, path)
 
     def load(self, path: str = MODEL_PATH) -> "AnomalyDetector":
         """Load previously trained models."""
         if os.path.exists(path):
             data = joblib.load(path)
             self.models = data.get("models", {})
-            self.crosswalk = data.get("crosswalk", load_crosswalk())
+            crosswalk = data.get("crosswalk") or load_crosswalk()
+            if isinstance(crosswalk, dict):
+                crosswalk = Crosswalk.from_mapping(crosswalk)
+            self.crosswalk = crosswalk
+            self.version = data.get("version", "legacy")
             self._is_fitted = True
         return self
 
-    def score(self, df: pd.DataFrame) -> pd.DataFrame:
+    def score(
+        self,
+        df: pd.DataFrame,
+        dup_flags: pd.Series | None = None,
+        provider_flags: pd.Series | None = None,
+    ) -> pd.DataFrame:
         """
         Run all three detection layers and combine results.
         A claim is flagged if ANY layer fires.
+
+        Duplicate and provider flags depend on the whole dataset; batch
+        scorers that compute them across all chunks pass them in, otherwise
+        they are computed from ``df`` alone.
         """
         if not self._is_fitted:
             self.load()
         if not self._is_fitted:
             raise RuntimeError("Model not trained. Call train() or load() first.")
 
+        n = len(df)
+        start = time.perf_counter()
+
+        # Shared feature matrix — computed once, read by every layer
+        with layer_timer("score", "features", n):
+            features = build_feature_matrix(df)
+
         # Layer 1: Rule-based
-        dup_flags = detect_duplicates(df)
-        mismatch_flags = detect_cpt_icd_mismatch(df, self.crosswalk)
+        if dup_flags is None:
+            with layer_timer("score", "duplicates", n):
+                dup_flags = detect_duplicates(df)
+        with layer_timer("score", "crosswalk", n):
+            mismatch_flags = detect_cpt_icd_mismatch(df, self.crosswalk, features)
 
         # Layer 2: Per-CPT Isolation Forest
-        if_result = score_with_per_cpt_models(df, self.models)
+        with layer_timer("score", "if", n):
+            if_result = score_with_per_cpt_models(df, self.models, self.n_workers, features)
 
         # Layer 3: Provider Z-score
-        provider_flags = detect_provider_anomalies(df)
+        if provider_flags is None:
+            with layer_timer("score", "provider", n):
+                provider_flags = detect_provider_anomalies(df, features=features)
 
         # Combine
         combined = dup_flags | mismatch_flags | if_result["if_anomaly"] | provider_flags
 
         # Composite score
-        composite = if_result["if_score"].copy()
-        composite[dup_flags] = np.minimum(composite[dup_flags], -0.2)
-        composite[mismatch_flags] = np.minimum(composite[mismatch_flags], -0.15)
-        composite[provider_flags] = np.minimum(composite[provider_flags], -0.12)
+        composite = if_result["if_score"].to_numpy(copy=True)
+        composite[dup_flags.to_numpy()] = np.minimum(composite[dup_flags.to_numpy()], -0.2)
+        composite[mismatch_flags.to_numpy()] = np.minimum(composite[mismatch_flags.to_numpy()], -0.15)
+        composite[provider_flags.to_numpy()] = np.minimum(composite[provider_flags.to_numpy()], -0.12)
 
-        result = df.copy()
+        # Shallow copy: result columns are added without duplicating df's data
+        result = df.copy(deep=False)
         result["anomaly_score"] = composite
         result["is_anomaly"] = combined
         result["_layer1_dup"] = dup_flags
         result["_layer1_mismatch"] = mismatch_flags
         result["_layer2_if"] = if_result["if_anomaly"]
         result["_layer3_provider"] = provider_flags
+        observe_layer("score", "total", time.perf_counter() - start, n)
         return result
 
     def get_flag_reasons(self, row: pd.Series) -> str:
         """Generate human-readable flag reason from detection layers."""
-        reasons = []
-        if row.get("_layer1_dup", False):
-            reasons.append("duplicate claim ID")
-        if row.get("_layer1_mismatch", False):
-            reasons.append("CPT/ICD-10 coding mismatch")
-        if row.get("_layer2_if", False):
-            reasons.append("statistical amount outlier")
-        if row.get("_layer3_provider", False):
-            reasons.append("anomalous provider pattern")
-        return "; ".join(reasons) if reasons else "multivariate anomaly"
+        code = sum(1 << bit for bit, (col, _) in enumerate(REASON_LAYERS) if row.get(col, False))
+        return FLAG_REASONS[code]
 
     def evaluate(self, df: pd.DataFrame, ground_truth: pd.Series) -> dict:
         """Evaluate against ground truth with per-layer breakdown."""
@@ -324,12 +489,7 @@ def train_and_evaluate():
         if std > 0:
             outlier_mask.loc[group.index] = group["billed_amount"] > (mean + 3 * std)
 
-    mismatch_mask = pd.Series(False, index=df.index)
-    for idx, row in df.iterrows():
-        cpt = str(row.get("cpt_code", ""))
-        icd = str(row.get("icd10_code", ""))
-        if cpt in crosswalk and icd not in crosswalk[cpt]:
-            mismatch_mask.at[idx] = True
+    mismatch_mask = crosswalk.mismatches(df)
 
     ground_truth = dup_mask | outlier_mask | mismatch_mask
     print(f"\nGround truth anomalies: {ground_truth.sum():,} ({ground_truth.mean()*100:.1f}%)")
@@ -0,0 +1,248 @@
+"""
+Out-of-Core Batch Scoring
+
+Scores claim sets larger than RAM by streaming fixed-size chunks from a
+CSV, Parquet file or the claims table. Layers 1 (crosswalk) and 2
+(per-CPT forests) only need the chunk itself. Duplicates and Layer 3
+need the whole dataset, so scoring makes two passes:
+
+  Pass 1 — accumulate additive provider statistics and spill 64-bit
+           claim_id hashes into hash-partitioned temp files; each
+           partition is then counted on its own to find duplicate ids.
+  Pass 2 — re-stream the chunks, score Layers 1 and 2 per chunk, and
+           apply the global duplicate / provider results.
+
+Peak memory is bounded by the chunk size (plus one hash partition).
+
+Scoring uses the model registry's CURRENT version (as the API does);
+--model scores with a legacy model.joblib instead.
+
+Usage:
+    python -m ml.batch_scoring --csv claims.csv --out flags.csv
+    python -m ml.batch_scoring --db sqlite:///./clearcollect.db --out flags.csv
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from typing import Callable, Iterator
+
+import numpy as np
+import pandas as pd
+
+from ml.anomaly_detector import AnomalyDetector, flag_providers, provider_aggregates
+from ml.features import build_feature_matrix
+from ml.registry import REGISTRY_DIR, ModelRegistry
+
+DEFAULT_CHUNK_SIZE = 250_000
+HASH_PARTITIONS = 64
+
+ID_COLUMNS = ["claim_id", "patient_id", "provider_id", "cpt_code", "icd10_code"]
+CLAIM_COLUMNS = ID_COLUMNS + ["billed_amount", "allowed_amount", "paid_amount"]
+OUTPUT_COLUMNS = [
+    "claim_id", "provider_id", "cpt_code", "anomaly_score",
+    "_layer1_dup", "_layer1_mismatch", "_layer2_if", "_layer3_provider",
+]
+
+ChunkSource = Callable[[], Iterator[pd.DataFrame]]
+
+
+# ── Chunk sources (re-iterable: each call starts a fresh pass) ───
+
+def csv_source(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> ChunkSource:
+    def chunks():
+        yield from pd.read_csv(
+            path, chunksize=chunk_size, usecols=CLAIM_COLUMNS,
+            dtype={col: str for col in ID_COLUMNS},
+        )
+    return chunks
+
+
+def parquet_source(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> ChunkSource:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Parquet input requires pyarrow (pip install pyarrow)") from e
+
+    def chunks():
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=CLAIM_COLUMNS):
+            df = batch.to_pandas()
+            df[ID_COLUMNS] = df[ID_COLUMNS].astype(str)
+            yield df
+    return chunks
+
+
+def db_source(url: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> ChunkSource:
+    """Stream the claims table in keyset (id-ordered) chunks."""
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(url)
+    query = text(
+        f"SELECT id, {', '.join(CLAIM_COLUMNS)} FROM claims "
+        "WHERE id > :last_id ORDER BY id LIMIT :limit"
+    )
+
+    def chunks():
+        last_id = 0
+        while True:
+            with engine.connect() as conn:
+                result = conn.execute(query, {"last_id": last_id, "limit": chunk_size})
+                df = pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+            if df.empty:
+                return
+            last_id = int(df["id"].iloc[-1])
+            yield df.drop(columns="id")
+    return chunks
+
+
+# ── Pass 1 helpers ───────────────────────────────────────────────
+
+def hash_claim_ids(claim_ids: pd.Series) -> np.ndarray:
+    return pd.util.hash_pandas_object(claim_ids.astype(str), index=False).to_numpy()
+
+
+class DuplicateIndex:
+    """
+    Exact duplicate claim_id detection with bounded memory.
+
+    Hashes are appended to HASH_PARTITIONS spill files by hash value; each
+    partition is small enough to count in memory, and only the (rare)
+    duplicated hashes are kept afterwards.
+    """
+
+    def __init__(self, partitions: int = HASH_PARTITIONS):
+        self.partitions = partitions
+        self._dir = tempfile.mkdtemp(prefix="claim_hashes_")
+        self._files = [open(os.path.join(self._dir, f"{p}.bin"), "ab") for p in range(partitions)]
+        self.duplicate_hashes = np.array([], dtype=np.uint64)
+
+    def add(self, hashes: np.ndarray):
+        part = hashes % np.uint64(self.partitions)
+        order = np.argsort(part, kind="stable")
+        bounds = np.searchsorted(part[order], np.arange(self.partitions + 1))
+        for p in range(self.partitions):
+            rows = order[bounds[p]:bounds[p + 1]]
+            if len(rows):
+                self._files[p].write(hashes[rows].tobytes())
+
+    def finalize(self):
+        duplicates = []
+        try:
+            for p, f in enumerate(self._files):
+                f.close()
+                values, counts = np.unique(
+                    np.fromfile(os.path.join(self._dir, f"{p}.bin"), dtype=np.uint64),
+                    return_counts=True,
+                )
+                duplicates.append(values[counts > 1])
+        finally:
+            shutil.rmtree(self._dir, ignore_errors=True)
+        self.duplicate_hashes = np.sort(np.concatenate(duplicates))
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        return np.isin(hashes, self.duplicate_hashes)
+
+
+# ── Two-pass scoring ─────────────────────────────────────────────
+
+def score_in_batches(
+    source: ChunkSource,
+    detector: AnomalyDetector,
+    z_threshold: float = 3.0,
+    log: Callable[[str], None] | None = None,
+) -> Iterator[pd.DataFrame]:
+    """Yield scored chunks (AnomalyDetector.score columns) using global dup/provider context."""
+    log = log or (lambda _msg: None)
+
+    # Pass 1 — provider aggregates + duplicate claim_id index
+    duplicates = DuplicateIndex()
+    aggregates = None
+    total_rows = 0
+    try:
+        for chunk in source():
+            features = build_feature_matrix(chunk)
+            chunk_aggs = provider_aggregates(features)
+            aggregates = chunk_aggs if aggregates is None else aggregates.add(chunk_aggs, fill_value=0)
+            duplicates.add(hash_claim_ids(chunk["claim_id"]))
+            total_rows += len(chunk)
+            log(f"pass 1: {total_rows:,} rows aggregated")
+    finally:
+        duplicates.finalize()
+
+    flagged_providers = pd.Index([])
+    if aggregates is not None and total_rows >= 50:
+        flagged_providers = flag_providers(aggregates, z_threshold)
+    log(f"pass 1 done: {len(duplicates.duplicate_hashes):,} duplicated ids, "
+        f"{len(flagged_providers):,} anomalous providers")
+
+    # Pass 2 — per-chunk Layers 1 + 2 with global context
+    scored_rows = 0
+    for chunk in source():
+        dup_flags = pd.Series(duplicates.contains(hash_claim_ids(chunk["claim_id"])), index=chunk.index)
+        provider_flags = chunk["provider_id"].isin(flagged_providers)
+        scored = detector.score(chunk, dup_flags=dup_flags, provider_flags=provider_flags)
+        scored_rows += len(chunk)
+        log(f"pass 2: {scored_rows:,}/{total_rows:,} rows scored")
+        yield scored
+
+
+def write_flagged(scored_chunks: Iterator[pd.DataFrame], out: str) -> int:
+    """Append each chunk's anomalies to ``out`` (one header line); returns rows written."""
+    if os.path.exists(out):
+        os.remove(out)
+    flagged = 0
+    header_written = False
+    for scored in scored_chunks:
+        anomalies = scored.loc[scored["is_anomaly"], OUTPUT_COLUMNS]
+        if anomalies.empty:
+            continue
+        anomalies.to_csv(out, mode="a", header=not header_written, index=False)
+        header_written = True
+        flagged += len(anomalies)
+    if not header_written:
+        pd.DataFrame(columns=OUTPUT_COLUMNS).to_csv(out, index=False)
+    return flagged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a claims dataset larger than memory.")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--csv", help="Claims CSV path")
+    src.add_argument("--parquet", help="Claims Parquet path")
+    src.add_argument("--db", help="SQLAlchemy URL of a database with a claims table")
+    parser.add_argument("--out", required=True, help="CSV to write flagged claims to")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--registry", default=REGISTRY_DIR, help="Model registry whose CURRENT version scores")
+    parser.add_argument("--model", help="Score with a legacy model.joblib instead of the registry")
+    args = parser.parse_args()
+
+    if args.csv:
+        source = csv_source(args.csv, args.chunk_size)
+    elif args.parquet:
+        source = parquet_source(args.parquet, args.chunk_size)
+    else:
+        source = db_source(args.db, args.chunk_size)
+
+    if args.model:
+        detector = AnomalyDetector().load(args.model)
+        if detector.version is None:
+            raise SystemExit(f"No trained model at {args.model}.")
+    else:
+        registry = ModelRegistry(args.registry)
+        if registry.current_version() is None:
+            raise SystemExit(
+                f"Model registry {args.registry} has no current version. "
+                "Run POST /api/analyze or python -m ml.registry retrain first."
+            )
+        detector = registry.load()
+
+    start = time.time()
+    flagged = write_flagged(score_in_batches(source, detector, log=print), args.out)
+
+    print(f"Flagged {flagged:,} claims in {time.time() - start:.1f}s -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
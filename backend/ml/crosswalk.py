@@ -0,0 +1,92 @@
+"""
+CMS CPT-to-ICD-10 crosswalk compiled for vectorized lookups.
+
+The reference pairs are encoded once: CPT and ICD-10 codes are mapped to
+integer positions in hashed pandas Indexes, and every valid pairing
+becomes a single int64 key (cpt_pos * n_icd + icd_pos) in a sorted
+array. Checking a batch of claims is then two hash lookups and one
+searchsorted — no per-row Python.
+"""
+
+import os
+from typing import TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+    from ml.features import FeatureMatrix
+
+
+class Crosswalk:
+    """Integer-coded set of valid (CPT, ICD-10) pairings."""
+
+    def __init__(self, pairs: pd.DataFrame):
+        cpt = pairs["cpt_code"].astype(str)
+        icd = pairs["icd10_code"].astype(str)
+
+        self.cpt_codes = pd.Index(cpt.unique())
+        self.icd_codes = pd.Index(icd.unique())
+        self._pair_keys = np.unique(
+            self._encode(self.cpt_codes.get_indexer(cpt), self.icd_codes.get_indexer(icd))
+        )
+
+    @classmethod
+    def from_csv(cls, path: str) -> "Crosswalk":
+        """Compile the crosswalk CSV (cpt_code, icd10_code columns)."""
+        if not os.path.exists(path):
+            return cls.empty()
+        return cls(pd.read_csv(path, usecols=["cpt_code", "icd10_code"], dtype=str))
+
+    @classmethod
+    def from_mapping(cls, mapping: dict[str, set[str]]) -> "Crosswalk":
+        """Compile a legacy {cpt: {icd10, ...}} dict (older saved models)."""
+        pairs = [(cpt, icd) for cpt, icds in mapping.items() for icd in icds]
+        return cls(pd.DataFrame(pairs, columns=["cpt_code", "icd10_code"]))
+
+    @classmethod
+    def empty(cls) -> "Crosswalk":
+        return cls(pd.DataFrame({"cpt_code": [], "icd10_code": []}))
+
+    def mismatches(self, df: pd.DataFrame, features: "FeatureMatrix | None" = None) -> pd.Series:
+        """
+        Flag rows whose ICD-10 code is not a valid pairing for their CPT.
+        CPT codes absent from the crosswalk are never flagged. When the
+        batch's FeatureMatrix is given, its integer CPT codes are reused
+        instead of re-hashing the cpt_code column.
+        """
+        if not len(self) or "icd10_code" not in df.columns:
+            return pd.Series(False, index=df.index)
+
+        if features is not None:
+            cpt_pos = self.cpt_codes.get_indexer(features.cpt_categories)[features.cpt_codes]
+        else:
+            cpt_pos = self.cpt_codes.get_indexer(df["cpt_code"].astype(str))
+        icd_pos = self.icd_codes.get_indexer(df["icd10_code"].astype(str))
+
+        return pd.Series(self._mismatch_positions(cpt_pos, icd_pos), index=df.index)
+
+    def mismatch_array(self, cpt_codes: list[str], icd_codes: list[str]) -> np.ndarray:
+        """mismatches() for plain code lists, without DataFrame overhead (real-time path)."""
+        if not len(self):
+            return np.zeros(len(cpt_codes), dtype=bool)
+        return self._mismatch_positions(
+            self.cpt_codes.get_indexer(cpt_codes), self.icd_codes.get_indexer(icd_codes)
+        )
+
+    def _mismatch_positions(self, cpt_pos: np.ndarray, icd_pos: np.ndarray) -> np.ndarray:
+        keys = self._encode(cpt_pos, icd_pos)
+        found = np.searchsorted(self._pair_keys, keys)
+        found = np.minimum(found, len(self._pair_keys) - 1)
+        valid_pair = (icd_pos >= 0) & (self._pair_keys[found] == keys)
+        return (cpt_pos >= 0) & ~valid_pair
+
+    def _encode(self, cpt_pos: np.ndarray, icd_pos: np.ndarray) -> np.ndarray:
+        return cpt_pos.astype(np.int64) * max(len(self.icd_codes), 1) + icd_pos
+
+    def __len__(self) -> int:
+        """Number of CPT codes covered."""
+        return len(self.cpt_codes)
+
+    def __contains__(self, cpt_code: str) -> bool:
+        return str(cpt_code) in self.cpt_codes
@@ -0,0 +1,76 @@
+"""
+Shared feature pipeline for the detection layers.
+
+build_feature_matrix() computes the engineered ratios and integer-coded
+grouping keys for a claims batch exactly once, into compact float32 /
+int32 arrays. Layer 2 (per-CPT forests) and Layer 3 (provider Z-scores)
+both read this structure by position, so scoring never copies the input
+DataFrame.
+"""
+
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+NUMERICAL_FEATURES = ["billed_amount", "allowed_amount", "paid_amount", "billed_to_paid_ratio"]
+
+
+@dataclass
+class FeatureMatrix:
+    """Columnar features for one claims batch, aligned with the batch by position."""
+    X: np.ndarray                          # (n, len(NUMERICAL_FEATURES)) float32, NaN-filled with 0
+    billed_to_allowed_ratio: np.ndarray    # (n,) float32
+    cpt_codes: np.ndarray                  # (n,) int32 positions into cpt_categories
+    cpt_categories: pd.Index
+    provider_codes: np.ndarray | None      # (n,) int32 positions into provider_categories
+    provider_categories: pd.Index | None
+    _cpt_groups: dict[str, np.ndarray] | None = field(default=None, repr=False)
+
+    def __len__(self) -> int:
+        return len(self.X)
+
+    @property
+    def billed(self) -> np.ndarray:
+        return self.X[:, 0]
+
+    def cpt_groups(self) -> dict[str, np.ndarray]:
+        """CPT code -> row positions, computed once per batch."""
+        if self._cpt_groups is None:
+            order = np.argsort(self.cpt_codes, kind="stable")
+            bounds = np.flatnonzero(np.diff(self.cpt_codes[order])) + 1
+            self._cpt_groups = {
+                str(self.cpt_categories[self.cpt_codes[rows[0]]]): rows
+                for rows in np.split(order, bounds) if len(rows)
+            }
+        return self._cpt_groups
+
+
+def build_feature_matrix(df: pd.DataFrame) -> FeatureMatrix:
+    """Compute ratios and grouping keys for a claims batch in one pass."""
+    billed = df["billed_amount"].to_numpy(dtype=np.float64)
+    allowed = df["allowed_amount"].to_numpy(dtype=np.float64)
+    paid = df["paid_amount"].to_numpy(dtype=np.float64)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        billed_to_paid = np.where(paid > 0, billed / paid, billed)
+        billed_to_allowed = np.where(allowed > 0, billed / allowed, 1.0)
+
+    X = np.column_stack([billed, allowed, paid, billed_to_paid]).astype(np.float32)
+    X[np.isnan(X)] = 0
+
+    cpt_codes, cpt_categories = pd.factorize(df["cpt_code"].astype(str), sort=True)
+
+    provider_codes = provider_categories = None
+    if "provider_id" in df.columns:
+        provider_codes, provider_categories = pd.factorize(df["provider_id"], sort=True)
+        provider_codes = provider_codes.astype(np.int32)
+
+    return FeatureMatrix(
+        X=X,
+        billed_to_allowed_ratio=billed_to_allowed.astype(np.float32),
+        cpt_codes=cpt_codes.astype(np.int32),
+        cpt_categories=pd.Index(cpt_categories),
+        provider_codes=provider_codes,
+        provider_categories=pd.Index(provider_categories) if provider_categories is not None else None,
+    )
@@ -0,0 +1,355 @@
+"""
+Versioned Model Registry
+
+Each trained detector is an immutable version directory:
+
+    registry/
+      CURRENT                  active version id (atomically replaced)
+      PINNED                   present while a version is pinned
+      versions/<version>/
+        manifest.json          per-CPT row counts, data hashes, feature stats
+        crosswalk.joblib
+        cpt/<cpt_code>/*.npy   one compiled Isolation Forest per CPT group
+        cpt/<cpt_code>/estimator.pkl   the sklearn forest it was compiled from
+
+Forests are stored as CompiledForest node arrays. Loading a version only
+reads the manifest and crosswalk; each CPT's arrays are memory-mapped
+the first time that CPT is scored, so worker startup is near-instant and
+every worker shares the same pages. Those arrays serve real-time and
+small-batch scoring; large CPT groups (COMPILED_MAX_ROWS+) are scored by
+the saved sklearn estimator, loaded on first such use.
+
+Retraining is selective. For every CPT group the training data is
+summarized (row count, order-insensitive content hash, feature means and
+standard deviations) and compared with the current manifest. Groups whose
+data is unchanged — or changed by less than the drift threshold — keep
+their existing forest, hard-linked into the new version; only new and
+drifted groups are refitted.
+
+Usage:
+    python -m ml.registry retrain --csv claims.csv [--threshold 0.1] [--full]
+    python -m ml.registry retrain --db sqlite:///./clearcollect.db
+    python -m ml.registry list
+    python -m ml.registry pin <version> | unpin | rollback
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from ml.anomaly_detector import (
+    AnomalyDetector, MODEL_DIR, MIN_CPT_TRAIN_ROWS, load_crosswalk, train_per_cpt_models,
+)
+from ml.compiled_forest import CompiledForest, LazyForests
+from ml.features import FeatureMatrix, build_feature_matrix
+
+REGISTRY_DIR = os.getenv("ANOMALY_REGISTRY_DIR", os.path.join(MODEL_DIR, "registry"))
+DRIFT_THRESHOLD = 0.1
+
+
+def summarize_cpt_groups(features: FeatureMatrix) -> dict[str, dict]:
+    """Row count, content hash and feature moments for every trainable CPT group."""
+    summaries = {}
+    for cpt_code, rows in features.cpt_groups().items():
+        if len(rows) < MIN_CPT_TRAIN_ROWS:
+            continue
+        X = features.X[rows]
+        # Sum of per-row hashes: independent of row order, sensitive to any edit
+        row_hashes = pd.util.hash_pandas_object(pd.DataFrame(X), index=False).to_numpy()
+        digest = hashlib.sha256(row_hashes.sum(dtype=np.uint64).tobytes()).hexdigest()[:16]
+        summaries[cpt_code] = {
+            "rows": int(len(rows)),
+            "data_hash": digest,
+            "mean": X.mean(axis=0, dtype=np.float64).round(6).tolist(),
+            "std": X.std(axis=0, dtype=np.float64).round(6).tolist(),
+        }
+    return summaries
+
+
+def drift_score(old: dict, new: dict) -> float:
+    """
+    How far a CPT group's data moved since its forest was trained: the
+    larger of the relative row-count change and the largest feature-mean
+    shift in units of the old standard deviation.
+    """
+    if old["data_hash"] == new["data_hash"]:
+        return 0.0
+    growth = abs(new["rows"] - old["rows"]) / max(old["rows"], 1)
+    scale = np.maximum(np.asarray(old["std"]), 1e-9)
+    shift = np.abs(np.asarray(new["mean"]) - np.asarray(old["mean"])) / scale
+    return float(max(growth, shift.max()))
+
+
+class ModelRegistry:
+    """Versioned detector artifacts with a CURRENT pointer, pinning and rollback."""
+
+    def __init__(self, root: str = REGISTRY_DIR):
+        self.root = root
+        self.versions_dir = os.path.join(root, "versions")
+        self.pointer_path = os.path.join(root, "CURRENT")
+        self.pin_path = os.path.join(root, "PINNED")
+
+    # ── Lookup ───────────────────────────────────────────────────
+
+    def versions(self) -> list[str]:
+        if not os.path.isdir(self.versions_dir):
+            return []
+        return sorted(
+            v for v in os.listdir(self.versions_dir)
+            if not v.endswith(".tmp") and os.path.exists(os.path.join(self.versions_dir, v, "manifest.json"))
+        )
+
+    def current_version(self) -> str | None:
+        try:
+            with open(self.pointer_path) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def is_pinned(self) -> bool:
+        return os.path.exists(self.pin_path)
+
+    def manifest(self, version: str) -> dict:
+        path = os.path.join(self.versions_dir, version, "manifest.json")
+        if not os.path.exists(path):
+            raise LookupError(f"Unknown model version: {version}")
+        with open(path) as f:
+            return json.load(f)
+
+    def load(self, version: str | None = None) -> AnomalyDetector:
+        """Load a version (default: CURRENT) as a ready-to-score detector."""
+        version = version or self.current_version()
+        if version is None:
+            raise LookupError("Model registry has no current version")
+        manifest = self.manifest(version)
+        version_dir = os.path.join(self.versions_dir, version)
+
+        detector = AnomalyDetector(contamination=manifest["contamination"])
+        entries = manifest["cpt"]
+        if all("dir" in entry for entry in entries.values()):
+            detector.models = LazyForests(version_dir, entries)
+        else:
+            # Versions written before compiled artifacts hold pickled forests
+            detector.models = {
+                cpt_code: joblib.load(os.path.join(version_dir, entry["file"])) if "file" in entry
+                else CompiledForest.load(os.path.join(version_dir, entry["dir"]), entry["forest"])
+                for cpt_code, entry in entries.items()
+            }
+        detector.crosswalk = joblib.load(os.path.join(version_dir, "crosswalk.joblib"))
+        detector.version = version
+        detector._is_fitted = True
+        return detector
+
+    # ── Training ─────────────────────────────────────────────────
+
+    def retrain(
+        self,
+        df: pd.DataFrame,
+        threshold: float = DRIFT_THRESHOLD,
+        full: bool = False,
+        contamination: float | None = None,
+        n_workers: int | None = None,
+    ) -> dict:
+        """
+        Build a new version from ``df``, refitting only new or drifted CPT
+        groups (all groups with ``full``). The new version becomes CURRENT
+        unless the registry is pinned. Returns a report of what was done.
+        """
+        start = time.perf_counter()
+        parent = self.current_version()
+        parent_manifest = self.manifest(parent) if parent else None
+        if contamination is None:
+            contamination = parent_manifest["contamination"] if parent_manifest else 0.08
+        if parent_manifest and parent_manifest["contamination"] != contamination:
+            full = True  # forests trained with another contamination cannot be reused
+
+        features = build_feature_matrix(df)
+        summaries = summarize_cpt_groups(features)
+        previous = parent_manifest["cpt"] if parent_manifest else {}
+
+        refit, drift = set(), {}
+        for cpt_code, summary in summaries.items():
+            if full or cpt_code not in previous:
+                refit.add(cpt_code)
+                continue
+            drift[cpt_code] = drift_score(previous[cpt_code], summary)
+            if drift[cpt_code] > threshold:
+                refit.add(cpt_code)
+
+        fitted = train_per_cpt_models(
+            df, contamination, n_workers, features=features, cpt_codes=refit,
+        ) if refit else {}
+
+        version = self._new_version_id()
+        version_dir = os.path.join(self.versions_dir, version)
+        tmp_dir = f"{version_dir}.tmp"
+        os.makedirs(os.path.join(tmp_dir, "cpt"))
+
+        entries = {}
+        # CPT groups missing from this training set keep their previous forest
+        for cpt_code in sorted(set(summaries) | set(previous)):
+            if cpt_code in fitted:
+                path = os.path.join("cpt", cpt_code)
+                meta = CompiledForest.from_isolation_forest(fitted[cpt_code]).save(os.path.join(tmp_dir, path))
+                entries[cpt_code] = {
+                    **summaries[cpt_code], "dir": path, "forest": meta, "trained_version": version,
+                }
+            else:
+                path = previous[cpt_code].get("dir") or previous[cpt_code]["file"]
+                _link_or_copy(
+                    os.path.join(self.versions_dir, parent, path),
+                    os.path.join(tmp_dir, path),
+                )
+                # Keep the statistics the forest was actually trained on
+                entries[cpt_code] = previous[cpt_code]
+        joblib.dump(load_crosswalk(), os.path.join(tmp_dir, "crosswalk.joblib"))
+
+        manifest = {
+            "version": version,
+            "parent": parent,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "contamination": contamination,
+            "training_rows": int(len(df)),
+            "cpt": entries,
+        }
+        with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_dir, version_dir)
+
+        promoted = not self.is_pinned()
+        if promoted:
+            self._set_current(version)
+
+        return {
+            "version": version,
+            "parent": parent,
+            "promoted": promoted,
+            "cpt_groups": len(entries),
+            "refitted": sorted(fitted),
+            "reused": len(entries) - len(fitted),
+            "max_drift": round(max(drift.values()), 4) if drift else None,
+            "seconds": round(time.perf_counter() - start, 2),
+        }
+
+    # ── Pointer management ───────────────────────────────────────
+
+    def pin(self, version: str):
+        """Make ``version`` CURRENT and keep it there through later retrains."""
+        self.manifest(version)
+        self._set_current(version)
+        with open(self.pin_path, "w") as f:
+            f.write(version)
+
+    def unpin(self):
+        if os.path.exists(self.pin_path):
+            os.remove(self.pin_path)
+
+    def rollback(self) -> str:
+        """Point CURRENT back at the current version's parent."""
+        current = self.current_version()
+        parent = self.manifest(current)["parent"] if current else None
+        if parent is None:
+            raise LookupError("No earlier version to roll back to")
+        self._set_current(parent)
+        if self.is_pinned():
+            with open(self.pin_path, "w") as f:
+                f.write(parent)
+        return parent
+
+    def _set_current(self, version: str):
+        # Write-then-rename: readers watch this file's mtime for hot reload
+        tmp_path = f"{self.pointer_path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(version)
+        os.replace(tmp_path, self.pointer_path)
+
+    def _new_version_id(self) -> str:
+        os.makedirs(self.versions_dir, exist_ok=True)
+        base = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        version, n = base, 1
+        while os.path.exists(os.path.join(self.versions_dir, version)):
+            n += 1
+            version = f"{base}-{n}"
+        return version
+
+
+def _link_or_copy(src: str, dst: str):
+    """Versions share unchanged forests via hard links where the filesystem allows."""
+    if os.path.isdir(src):
+        os.makedirs(dst)
+        for name in os.listdir(src):
+            _link_or_copy(os.path.join(src, name), os.path.join(dst, name))
+        return
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _load_training_data(args) -> pd.DataFrame:
+    from ml.batch_scoring import csv_source, parquet_source, db_source
+
+    if args.csv:
+        source = csv_source(args.csv)
+    elif args.parquet:
+        source = parquet_source(args.parquet)
+    else:
+        source = db_source(args.db)
+    return pd.concat(source(), ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage versioned anomaly models.")
+    parser.add_argument("--registry", default=REGISTRY_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    retrain = commands.add_parser("retrain", help="Refit new or drifted CPT groups")
+    src = retrain.add_mutually_exclusive_group(required=True)
+    src.add_argument("--csv")
+    src.add_argument("--parquet")
+    src.add_argument("--db", help="SQLAlchemy URL of a database with a claims table")
+    retrain.add_argument("--threshold", type=float, default=DRIFT_THRESHOLD)
+    retrain.add_argument("--full", action="store_true", help="Refit every CPT group")
+    retrain.add_argument("--contamination", type=float)
+
+    commands.add_parser("list", help="Show versions")
+    pin = commands.add_parser("pin", help="Serve a version and hold it through retrains")
+    pin.add_argument("version")
+    commands.add_parser("unpin")
+    commands.add_parser("rollback", help="Serve the current version's parent")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.registry)
+    if args.command == "retrain":
+        df = _load_training_data(args)
+        report = registry.retrain(df, args.threshold, args.full, args.contamination)
+        print(json.dumps(report, indent=2))
+    elif args.command == "list":
+        current = registry.current_version()
+        for version in registry.versions():
+            manifest = registry.manifest(version)
+            refitted = sum(e["trained_version"] == version for e in manifest["cpt"].values())
+            marker = "*" if version == current else " "
+            pinned = " (pinned)" if version == current and registry.is_pinned() else ""
+            print(f"{marker} {version}  parent={manifest['parent']}  "
+                  f"cpt={len(manifest['cpt'])} refitted={refitted}{pinned}")
+    elif args.command == "pin":
+        registry.pin(args.version)
+        print(f"Pinned {args.version}")
+    elif args.command == "unpin":
+        registry.unpin()
+        print("Unpinned")
+    else:
+        print(f"Rolled back to {registry.rollback()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Model Serving — one shared AnomalyDetector per process.
+
+The detector is loaded once and shared read-only across requests. Each
+lookup is a single stat() of the model file; when its mtime changes the
+new model is loaded off to the side and swapped in under a lock, so
+in-flight requests keep the detector they started with.
+
+When the model registry has a CURRENT version, it takes precedence over
+model.joblib: the CURRENT pointer file is what gets watched, so a
+retrain, pin or rollback is picked up by every worker on its next
+request. Registry versions load lazily (memory-mapped per-CPT arrays),
+so a reload costs milliseconds, not a full unpickle.
+
+The real-time scorer (compiled forests for POST /api/score) is built
+from the current detector on first use and rebuilt whenever the
+detector is swapped.
+"""
+
+import os
+import threading
+import time
+
+from ml.anomaly_detector import AnomalyDetector, MODEL_PATH
+from ml.compiled_forest import RealtimeScorer
+from ml.registry import ModelRegistry
+
+
+class DetectorCache:
+    """Process-wide cache of the trained detector with mtime-based hot reload."""
+
+    def __init__(self, path: str = MODEL_PATH, registry: ModelRegistry | None = None):
+        self.path = path
+        self.registry = registry
+        self._lock = threading.Lock()
+        self._detector: AnomalyDetector | None = None
+        self._watched: tuple[str, int] | None = None
+        self._scorer: RealtimeScorer | None = None
+        self._scorer_for: AnomalyDetector | None = None
+        self.loaded_at: float | None = None
+        self.load_seconds: float | None = None
+
+    def get(self) -> AnomalyDetector | None:
+        """Return the current detector, reloading if the model file changed."""
+        watched = self._watched_file()
+        if watched is None or watched == self._watched:
+            return self._detector
+
+        with self._lock:
+            watched = self._watched_file()
+            if watched is not None and watched != self._watched:
+                start = time.perf_counter()
+                if self._use_registry():
+                    detector = self.registry.load()
+                else:
+                    detector = AnomalyDetector().load(self.path)
+                self._swap(detector, watched, time.perf_counter() - start)
+        return self._detector
+
+    def scorer(self) -> RealtimeScorer | None:
+        """Compiled real-time scorer for the current detector."""
+        detector = self.get()
+        if detector is None:
+            return None
+        if self._scorer_for is not detector:
+            with self._lock:
+                if self._scorer_for is not detector:
+                    self._scorer = RealtimeScorer.from_detector(detector)
+                    self._scorer_for = detector
+        return self._scorer
+
+    def info(self) -> dict:
+        detector = self._detector
+        return {
+            "loaded": detector is not None,
+            "version": detector.version if detector else None,
+            "source": "registry" if self._use_registry() else "file",
+            "path": self.registry.root if self._use_registry() else self.path,
+            "loaded_at": self.loaded_at,
+            "load_seconds": round(self.load_seconds, 4) if self.load_seconds is not None else None,
+            "cpt_models": len(detector.models) if detector else 0,
+            "cpt_models_loaded": getattr(detector.models, "loaded_count", len(detector.models)) if detector else 0,
+            "realtime_compiled": detector is not None and self._scorer_for is detector,
+        }
+
+    def _use_registry(self) -> bool:
+        return self.registry is not None and os.path.exists(self.registry.pointer_path)
+
+    def _swap(self, detector: AnomalyDetector, watched: tuple[str, int] | None, load_seconds: float):
+        self._detector = detector
+        self._watched = watched
+        self.loaded_at = time.time()
+        self.load_seconds = load_seconds
+
+    def _watched_file(self) -> tuple[str, int] | None:
+        """Identity of the watched file: (path, mtime_ns), or None if it is missing."""
+        path = self.registry.pointer_path if self._use_registry() else self.path
+        try:
+            return path, os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+
+_cache = DetectorCache(registry=ModelRegistry())
+
+
+def get_detector() -> AnomalyDetector | None:
+    """Shared detector for this process, or None if no model has been trained."""
+    return _cache.get()
+
+
+def get_realtime_scorer() -> RealtimeScorer | None:
+    """Compiled Layer 1 + 2 scorer for the shared detector, or None if untrained."""
+    return _cache.scorer()
+
+
+def detector_info() -> dict:
+    """Version and load metadata for the shared detector."""
+    return _cache.info()
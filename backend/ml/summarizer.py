@@ -4,11 +4,41 @@ LLM Summarizer — Anthropic-powered revenue integrity insights.
 Groups flagged anomalies by provider, constructs structured prompts,
 and generates actionable plain-English summaries per provider.
 Handles context management by batching to stay within token limits.
+
+Provider prompts are independent, so they are sent concurrently on one
+event loop (agenerate_summaries) rather than one after another:
+
+- a semaphore bounds how many requests are in flight (concurrency)
+- a token bucket caps the request rate (rate_per_minute, with bursts of
+  up to ``burst`` requests)
+- each call has its own timeout; timeouts, connection errors, 429 and
+  5xx responses are retried with jittered exponential backoff
+- a provider whose retries run out gets an error summary; the others
+  are unaffected
+
+The model sits behind a small backend interface (``async complete(prompt)``).
+AnthropicBackend calls the Messages API with the async client;
+FakeBackend sleeps for a configurable latency and can inject transient
+failures, so concurrency and throughput can be measured offline:
+
+    python -m ml.summarizer --providers 20 --latency 2 --concurrency 5 --rate 600
+
+Without an API key (and without an explicit backend) summaries are
+rule-based, as before.
 """
 
+import argparse
+import asyncio
+import hashlib
+import json
 import os
+import random
+import time
+from dataclasses import dataclass
 from datetime import datetime, timezone
 
+from ml import telemetry
+
 ANTHROPIC_AVAILABLE = True
 try:
     import anthropic
@@ -16,10 +46,176 @@ except ImportError:
     ANTHROPIC_AVAILABLE = False
 
 
-def _build_provider_prompt(provider_id: str, flags: list[dict]) -> str:
+MODEL = "claude-sonnet-4-20250514"
+MAX_TOKENS = 300
+
+# Flags listed per provider prompt, to manage context
+MAX_PROMPT_FLAGS = 50
+
+# Bump whenever _build_provider_prompt or the rule-based text changes;
+# cached summaries from other versions are then regenerated
+PROMPT_VERSION = 1
+RULE_BASED_MODEL = "rule-based"
+
+DISCLAIMER = "AI-generated insight for human review — not an automated decision."
+
+# HTTP statuses worth retrying: timeout, conflict, rate limit, server errors / overload
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+@dataclass
+class SummarizerOptions:
+    """Concurrency, rate and retry limits for one summarization run."""
+    concurrency: int = 5              # requests in flight at once
+    rate_per_minute: float = 50.0     # sustained request rate (0 = unlimited)
+    burst: int | None = None          # token bucket size; defaults to concurrency
+    timeout: float = 30.0             # seconds per attempt
+    max_retries: int = 3              # retries after the first attempt
+    backoff_base: float = 0.5         # first retry delay, doubled per attempt
+    backoff_max: float = 8.0
+
+
+# ── Backends ─────────────────────────────────────────────────────
+
+class TransientBackendError(Exception):
+    """A failure the backend expects to clear on retry (e.g. overload)."""
+
+
+class AnthropicBackend:
+    """Anthropic Messages API via the async client."""
+
+    name = "anthropic"
+
+    def __init__(self, api_key: str, model: str = MODEL, max_tokens: int = MAX_TOKENS):
+        self.api_key = api_key
+        self.model = model
+        self.max_tokens = max_tokens
+        self._client = None
+        self._loop = None
+
+    def _client_for_loop(self):
+        # The client's connection pool belongs to the loop that created it
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            # Retries are handled by the summarizer, with its own budget
+            self._client = anthropic.AsyncAnthropic(api_key=self.api_key, max_retries=0)
+            self._loop = loop
+        return self._client
+
+    async def complete(self, prompt: str) -> str:
+        response = await self._client_for_loop().messages.create(
+            model=self.model,
+            max_tokens=self.max_tokens,
+            messages=[{"role": "user", "content": prompt}],
+        )
+        return response.content[0].text
+
+
+class FakeBackend:
+    """
+    Stand-in model for offline benchmarks and tests: waits ``latency``
+    (+ up to ``jitter``) seconds, then fails with probability
+    ``failure_rate`` or returns a canned summary. Tracks call counts and
+    peak concurrency.
+    """
+
+    name = "fake"
+    model = "fake"
+
+    def __init__(self, latency: float = 1.0, jitter: float = 0.0, failure_rate: float = 0.0, seed: int | None = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self._rng = random.Random(seed)
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def complete(self, prompt: str) -> str:
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency + self._rng.uniform(0, self.jitter))
+            if self._rng.random() < self.failure_rate:
+                raise TransientBackendError("simulated overload")
+        finally:
+            self.in_flight -= 1
+        provider = next((line.split(": ", 1)[1] for line in prompt.splitlines() if line.startswith("Provider: ")), "?")
+        return f"Simulated summary for Provider {provider} ({len(prompt)} prompt characters)."
+
+
+def make_backend(name: str = "anthropic", api_key: str | None = None, fake_latency: float = 1.0):
+    """Backend by name; None for anthropic without a key or SDK (rule-based fallback)."""
+    if name == "fake":
+        return FakeBackend(latency=fake_latency)
+    if name != "anthropic":
+        raise ValueError(f"Unknown summarizer backend: {name}")
+    key = api_key or os.getenv("ANTHROPIC_API_KEY")
+    if not key or not ANTHROPIC_AVAILABLE:
+        return None
+    return AnthropicBackend(key)
+
+
+# ── Rate limiting and retries ────────────────────────────────────
+
+class TokenBucket:
+    """Async token bucket: ``rate`` tokens per second, holding at most ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        # Waiters queue on the lock, so tokens are handed out in FIFO order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (asyncio.TimeoutError, ConnectionError, TransientBackendError)):
+        return True
+    if ANTHROPIC_AVAILABLE and isinstance(exc, anthropic.APIConnectionError):
+        return True
+    return getattr(exc, "status_code", None) in RETRY_STATUSES
+
+
+async def _complete_with_retries(backend, prompt: str, options: SummarizerOptions, bucket: TokenBucket | None) -> str:
+    for attempt in range(options.max_retries + 1):
+        if bucket is not None:
+            await bucket.acquire()
+        start = time.perf_counter()
+        try:
+            text = await asyncio.wait_for(backend.complete(prompt), options.timeout)
+        except Exception as e:
+            retry = _is_retryable(e) and attempt < options.max_retries
+            outcome = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+            telemetry.record_llm_call(backend.name, outcome, time.perf_counter() - start)
+            if not retry:
+                raise
+            delay = min(options.backoff_max, options.backoff_base * 2 ** attempt)
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+        else:
+            telemetry.record_llm_call(backend.name, "ok", time.perf_counter() - start)
+            return text
+
+
+# ── Prompts and summaries ────────────────────────────────────────
+
+def _build_provider_prompt(provider_id: str, flags: list[dict], total: int | None = None) -> str:
     """Build a structured prompt for a single provider's anomaly batch."""
     flag_lines = []
-    for f in flags[:50]:  # Cap at 50 per provider to manage context
+    for f in flags[:MAX_PROMPT_FLAGS]:
         flag_lines.append(
             f"  - Claim {f['claim_id']}: score={f['anomaly_score']:.3f}, "
             f"reason=\"{f['flag_reason']}\""
@@ -28,7 +224,7 @@ def _build_provider_prompt(provider_id: str, flags: list[dict]) -> str:
     return f"""You are a healthcare revenue integrity analyst AI. Analyze the following flagged billing anomalies for Provider {provider_id} and generate a concise, actionable summary.
 
 Provider: {provider_id}
-Total flagged claims: {len(flags)}
+Total flagged claims: {total if total is not None else len(flags)}
 Anomaly details:
 {chr(10).join(flag_lines)}
 
@@ -41,69 +237,136 @@ Generate a single paragraph that:
 Keep your response to 3-5 sentences. Be specific and data-driven. Do not use bullet points."""
 
 
+def flag_set_hash(flags: list[dict], stats: dict) -> str:
+    """
+    SHA-256 of everything a provider's summary is built from: the flags
+    listed in the prompt and the whole-provider figures.
+    """
+    payload = {
+        "flags": [
+            [f["claim_id"], round(float(f["anomaly_score"]), 6), f["flag_reason"]]
+            for f in flags[:MAX_PROMPT_FLAGS]
+        ],
+        "claim_count": stats["claim_count"],
+        "avg_anomaly_score": stats["avg_anomaly_score"],
+        "reason_counts": stats.get("reason_counts", {}),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def _provider_stats(flags: list[dict], stats: dict | None) -> dict:
+    """Whole-provider figures: precomputed ones when given, else derived from ``flags``."""
+    if stats is not None:
+        return stats
+    reasons: dict[str, int] = {}
+    for f in flags:
+        for r in f["flag_reason"].split("; "):
+            reasons[r] = reasons.get(r, 0) + 1
+    return {
+        "claim_count": len(flags),
+        "avg_anomaly_score": round(sum(f["anomaly_score"] for f in flags) / len(flags), 4),
+        "reason_counts": reasons,
+    }
+
+
+async def agenerate_summaries(
+    grouped_flags: dict[str, list[dict]],
+    backend,
+    provider_stats: dict[str, dict] | None = None,
+    options: SummarizerOptions | None = None,
+) -> list[dict]:
+    """
+    Summarize every provider concurrently through ``backend``.
+
+    Returns one summary dict per provider, in the order of grouped_flags.
+    Summaries whose model call failed carry ``"error": True``.
+    """
+    options = options or SummarizerOptions()
+    semaphore = asyncio.Semaphore(options.concurrency)
+    bucket = None
+    if options.rate_per_minute > 0:
+        bucket = TokenBucket(options.rate_per_minute / 60, options.burst or options.concurrency)
+
+    async def summarize(provider_id: str, flags: list[dict]) -> dict:
+        stats = _provider_stats(flags, (provider_stats or {}).get(provider_id))
+        prompt = _build_provider_prompt(provider_id, flags, stats["claim_count"])
+
+        failed = False
+        async with semaphore:
+            try:
+                summary_text = await _complete_with_retries(backend, prompt, options, bucket)
+            except Exception as e:
+                failed = True
+                reason = f"timed out after {options.timeout:g}s" if isinstance(e, asyncio.TimeoutError) else str(e)
+                summary_text = (
+                    f"Unable to generate AI summary for {provider_id}: {reason}. "
+                    f"This provider has {stats['claim_count']} flagged claims requiring manual review."
+                )
+
+        summary = {
+            "provider_id": provider_id,
+            "summary": summary_text,
+            "claim_count": stats["claim_count"],
+            "avg_anomaly_score": stats["avg_anomaly_score"],
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "source": backend.name,
+            "disclaimer": DISCLAIMER,
+        }
+        if failed:
+            summary["error"] = True
+        return summary
+
+    return list(await asyncio.gather(*(
+        summarize(provider_id, flags) for provider_id, flags in grouped_flags.items()
+    )))
+
+
 def generate_summaries(
     grouped_flags: dict[str, list[dict]],
     api_key: str | None = None,
+    provider_stats: dict[str, dict] | None = None,
+    backend=None,
+    options: SummarizerOptions | None = None,
 ) -> list[dict]:
     """
     Generate AI summaries for each provider's anomaly batch.
 
+    Synchronous entry point: runs agenerate_summaries on a fresh event
+    loop, so it must not be called from a running loop (await
+    agenerate_summaries there instead).
+
     Args:
         grouped_flags: Dict of provider_id -> list of flag dicts
         api_key: Anthropic API key (falls back to env var)
+        provider_stats: Optional provider_id -> {claim_count,
+            avg_anomaly_score, reason_counts} over all of a provider's
+            flags, for when grouped_flags holds only a sample of them
+        backend: Model backend; defaults to Anthropic when a key is set
+        options: Concurrency, rate and retry limits
 
     Returns:
         List of summary dicts with provider_id, summary text, and metadata.
     """
-    key = api_key or os.getenv("ANTHROPIC_API_KEY")
+    backend = backend or make_backend("anthropic", api_key)
 
-    if not key or not ANTHROPIC_AVAILABLE:
+    if backend is None:
         # Fallback: generate rule-based summaries when API unavailable
-        return _generate_fallback_summaries(grouped_flags)
+        return generate_fallback_summaries(grouped_flags, provider_stats)
 
-    client = anthropic.Anthropic(api_key=key)
-    summaries = []
+    return asyncio.run(agenerate_summaries(grouped_flags, backend, provider_stats, options))
 
-    for provider_id, flags in grouped_flags.items():
-        prompt = _build_provider_prompt(provider_id, flags)
-
-        try:
-            response = client.messages.create(
-                model="claude-sonnet-4-20250514",
-                max_tokens=300,
-                messages=[{"role": "user", "content": prompt}],
-            )
-            summary_text = response.content[0].text
-        except Exception as e:
-            summary_text = (
-                f"Unable to generate AI summary for {provider_id}: {str(e)}. "
-                f"This provider has {len(flags)} flagged claims requiring manual review."
-            )
-
-        avg_score = sum(f["anomaly_score"] for f in flags) / len(flags)
-        summaries.append({
-            "provider_id": provider_id,
-            "summary": summary_text,
-            "claim_count": len(flags),
-            "avg_anomaly_score": round(avg_score, 4),
-            "generated_at": datetime.now(timezone.utc).isoformat(),
-            "source": "anthropic",
-            "disclaimer": "AI-generated insight for human review — not an automated decision.",
-        })
-
-    return summaries
 
-
-def _generate_fallback_summaries(grouped_flags: dict[str, list[dict]]) -> list[dict]:
+def generate_fallback_summaries(
+    grouped_flags: dict[str, list[dict]],
+    provider_stats: dict[str, dict] | None = None,
+) -> list[dict]:
     """Generate rule-based summaries when Anthropic API is unavailable."""
     summaries = []
 
     for provider_id, flags in grouped_flags.items():
-        avg_score = sum(f["anomaly_score"] for f in flags) / len(flags)
-        reasons = {}
-        for f in flags:
-            for r in f["flag_reason"].split("; "):
-                reasons[r] = reasons.get(r, 0) + 1
+        stats = _provider_stats(flags, (provider_stats or {}).get(provider_id))
+        avg_score = stats["avg_anomaly_score"]
+        reasons = stats["reason_counts"]
 
         top_reasons = sorted(reasons.items(), key=lambda x: x[1], reverse=True)[:3]
         reason_str = ", ".join(f"{r} ({c} claims)" for r, c in top_reasons)
@@ -111,7 +374,7 @@ def _generate_fallback_summaries(grouped_flags: dict[str, list[dict]]) -> list[d
         severity = "high" if avg_score < -0.2 else "moderate" if avg_score < -0.1 else "low"
 
         summary = (
-            f"Provider {provider_id} has {len(flags)} flagged claims with a {severity} "
+            f"Provider {provider_id} has {stats['claim_count']} flagged claims with a {severity} "
             f"average anomaly score of {avg_score:.3f}. "
             f"Primary patterns: {reason_str}. "
             f"These claims warrant human review to determine if billing corrections are needed."
@@ -120,11 +383,55 @@ def _generate_fallback_summaries(grouped_flags: dict[str, list[dict]]) -> list[d
         summaries.append({
             "provider_id": provider_id,
             "summary": summary,
-            "claim_count": len(flags),
-            "avg_anomaly_score": round(avg_score, 4),
+            "claim_count": stats["claim_count"],
+            "avg_anomaly_score": avg_score,
             "generated_at": datetime.now(timezone.utc).isoformat(),
             "source": "rule-based",
-            "disclaimer": "AI-generated insight for human review — not an automated decision.",
+            "disclaimer": DISCLAIMER,
         })
 
     return summaries
+
+
+# ── Offline benchmark ────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark summarization concurrency against the fake backend.")
+    parser.add_argument("--providers", type=int, default=20)
+    parser.add_argument("--flags", type=int, default=MAX_PROMPT_FLAGS, help="Flags per provider")
+    parser.add_argument("--latency", type=float, default=2.0, help="Fake model latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.5)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=SummarizerOptions.concurrency)
+    parser.add_argument("--rate", type=float, default=SummarizerOptions.rate_per_minute, help="Requests per minute (0 = unlimited)")
+    parser.add_argument("--timeout", type=float, default=SummarizerOptions.timeout)
+    parser.add_argument("--retries", type=int, default=SummarizerOptions.max_retries)
+    args = parser.parse_args()
+
+    grouped = {
+        f"PRV-{p:04d}": [
+            {"claim_id": f"CLM-{p}-{i}", "anomaly_score": -0.1 - i / 1000, "flag_reason": "statistical amount outlier"}
+            for i in range(args.flags)
+        ]
+        for p in range(args.providers)
+    }
+    backend = FakeBackend(args.latency, args.jitter, args.failure_rate, seed=0)
+    options = SummarizerOptions(
+        concurrency=args.concurrency, rate_per_minute=args.rate, timeout=args.timeout, max_retries=args.retries,
+    )
+
+    start = time.perf_counter()
+    summaries = asyncio.run(agenerate_summaries(grouped, backend, options=options))
+    elapsed = time.perf_counter() - start
+
+    failed = sum(s["summary"].startswith("Unable to generate") for s in summaries)
+    sequential = args.providers * (args.latency + args.jitter / 2)
+    print(
+        f"{len(summaries)} providers in {elapsed:.2f}s ({len(summaries) / elapsed:.2f}/s); "
+        f"{backend.calls} calls, peak {backend.max_in_flight} in flight, {failed} failed; "
+        f"sequential estimate {sequential:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Detector Telemetry — process-level timers and counters.
+
+AnomalyDetector.train / score record how long each layer took, how many
+rows it processed, and how long each per-CPT forest took to fit or
+score. Values accumulate in a process-wide registry and are rendered in
+Prometheus text format by GET /metrics, e.g.
+
+    anomaly_layer_seconds_bucket{op="score",layer="if",le="1.0"} 3
+
+Per-CPT timings are measured inside pool workers and reported back with
+their results, so they are recorded in the serving process either way.
+Each uvicorn worker keeps its own registry; Prometheus sums across them.
+
+The summarizer also records every model call attempt here, by backend
+and outcome (ok / timeout / error), with its latency.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; spans a single-claim batch up to a multi-million-row run
+LAYER_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+CPT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+
+def _label_str(labelnames: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter with a fixed label set."""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_label_str(self.labelnames, key)} {value:g}" for key, value in items]
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a fixed label set."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets=LAYER_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self._values: dict[tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(tuple(str(labels[name]) for name in self.labelnames))
+        return sum(entry[0]) if entry else 0
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_label_str(self.labelnames, key, le)} {cumulative}")
+            labels = _label_str(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total:.6f}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class MetricsRegistry:
+    """Named metrics rendered together in Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: list = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+            lines.append("")
+        return "\n".join(lines)
+
+    def reset(self):
+        for metric in self._metrics:
+            metric.reset()
+
+
+REGISTRY = MetricsRegistry()
+
+LAYER_SECONDS = REGISTRY.register(Histogram(
+    "anomaly_layer_seconds",
+    "Wall time per detector layer (features, duplicates, crosswalk, if, provider, total)",
+    ("op", "layer"),
+))
+LAYER_ROWS = REGISTRY.register(Counter(
+    "anomaly_layer_rows_total",
+    "Rows processed per detector layer",
+    ("op", "layer"),
+))
+CPT_SECONDS = REGISTRY.register(Histogram(
+    "anomaly_cpt_model_seconds",
+    "Wall time to fit or score one per-CPT Isolation Forest",
+    ("op", "cpt_code"),
+    CPT_BUCKETS,
+))
+CPT_ROWS = REGISTRY.register(Counter(
+    "anomaly_cpt_model_rows_total",
+    "Rows fitted or scored per CPT code",
+    ("op", "cpt_code"),
+))
+LLM_CALLS = REGISTRY.register(Counter(
+    "summarizer_llm_calls_total",
+    "Summarizer model call attempts, including retries",
+    ("backend", "outcome"),
+))
+LLM_CALL_SECONDS = REGISTRY.register(Histogram(
+    "summarizer_llm_call_seconds",
+    "Wall time per summarizer model call attempt",
+    ("backend",),
+    LLM_BUCKETS,
+))
+
+
+def observe_layer(op: str, layer: str, seconds: float, rows: int):
+    LAYER_SECONDS.observe(seconds, op=op, layer=layer)
+    LAYER_ROWS.inc(rows, op=op, layer=layer)
+
+
+@contextmanager
+def layer_timer(op: str, layer: str, rows: int):
+    """Time a block as one observation of ``layer`` for ``op`` (train/score)."""
+    start = time.perf_counter()
+    yield
+    observe_layer(op, layer, time.perf_counter() - start, rows)
+
+
+def record_cpt(op: str, cpt_code: str, seconds: float, rows: int):
+    CPT_SECONDS.observe(seconds, op=op, cpt_code=cpt_code)
+    CPT_ROWS.inc(rows, op=op, cpt_code=cpt_code)
+
+
+def record_llm_call(backend: str, outcome: str, seconds: float):
+    LLM_CALLS.inc(backend=backend, outcome=outcome)
+    LLM_CALL_SECONDS.observe(seconds, backend=backend)
+
+
+def render() -> str:
+    return REGISTRY.render()
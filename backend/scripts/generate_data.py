@@ -1,27 +1,35 @@
 #!/usr/bin/env python3
 """
-Generate a 50K-row synthetic healthcare billing dataset.
+Generate a synthetic healthcare billing dataset at any scale.
 
-Produces claims_data.csv with realistic CPT/ICD-10 pairings and
-~5% deliberate anomalies for model training:
+Produces claims with realistic CPT/ICD-10 pairings and ~5% deliberate
+anomalies for model training:
   - Duplicate claims
   - Amount outliers (3+ std devs above CPT mean)
   - ICD-10 / CPT mismatches
+
+Rows are generated column-wise with NumPy in bounded chunks, so memory
+stays flat from 50K to 10M+ rows. Output can be split into partitions
+(one file each) and written as CSV or Parquet. Each chunk draws from a
+generator seeded by (seed, row offset), so partitions are independent
+and output is reproducible for a given --seed and --chunk-rows.
+
+With --related, matching accounts / payments / refunds / chargebacks /
+audit_log files are generated in the data/sample schemas, with one
+account per patient in the claims' patient pool.
+
+Usage:
+    python scripts/generate_data.py                          # 50K rows -> scripts/claims_data.csv
+    python scripts/generate_data.py --rows 10000000 --partitions 8 --format parquet --out-dir /data/load
+    python scripts/generate_data.py --rows 1000000 --related --out-dir /data/load
 """
 
+import argparse
 import os
-import random
-import uuid
-from datetime import datetime, timedelta
+import time
 
 import numpy as np
 import pandas as pd
-from faker import Faker
-
-fake = Faker()
-Faker.seed(42)
-random.seed(42)
-np.random.seed(42)
 
 # ── Realistic CPT codes with typical billed amounts (mean, std) ──────────
 CPT_CATALOG = {
@@ -67,7 +75,7 @@ CPT_CATALOG = {
               "icd10": ["J96.01", "I46.9", "A41.9", "R57.1"]},
 }
 
-ALL_ICD10 = list({code for info in CPT_CATALOG.values() for code in info["icd10"]})
+ALL_ICD10 = sorted({code for info in CPT_CATALOG.values() for code in info["icd10"]})
 CPT_CODES = list(CPT_CATALOG.keys())
 
 CLAIM_STATUSES = ["paid", "denied", "pending", "appealed", "adjusted"]
@@ -75,121 +83,324 @@ STATUS_WEIGHTS = [0.60, 0.12, 0.15, 0.05, 0.08]
 
 TOTAL_ROWS = 50_000
 ANOMALY_RATE = 0.05
-NUM_ANOMALIES = int(TOTAL_ROWS * ANOMALY_RATE)
+SEED = 42
+CHUNK_ROWS = 1_000_000
 
-# Pre-generate patient / provider pools
+# Patient / provider pools for the 50K default; larger runs scale them up
 NUM_PATIENTS = 8_000
 NUM_PROVIDERS = 200
-PATIENT_IDS = [f"PAT-{uuid.uuid4().hex[:8].upper()}" for _ in range(NUM_PATIENTS)]
-PROVIDER_IDS = [f"PRV-{uuid.uuid4().hex[:6].upper()}" for _ in range(NUM_PROVIDERS)]
-
-
-def _generate_normal_row(idx: int) -> dict:
-    """Generate a single normal (non-anomalous) claim row."""
-    cpt = random.choice(CPT_CODES)
-    info = CPT_CATALOG[cpt]
-    icd10 = random.choice(info["icd10"])
-
-    billed = round(max(10, np.random.normal(info["mean"], info["std"])), 2)
-    # Allowed is typically 60-90% of billed
-    allowed = round(billed * random.uniform(0.60, 0.90), 2)
-    # Paid depends on status
-    status = random.choices(CLAIM_STATUSES, weights=STATUS_WEIGHTS, k=1)[0]
-    if status == "denied":
-        paid = 0.0
-    elif status == "pending":
-        paid = 0.0
-    elif status == "adjusted":
-        paid = round(allowed * random.uniform(0.50, 0.85), 2)
-    else:
-        paid = round(allowed * random.uniform(0.85, 1.0), 2)
 
-    service_date = fake.date_between(
-        start_date=datetime(2023, 1, 1), end_date=datetime(2025, 12, 31)
+DATE_START = np.datetime64("2023-01-01")
+DATE_END = np.datetime64("2025-12-31")
+
+# Per-CPT lookup arrays, indexed by CPT position
+_CPT_MEAN = np.array([CPT_CATALOG[c]["mean"] for c in CPT_CODES], dtype=np.float64)
+_CPT_STD = np.array([CPT_CATALOG[c]["std"] for c in CPT_CODES], dtype=np.float64)
+_ICD_POS = {code: i for i, code in enumerate(ALL_ICD10)}
+_CPT_VALID_ICD = [np.array([_ICD_POS[c] for c in CPT_CATALOG[cpt]["icd10"]]) for cpt in CPT_CODES]
+_CPT_WRONG_ICD = [np.setdiff1d(np.arange(len(ALL_ICD10)), valid) for valid in _CPT_VALID_ICD]
+
+# Related-file vocabularies (data/sample schemas)
+SERVICE_CATEGORIES = ["cardiology", "orthopedic", "radiology", "emergency", "primary_care",
+                      "surgery", "neurology", "oncology", "dermatology"]
+PAYER_TYPES = ["commercial", "medicare", "medicaid", "self_pay"]
+PAYER_WEIGHTS = [0.45, 0.25, 0.18, 0.12]
+PAYMENT_METHODS = ["credit_card", "ach", "cash"]
+REFUND_REASONS = ["duplicate_payment", "billing_error", "insurance_adjustment", "patient_request"]
+CHARGEBACK_REASONS = ["unauthorized", "service_not_received", "duplicate_charge"]
+AUDIT_ACTIONS = ["view", "export", "approve_refund"]
+AUDIT_RESOURCES = ["accounts_dashboard", "fraud_alerts", "revenue_forecast",
+                   "risk_scores_csv", "fraud_report_csv", "all_accounts_csv"]
+
+
+def format_ids(prefix: str, values: np.ndarray, width: int) -> np.ndarray:
+    """'CLM-0000042'-style identifiers built from digit arithmetic, not per-row formatting."""
+    values = np.asarray(values, dtype=np.int64)
+    digits = (values[:, None] // 10 ** np.arange(width - 1, -1, -1, dtype=np.int64)) % 10
+    buf = np.empty((len(values), len(prefix) + width), dtype=np.uint8)
+    buf[:, :len(prefix)] = np.frombuffer(prefix.encode(), dtype=np.uint8)
+    buf[:, len(prefix):] = digits + ord("0")
+    return buf.view(f"S{len(prefix) + width}").ravel().astype(f"U{len(prefix) + width}")
+
+
+def hex_pool(prefix: str, size: int, digits: int, rng: np.random.Generator) -> np.ndarray:
+    """Unique random-looking hex ids (e.g. PAT-3FA85F64) for an id pool."""
+    space = 16 ** digits
+    offset = int(rng.integers(space))
+    # An odd multiplier is a bijection mod 16**digits, so ids never collide
+    values = (np.arange(size, dtype=np.uint64) * np.uint64(2654435761) + np.uint64(offset)) % np.uint64(space)
+    return np.array([f"{prefix}{v:0{digits}X}" for v in values.tolist()])
+
+
+class ClaimGenerator:
+    """Column-wise claims generator; partitions are independent and reproducible."""
+
+    def __init__(self, total_rows: int, partitions: int = 1, seed: int = SEED,
+                 anomaly_rate: float = ANOMALY_RATE):
+        self.total_rows = total_rows
+        self.partitions = partitions
+        self.seed = seed
+        self.anomaly_rate = anomaly_rate
+        self.id_width = max(7, len(str(max(total_rows - 1, 0))))
+
+        scale = max(1.0, total_rows / TOTAL_ROWS)
+        pool_rng = np.random.default_rng([seed, 0])
+        self.patient_ids = hex_pool("PAT-", int(NUM_PATIENTS * scale), 8, pool_rng)
+        self.provider_ids = hex_pool("PRV-", int(NUM_PROVIDERS * scale ** 0.5), 6, pool_rng)
+
+        bounds = np.linspace(0, total_rows, partitions + 1).astype(np.int64)
+        self.partition_bounds = list(zip(bounds[:-1], bounds[1:]))
+
+    def partition(self, p: int, chunk_rows: int = CHUNK_ROWS):
+        """Yield the DataFrame chunks of partition ``p``."""
+        start, end = self.partition_bounds[p]
+        for chunk_start in range(start, end, chunk_rows):
+            chunk_end = min(chunk_start + chunk_rows, end)
+            # Seed by the chunk's global offset so partitions are independent
+            rng = np.random.default_rng([self.seed, 1, int(chunk_start)])
+            yield self._chunk(rng, chunk_start, chunk_end)
+
+    def _chunk(self, rng: np.random.Generator, start: int, end: int) -> pd.DataFrame:
+        n = end - start
+        global_idx = np.arange(start, end, dtype=np.int64)
+
+        cpt = rng.integers(len(CPT_CODES), size=n)
+        icd_choice = rng.random(n)
+        icd = np.empty(n, dtype=np.int64)
+        for c, valid in enumerate(_CPT_VALID_ICD):
+            rows = cpt == c
+            icd[rows] = valid[(icd_choice[rows] * len(valid)).astype(np.int64)]
+
+        billed = np.maximum(10, rng.normal(_CPT_MEAN[cpt], _CPT_STD[cpt])).round(2)
+        # Allowed is typically 60-90% of billed
+        allowed = (billed * rng.uniform(0.60, 0.90, n)).round(2)
+        # Paid depends on status
+        status = rng.choice(len(CLAIM_STATUSES), size=n, p=STATUS_WEIGHTS)
+        paid_share = np.select(
+            [status == 1, status == 2, status == 4],  # denied, pending, adjusted
+            [0.0, 0.0, rng.uniform(0.50, 0.85, n)],
+            default=rng.uniform(0.85, 1.0, n),
+        )
+        paid = (allowed * paid_share).round(2)
+
+        days = int((DATE_END - DATE_START).astype(int)) + 1
+        service_date = DATE_START + rng.integers(0, days, size=n).astype("timedelta64[D]")
+
+        claim_idx = global_idx.copy()
+        self._inject_anomalies(rng, global_idx, claim_idx, cpt, icd, billed, allowed, paid)
+
+        # Shuffle so anomalies aren't clustered
+        order = rng.permutation(n)
+        return pd.DataFrame({
+            "claim_id": format_ids("CLM-", claim_idx[order], self.id_width),
+            "patient_id": self.patient_ids[rng.integers(len(self.patient_ids), size=n)],
+            "provider_id": self.provider_ids[rng.integers(len(self.provider_ids), size=n)],
+            "cpt_code": pd.Categorical.from_codes(cpt[order], CPT_CODES),
+            "icd10_code": pd.Categorical.from_codes(icd[order], ALL_ICD10),
+            "billed_amount": billed[order],
+            "allowed_amount": allowed[order],
+            "paid_amount": paid[order],
+            "service_date": pd.to_datetime(service_date[order]).strftime("%Y-%m-%d"),
+            "claim_status": pd.Categorical.from_codes(status[order], CLAIM_STATUSES),
+        })
+
+    def _inject_anomalies(self, rng, global_idx, claim_idx, cpt, icd, billed, allowed, paid):
+        """Inject ~5% anomalies, split evenly across the three types (in place)."""
+        n = len(global_idx)
+        picked = rng.choice(n, size=int(n * self.anomaly_rate), replace=False)
+        dup, outlier, mismatch = np.array_split(picked, 3)
+
+        # Type 1: Duplicate claims — reuse the claim_id of a row in this chunk
+        # that keeps its own id, so every dup adds exactly one repeated id
+        keep = np.setdiff1d(np.arange(n), dup, assume_unique=True)
+        if len(keep):
+            claim_idx[dup] = global_idx[keep[rng.integers(len(keep), size=len(dup))]]
+
+        # Type 2: Amount outliers — billed 3 to 6 std devs above the CPT mean
+        multiplier = rng.uniform(3.0, 6.0, len(outlier))
+        billed[outlier] = (_CPT_MEAN[cpt[outlier]] + multiplier * _CPT_STD[cpt[outlier]]).round(2)
+        allowed[outlier] = (billed[outlier] * 0.85).round(2)
+        paid[outlier] = (allowed[outlier] * 0.90).round(2)
+
+        # Type 3: ICD-10 / CPT mismatches — an ICD-10 from a different CPT
+        for c, wrong in enumerate(_CPT_WRONG_ICD):
+            rows = mismatch[cpt[mismatch] == c]
+            icd[rows] = wrong[rng.integers(len(wrong), size=len(rows))]
+
+
+# ── Related files (data/sample schemas) ──────────────────────────
+
+def generate_related(patient_ids: np.ndarray, seed: int = SEED) -> dict[str, pd.DataFrame]:
+    """One account per patient plus payments, refunds, chargebacks and audit log rows."""
+    rng = np.random.default_rng([seed, 2])
+    n_accounts = len(patient_ids)
+    account_ids = format_ids("ACC", np.arange(1, n_accounts + 1), max(3, len(str(n_accounts))))
+
+    total_charges = rng.lognormal(8.4, 0.6, n_accounts).round(2)
+    insurance_paid = (total_charges * rng.uniform(0.3, 0.8, n_accounts)).round(2)
+    late = rng.poisson(1.2, n_accounts)
+    accounts = pd.DataFrame({
+        "account_id": account_ids,
+        "patient_balance": (total_charges - insurance_paid).round(2),
+        "total_charges": total_charges,
+        "insurance_paid": insurance_paid,
+        "historical_late_payments_12m": late,
+        "days_past_due": np.minimum(late * rng.integers(0, 25, n_accounts), 180),
+        "service_category": pd.Categorical.from_codes(
+            rng.integers(len(SERVICE_CATEGORIES), size=n_accounts), SERVICE_CATEGORIES),
+        "payer_type": pd.Categorical.from_codes(
+            rng.choice(len(PAYER_TYPES), size=n_accounts, p=PAYER_WEIGHTS), PAYER_TYPES),
+        "deductible_remaining_est": (rng.integers(0, 11, n_accounts) * 50.0),
+    })
+
+    n_payments = n_accounts * 2
+    payment_account = rng.integers(n_accounts, size=n_payments)
+    # Most accounts pay from one device; ~3% of payments come from a new one
+    device = np.where(rng.random(n_payments) < 0.03,
+                      rng.integers(n_accounts, size=n_payments), payment_account)
+    payments = pd.DataFrame({
+        "transaction_id": format_ids("TXN", np.arange(1, n_payments + 1), max(3, len(str(n_payments)))),
+        "account_id": account_ids[payment_account],
+        "amount": (rng.integers(2, 41, n_payments) * 25.0),
+        "payment_date": _random_dates(rng, n_payments),
+        "payment_method": pd.Categorical.from_codes(
+            rng.choice(len(PAYMENT_METHODS), size=n_payments, p=[0.6, 0.3, 0.1]), PAYMENT_METHODS),
+        "device_id": format_ids("DEV", device + 1, max(3, len(str(n_accounts)))),
+    })
+
+    refund_rows = rng.choice(n_payments, size=max(1, n_payments // 20), replace=False)
+    refunds = pd.DataFrame({
+        "transaction_id": format_ids("REF", np.arange(1, len(refund_rows) + 1), max(3, len(str(len(refund_rows))))),
+        "account_id": payments["account_id"].to_numpy()[refund_rows],
+        "refund_amount": payments["amount"].to_numpy()[refund_rows],
+        "refund_date": _random_dates(rng, len(refund_rows)),
+        "reason": pd.Categorical.from_codes(
+            rng.integers(len(REFUND_REASONS), size=len(refund_rows)), REFUND_REASONS),
+    })
+
+    chargeback_rows = rng.choice(n_payments, size=max(1, n_payments // 100), replace=False)
+    chargebacks = pd.DataFrame({
+        "transaction_id": format_ids("CB", np.arange(1, len(chargeback_rows) + 1), max(3, len(str(len(chargeback_rows))))),
+        "account_id": payments["account_id"].to_numpy()[chargeback_rows],
+        "amount": payments["amount"].to_numpy()[chargeback_rows],
+        "chargeback_date": _random_dates(rng, len(chargeback_rows)),
+        "reason": pd.Categorical.from_codes(
+            rng.integers(len(CHARGEBACK_REASONS), size=len(chargeback_rows)), CHARGEBACK_REASONS),
+    })
+
+    n_logs = n_accounts
+    n_users = max(4, n_accounts // 2_000)
+    timestamps = np.sort(
+        np.datetime64("2025-01-01T00:00:00") + rng.integers(0, 365 * 86_400, n_logs).astype("timedelta64[s]")
     )
+    audit_log = pd.DataFrame({
+        "log_id": format_ids("LOG", np.arange(1, n_logs + 1), max(3, len(str(n_logs)))),
+        "user_id": format_ids("USR", rng.integers(1, n_users + 1, n_logs), 3),
+        "action": pd.Categorical.from_codes(
+            rng.choice(len(AUDIT_ACTIONS), size=n_logs, p=[0.8, 0.15, 0.05]), AUDIT_ACTIONS),
+        "resource": pd.Categorical.from_codes(
+            rng.integers(len(AUDIT_RESOURCES), size=n_logs), AUDIT_RESOURCES),
+        "timestamp": pd.to_datetime(timestamps).strftime("%Y-%m-%dT%H:%M:%SZ"),
+    })
 
     return {
-        "claim_id": f"CLM-{idx:07d}",
-        "patient_id": random.choice(PATIENT_IDS),
-        "provider_id": random.choice(PROVIDER_IDS),
-        "cpt_code": cpt,
-        "icd10_code": icd10,
-        "billed_amount": billed,
-        "allowed_amount": allowed,
-        "paid_amount": paid,
-        "service_date": service_date.isoformat(),
-        "claim_status": status,
+        "accounts": accounts, "payments": payments, "refunds": refunds,
+        "chargebacks": chargebacks, "audit_log": audit_log,
     }
 
 
-def _inject_anomalies(rows: list[dict]) -> list[dict]:
-    """Inject ~5% anomalies across three types."""
-    anomaly_indices = random.sample(range(len(rows)), NUM_ANOMALIES)
-    random.shuffle(anomaly_indices)
-
-    # Split evenly across three anomaly types
-    chunk = NUM_ANOMALIES // 3
+def _random_dates(rng: np.random.Generator, n: int) -> pd.Index:
+    days = rng.integers(0, 365, n).astype("timedelta64[D]")
+    return pd.to_datetime(np.datetime64("2025-01-01") + days).strftime("%Y-%m-%d")
 
-    # Type 1: Duplicate claims — reuse an existing claim_id
-    dup_indices = anomaly_indices[:chunk]
-    for i in dup_indices:
-        donor = random.choice(rows[:i]) if i > 0 else rows[0]
-        rows[i]["claim_id"] = donor["claim_id"]  # duplicate ID
 
-    # Type 2: Amount outliers — billed 3+ std devs above CPT mean
-    outlier_indices = anomaly_indices[chunk : chunk * 2]
-    for i in outlier_indices:
-        cpt = rows[i]["cpt_code"]
-        info = CPT_CATALOG[cpt]
-        # 3 to 6 standard deviations above mean
-        multiplier = random.uniform(3.0, 6.0)
-        rows[i]["billed_amount"] = round(info["mean"] + multiplier * info["std"], 2)
-        rows[i]["allowed_amount"] = round(rows[i]["billed_amount"] * 0.85, 2)
-        rows[i]["paid_amount"] = round(rows[i]["allowed_amount"] * 0.90, 2)
+# ── Writers ──────────────────────────────────────────────────────
 
-    # Type 3: ICD-10 / CPT mismatches — assign an ICD-10 from a different CPT
-    mismatch_indices = anomaly_indices[chunk * 2:]
-    for i in mismatch_indices:
-        correct_icd10s = set(CPT_CATALOG[rows[i]["cpt_code"]]["icd10"])
-        wrong_codes = [c for c in ALL_ICD10 if c not in correct_icd10s]
-        if wrong_codes:
-            rows[i]["icd10_code"] = random.choice(wrong_codes)
+class ChunkWriter:
+    """Append DataFrame chunks to one CSV or Parquet file."""
 
-    return rows
+    def __init__(self, path: str, fmt: str):
+        self.path = path
+        self.fmt = fmt
+        self._parquet = None
+        self._header = True
+        if os.path.exists(path):
+            os.remove(path)
 
+    def write(self, df: pd.DataFrame):
+        if self.fmt == "csv":
+            df.to_csv(self.path, mode="a", header=self._header, index=False)
+            self._header = False
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._parquet is None:
+            self._parquet = pq.ParquetWriter(self.path, table.schema)
+        self._parquet.write_table(table)
 
-def main():
-    print(f"Generating {TOTAL_ROWS:,} billing records...")
-
-    # Generate all normal rows
-    rows = [_generate_normal_row(i) for i in range(TOTAL_ROWS)]
-
-    # Inject anomalies
-    rows = _inject_anomalies(rows)
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
 
-    df = pd.DataFrame(rows)
 
-    # Shuffle so anomalies aren't clustered
-    df = df.sample(frac=1, random_state=42).reset_index(drop=True)
-
-    # Stats
-    dup_count = df["claim_id"].duplicated(keep=False).sum()
-    print(f"  Duplicate claim_id rows:  {dup_count}")
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic billing data.")
+    parser.add_argument("--rows", type=int, default=TOTAL_ROWS, help="Total claim rows")
+    parser.add_argument("--partitions", type=int, default=1, help="Number of claim files")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--out-dir", default=os.path.dirname(os.path.abspath(__file__)))
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--anomaly-rate", type=float, default=ANOMALY_RATE)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Rows generated per step")
+    parser.add_argument("--related", action="store_true",
+                        help="Also write accounts/payments/refunds/chargebacks/audit_log")
+    args = parser.parse_args()
+
+    if args.format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise SystemExit("Parquet output requires pyarrow (pip install pyarrow)")
+
+    start = time.time()
+    print(f"Generating {args.rows:,} billing records in {args.partitions} partition(s)...")
+    os.makedirs(args.out_dir, exist_ok=True)
+    generator = ClaimGenerator(args.rows, args.partitions, args.seed, args.anomaly_rate)
+
+    ext = "csv" if args.format == "csv" else "parquet"
+    if args.partitions == 1:
+        paths = [os.path.join(args.out_dir, f"claims_data.{ext}")]
+    else:
+        part_dir = os.path.join(args.out_dir, "claims_data")
+        os.makedirs(part_dir, exist_ok=True)
+        paths = [os.path.join(part_dir, f"part-{p:05d}.{ext}") for p in range(args.partitions)]
 
-    # Count amount outliers (billed > mean + 3*std for its CPT)
     outlier_count = 0
-    for cpt, group in df.groupby("cpt_code"):
-        info = CPT_CATALOG[cpt]
-        threshold = info["mean"] + 3 * info["std"]
-        outlier_count += (group["billed_amount"] > threshold).sum()
-    print(f"  Amount outliers (3+ σ):   {outlier_count}")
-
-    print(f"  Total anomaly rate:       ~{(dup_count + outlier_count) / len(df) * 100:.1f}%")
-
-    out_path = os.path.join(os.path.dirname(__file__), "claims_data.csv")
-    df.to_csv(out_path, index=False)
-    print(f"  Saved to: {out_path}")
-    print(f"  Shape:    {df.shape[0]:,} rows × {df.shape[1]} columns")
+    for p, path in enumerate(paths):
+        writer = ChunkWriter(path, args.format)
+        try:
+            for chunk in generator.partition(p, args.chunk_rows):
+                threshold = (_CPT_MEAN + 3 * _CPT_STD)[chunk["cpt_code"].cat.codes.to_numpy()]
+                outlier_count += int((chunk["billed_amount"].to_numpy() > threshold).sum())
+                writer.write(chunk)
+        finally:
+            writer.close()
+        print(f"  Saved to: {path}")
+
+    # Duplicates are injected by construction: one per dup-type anomaly
+    print(f"  Injected duplicate ids:   ~{int(args.rows * args.anomaly_rate / 3):,}")
+    print(f"  Amount outliers (3+ σ):   {outlier_count:,}")
+
+    if args.related:
+        for name, df in generate_related(generator.patient_ids, args.seed).items():
+            path = os.path.join(args.out_dir, f"{name}.{ext}")
+            writer = ChunkWriter(path, args.format)
+            writer.write(df)
+            writer.close()
+            print(f"  Saved to: {path} ({len(df):,} rows)")
+
+    print(f"  Shape:    {args.rows:,} rows × 10 columns in {time.time() - start:.1f}s")
 
 
 if __name__ == "__main__":
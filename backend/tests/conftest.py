@@ -0,0 +1,69 @@
+"""Shared fixtures: in-memory databases, synthetic claim frames and claim CSV uploads."""
+
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db.database import Base
+
+CLAIMS_CSV_HEADER = (
+    "claim_id,patient_id,provider_id,cpt_code,icd10_code,"
+    "billed_amount,allowed_amount,paid_amount,service_date,claim_status"
+)
+
+
+@pytest.fixture
+def session_factory():
+    """Open sessions, each on its own fresh in-memory SQLite database with the full schema."""
+    engines = []
+
+    def make():
+        # StaticPool keeps one connection, so the in-memory database survives commits
+        engine = create_engine(
+            "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+        )
+        Base.metadata.create_all(bind=engine)
+        engines.append(engine)
+        return sessionmaker(bind=engine)()
+
+    yield make
+    for engine in engines:
+        engine.dispose()
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def make_claims():
+    """Build a claims frame for one provider with CPT codes cycling through ``cpt_codes``."""
+    def make(n: int = 60, cpt_codes=("99213", "80053"), seed: int = 0) -> pd.DataFrame:
+        rng = np.random.default_rng(seed)
+        billed = rng.uniform(100, 200, n).round(2)
+        return pd.DataFrame({
+            "claim_id": [f"CLM-{i}" for i in range(n)],
+            "provider_id": "PRV-1",
+            "cpt_code": list(cpt_codes) * (n // len(cpt_codes)),
+            "icd10_code": "Z00.00",
+            "billed_amount": billed,
+            "allowed_amount": (billed * 0.8).round(2),
+            "paid_amount": (billed * 0.6).round(2),
+        })
+    return make
+
+
+@pytest.fixture
+def claims_csv():
+    """Build an uploaded claims CSV from data rows (the header is added)."""
+    def make(*rows: str) -> io.BytesIO:
+        return io.BytesIO("\n".join((CLAIMS_CSV_HEADER, *rows, "")).encode())
+    return make
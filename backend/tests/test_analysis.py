@@ -0,0 +1,100 @@
+"""Tests for incremental claim analysis."""
+
+from datetime import date
+
+import numpy as np
+
+import ml.registry
+from app.db.models import AnomalyFlag, Claim, ProviderStats
+from app.services.claim_analysis_service import run_claim_analysis, training_sample
+from app.services.stats_service import reconcile_stats
+from ml import serving
+from ml.registry import ModelRegistry
+
+
+def _add_claims(db, per_provider=30, start=0):
+    rng = np.random.default_rng(start)
+    for p in range(20):
+        for i in range(start, start + per_provider):
+            billed = round(float(rng.uniform(100, 200)), 2)
+            # PRV-7 bills exactly the allowed amount on every claim
+            allowed = billed if p == 7 else round(billed / rng.uniform(1.2, 1.6), 2)
+            db.add(Claim(
+                claim_id=f"CLM-{p}-{i}", patient_id="PAT-1", provider_id=f"PRV-{p}",
+                cpt_code=["99213", "80053"][i % 2], icd10_code="Z00.00",
+                billed_amount=billed, allowed_amount=allowed, paid_amount=round(allowed * 0.8, 2),
+                service_date=date(2024, 1, 1), claim_status="paid",
+            ))
+    db.commit()
+
+
+def test_provider_flags_do_not_depend_on_batch_boundaries(tmp_path, monkeypatch, session_factory):
+    registry = ModelRegistry(str(tmp_path))
+    monkeypatch.setattr(serving, "_cache", serving.DetectorCache(str(tmp_path / "model.joblib"), registry))
+    monkeypatch.setattr(ml.registry, "ModelRegistry", lambda: registry)
+
+    flags = {}
+    for batch_size in (15, 10_000):
+        db = session_factory()
+        _add_claims(db)
+        result = run_claim_analysis(db, batch_size=batch_size)
+        assert result["total_scored"] == 600
+        flags[batch_size] = dict(db.query(AnomalyFlag.claim_id, AnomalyFlag.flag_reason))
+
+    # 15-row batches never hold more than 15 of PRV-7's 30 claims, yet the
+    # provider is judged on its whole history either way
+    assert flags[15] == flags[10_000]
+    assert all(f"CLM-7-{i}" in flags[15] for i in range(30))
+    # The first model was trained on every claim, not the first batch
+    assert registry.manifest(registry.current_version())["training_rows"] == 600
+
+
+def test_rescoring_already_flagged_claims_reports_no_new_flags(tmp_path, monkeypatch, db):
+    registry = ModelRegistry(str(tmp_path))
+    monkeypatch.setattr(serving, "_cache", serving.DetectorCache(str(tmp_path / "model.joblib"), registry))
+    monkeypatch.setattr(ml.registry, "ModelRegistry", lambda: registry)
+
+    _add_claims(db)
+    first = run_claim_analysis(db)
+    assert first["new_flags"] == db.query(AnomalyFlag).count() > 0
+
+    # Re-queue every claim; their flags already exist and are skipped on insert
+    db.query(Claim).update({"scored_at": None})
+    db.commit()
+    second = run_claim_analysis(db)
+    assert second["total_scored"] == 600
+    assert second["new_flags"] == 0
+    assert second["flagged_percentage"] == 0
+
+
+def test_later_runs_update_provider_stats_from_new_claims_only(tmp_path, monkeypatch, db):
+    registry = ModelRegistry(str(tmp_path))
+    monkeypatch.setattr(serving, "_cache", serving.DetectorCache(str(tmp_path / "model.joblib"), registry))
+    monkeypatch.setattr(ml.registry, "ModelRegistry", lambda: registry)
+
+    _add_claims(db)
+    run_claim_analysis(db)
+    assert db.get(ProviderStats, "PRV-7").flagged
+
+    _add_claims(db, per_provider=2, start=30)
+    second = run_claim_analysis(db)
+    assert second["total_scored"] == 40
+    # PRV-7 was flagged already: its new claims are flagged in-batch and
+    # the refresh has no history to backfill
+    assert second["layer_breakdown"]["provider_anomalies"] == 2
+    reasons = dict(db.query(AnomalyFlag.claim_id, AnomalyFlag.flag_reason).filter(
+        AnomalyFlag.claim_id.in_(["CLM-7-30", "CLM-7-31"])
+    ))
+    assert all("anomalous provider pattern" in reason for reason in reasons.values()) and len(reasons) == 2
+    assert db.get(ProviderStats, "PRV-7").claim_count == 32
+    assert reconcile_stats(db)["drift"] == {}
+
+
+def test_training_sample_spans_the_table_without_sorting_it(db):
+    _add_claims(db)
+    assert len(training_sample(db)) == 600
+
+    sample = training_sample(db, max_rows=100)
+    assert 0 < len(sample) <= 100
+    assert sample["id"].is_unique
+    assert sample["id"].min() <= 6 and sample["id"].max() >= 595
@@ -0,0 +1,22 @@
+"""Tests for per-CPT Isolation Forest training and scoring."""
+
+import numpy as np
+import pandas as pd
+
+from ml.anomaly_detector import _score_cpt_model, score_with_per_cpt_models, train_per_cpt_models
+
+
+def test_pooled_scoring_matches_serial(make_claims):
+    df = make_claims(400, cpt_codes=("99213", "80053", "71046", "85025"), seed=1)
+    models = train_per_cpt_models(df, n_workers=1)
+    for model in models.values():
+        model.set_params(n_jobs=-1)  # as saved by older releases
+
+    serial = score_with_per_cpt_models(df, models, n_workers=1)
+    pooled = score_with_per_cpt_models(df, models, n_workers=2)
+    pd.testing.assert_frame_equal(serial, pooled)
+
+    # Scoring caps the forest at the worker's thread budget
+    model = models["99213"]
+    _score_cpt_model("99213", model, np.zeros((1, model.n_features_in_)), 1)
+    assert model.n_jobs == 1
@@ -0,0 +1,61 @@
+"""Tests for out-of-core two-pass batch scoring."""
+
+import numpy as np
+import pandas as pd
+
+from ml.anomaly_detector import AnomalyDetector
+from ml.batch_scoring import DuplicateIndex, hash_claim_ids, score_in_batches, write_flagged
+
+SCORED_COLUMNS = [
+    "anomaly_score", "is_anomaly", "_layer1_dup", "_layer1_mismatch", "_layer2_if", "_layer3_provider",
+]
+
+
+def _claims(make_claims, n: int = 600) -> pd.DataFrame:
+    df = make_claims(n, seed=2)
+    df["patient_id"] = "PAT-1"
+    df["provider_id"] = [f"PRV-{i % 20}" for i in range(n)]
+    df["allowed_amount"] = (df["billed_amount"] / np.random.default_rng(3).uniform(1.2, 1.6, n)).round(2)
+    # PRV-7 bills exactly the allowed amount; duplicates span chunks
+    df.loc[df["provider_id"] == "PRV-7", "allowed_amount"] = df["billed_amount"]
+    df.loc[[450, 590], "claim_id"] = ["CLM-3", "CLM-10"]
+    return df
+
+
+def _source(df: pd.DataFrame, chunk_size: int):
+    def chunks():
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+    return chunks
+
+
+def test_two_pass_scoring_matches_whole_frame_scoring(make_claims):
+    df = _claims(make_claims)
+    detector = AnomalyDetector(n_workers=1).train(df)
+
+    expected = detector.score(df)
+    batched = pd.concat(score_in_batches(_source(df, 100), detector))
+
+    pd.testing.assert_frame_equal(batched[SCORED_COLUMNS], expected[SCORED_COLUMNS])
+    assert batched.loc[[3, 10, 450, 590], "_layer1_dup"].all()
+    assert batched.loc[df["provider_id"] == "PRV-7", "_layer3_provider"].all()
+
+
+def test_duplicate_index_spills_and_finds_cross_chunk_duplicates():
+    index = DuplicateIndex(partitions=4)
+    index.add(hash_claim_ids(pd.Series(["A", "B", "C"])))
+    index.add(hash_claim_ids(pd.Series(["D", "A"])))
+    index.finalize()
+    assert index.contains(hash_claim_ids(pd.Series(["A", "B", "D"]))).tolist() == [True, False, False]
+
+
+def test_write_flagged_writes_one_header(tmp_path):
+    quiet = pd.DataFrame({col: [False] for col in SCORED_COLUMNS}).assign(
+        claim_id="CLM-1", provider_id="PRV-1", cpt_code="99213", anomaly_score=0.1,
+    )
+    loud = quiet.assign(is_anomaly=True, claim_id="CLM-2")
+    out = tmp_path / "flags.csv"
+
+    assert write_flagged(iter([quiet, quiet, loud, loud]), str(out)) == 2
+    assert out.read_text().count("claim_id") == 1
+    assert list(pd.read_csv(out)["claim_id"]) == ["CLM-2", "CLM-2"]
@@ -0,0 +1,64 @@
+"""Tests for compiled Isolation Forest scoring."""
+
+import pickle
+
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+from ml.anomaly_detector import COMPILED_MAX_ROWS, _score_cpt_model
+from ml.compiled_forest import CompiledForest, LazyForests
+
+
+def test_compiled_forest_matches_sklearn_scores():
+    rng = np.random.default_rng(0)
+    X = rng.lognormal(5, 1, size=(500, 4)).astype(np.float32)
+    model = IsolationForest(n_estimators=50, max_features=0.8, contamination=0.05, random_state=42).fit(X)
+
+    compiled = CompiledForest.from_isolation_forest(model)
+
+    assert compiled.n_trees == 50
+    np.testing.assert_allclose(compiled.decision_function(X), model.decision_function(X), atol=1e-9)
+
+
+def test_saved_forest_is_memory_mapped_and_pickles_by_path(tmp_path):
+    X = np.random.default_rng(1).normal(size=(200, 4)).astype(np.float32)
+    model = IsolationForest(n_estimators=10, random_state=0).fit(X)
+    meta = CompiledForest.from_isolation_forest(model).save(str(tmp_path / "99213"))
+
+    forests = LazyForests(str(tmp_path), {"99213": {"dir": "99213", "forest": meta}})
+    assert "99213" in forests and forests.loaded_count == 0
+
+    forest = forests["99213"]
+    assert forests.loaded_count == 1
+    assert isinstance(forest.feature.base, np.memmap)
+    assert len(pickle.dumps(forest)) < 1_000
+    np.testing.assert_allclose(pickle.loads(pickle.dumps(forest)).decision_function(X), model.decision_function(X))
+
+
+def test_blocked_scoring_matches_one_shot():
+    rng = np.random.default_rng(2)
+    X = rng.lognormal(5, 1, size=(20_000, 4)).astype(np.float32)
+    model = IsolationForest(n_estimators=20, random_state=0).fit(X[:2_000])
+    compiled = CompiledForest.from_isolation_forest(model)
+
+    one_shot = compiled.decision_function(X, block_rows=len(X))
+    # Default blocks and a ragged final block both give identical scores
+    np.testing.assert_array_equal(compiled.decision_function(X), one_shot)
+    np.testing.assert_array_equal(compiled.decision_function(X, block_rows=3_000), one_shot)
+    np.testing.assert_allclose(one_shot, model.decision_function(X), atol=1e-9)
+
+
+def test_large_groups_score_through_the_saved_estimator(tmp_path):
+    X = np.random.default_rng(3).lognormal(5, 1, size=(2 * COMPILED_MAX_ROWS, 4)).astype(np.float32)
+    model = IsolationForest(n_estimators=20, random_state=0).fit(X)
+    meta = CompiledForest.from_isolation_forest(model).save(str(tmp_path / "99213"))
+    forest = CompiledForest.load(str(tmp_path / "99213"), meta)
+
+    # A few rows stay on the mapped arrays; the estimator is not even loaded
+    _, small, _ = _score_cpt_model("99213", forest, X[:10], 1)
+    assert forest._estimator is None
+    np.testing.assert_allclose(small, model.decision_function(X[:10]), atol=1e-9)
+
+    _, large, _ = _score_cpt_model("99213", forest, X, 1)
+    assert isinstance(forest.estimator(), IsolationForest)
+    np.testing.assert_allclose(large, model.decision_function(X), atol=1e-9)
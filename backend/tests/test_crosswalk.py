@@ -0,0 +1,21 @@
+"""Tests for the compiled CPT/ICD-10 crosswalk."""
+
+import pandas as pd
+
+from ml.crosswalk import Crosswalk
+
+
+def test_crosswalk_flags_only_invalid_pairs_for_known_cpts():
+    crosswalk = Crosswalk.from_mapping({"99213": {"Z00.00", "J06.9"}, "80053": {"E11.9"}})
+    claims = pd.DataFrame({
+        "cpt_code": [99213, "99213", "80053", "80053", "99999"],
+        "icd10_code": ["Z00.00", "E11.9", "E11.9", "UNKNOWN", "Z00.00"],
+    })
+
+    assert crosswalk.mismatches(claims).tolist() == [False, True, False, True, False]
+    assert len(crosswalk) == 2 and "80053" in crosswalk
+
+
+def test_empty_crosswalk_flags_nothing():
+    claims = pd.DataFrame({"cpt_code": ["99213"], "icd10_code": ["Z00.00"]})
+    assert not Crosswalk.empty().mismatches(claims).any()
@@ -0,0 +1,55 @@
+"""Tests for keyset pagination of anomaly flags."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db.models import AnomalyFlag, Claim
+from app.services.flag_query_service import list_flags
+
+
+def _add_flags(db, n: int = 23):
+    start = datetime(2024, 1, 1)
+    for i in range(n):
+        db.add(Claim(
+            claim_id=f"CLM-{i:03d}", patient_id="PAT-1", provider_id="PRV-1", cpt_code="99213",
+            icd10_code="Z00.00", billed_amount=100, allowed_amount=80, paid_amount=60,
+            service_date=start.date(), claim_status="paid",
+        ))
+        # Repeated scores and timestamps: the id tie-breaker must keep pages disjoint
+        db.add(AnomalyFlag(
+            claim_id=f"CLM-{i:03d}", anomaly_score=-0.1 - (i % 4) * 0.05,
+            flag_reason="statistical amount outlier", reviewed=i % 3 == 0,
+            flagged_at=start + timedelta(hours=i // 2),
+        ))
+    db.commit()
+
+
+@pytest.mark.parametrize("sort_by", ["anomaly_score", "flagged_at", "claim_id"])
+def test_cursor_pages_match_offset_order_both_ways(sort_by, db):
+    _add_flags(db)
+    expected = [f["id"] for f in list_flags(db, sort_by, per_page=100)["flags"]]
+
+    first = list_flags(db, sort_by, per_page=5)
+    pages = [first]
+    while pages[-1]["pagination"]["next_cursor"]:
+        pages.append(list_flags(db, sort_by, per_page=5, cursor=pages[-1]["pagination"]["next_cursor"]))
+    assert [f["id"] for p in pages for f in p["flags"]] == expected
+    assert len(pages) == 5 and "total" not in pages[-1]["pagination"]
+
+    back = list_flags(db, sort_by, per_page=5, cursor=pages[-1]["pagination"]["prev_cursor"])
+    assert back["flags"] == pages[-2]["flags"]
+    assert first["pagination"]["total"] == 23 and first["pagination"]["prev_cursor"] is None
+
+
+def test_cursor_respects_filter_and_rejects_foreign_cursors(db):
+    _add_flags(db)
+    page = list_flags(db, per_page=3, reviewed=False, include_total=True)
+    assert page["pagination"]["total"] == 15
+    nxt = list_flags(db, per_page=3, reviewed=False, cursor=page["pagination"]["next_cursor"])
+    assert all(not f["reviewed"] for f in nxt["flags"])
+
+    with pytest.raises(ValueError):
+        list_flags(db, sort_by="claim_id", cursor=page["pagination"]["next_cursor"])
+    with pytest.raises(ValueError):
+        list_flags(db, cursor="not-a-cursor")
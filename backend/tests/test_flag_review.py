@@ -0,0 +1,56 @@
+"""Tests for bulk review of anomaly flags."""
+
+from datetime import date
+
+import pytest
+
+from app.db.models import AnomalyFlag, Claim
+from app.services.flag_review_service import bulk_review
+from app.services.stats_service import get_stats, reconcile_stats
+
+
+def _add_flags(db):
+    for i in range(10):
+        db.add(Claim(
+            claim_id=f"CLM-{i}", patient_id="PAT-1", provider_id=f"PRV-{i % 2}", cpt_code="99213",
+            icd10_code="Z00.00", billed_amount=100, allowed_amount=80, paid_amount=60,
+            service_date=date(2024, 1, 1), claim_status="paid",
+        ))
+        db.add(AnomalyFlag(
+            claim_id=f"CLM-{i}", provider_id=f"PRV-{i % 2}", anomaly_score=-0.1 - i * 0.01, reviewed=False,
+            flag_reason="CPT/ICD-10 coding mismatch" if i < 4 else "statistical amount outlier",
+        ))
+    db.commit()
+    reconcile_stats(db)
+
+
+def test_bulk_review_by_filter_is_idempotent(db):
+    _add_flags(db)
+    filters = {"provider_id": "PRV-0", "flag_reason": "coding mismatch"}
+
+    first = bulk_review(db, True, filters=filters)
+    assert (first["matched"], first["updated"]) == (2, 2)
+    retry = bulk_review(db, True, filters=filters)
+    assert (retry["matched"], retry["updated"]) == (2, 0)
+
+    # CLM-2, CLM-3, CLM-4; CLM-2 is already reviewed
+    by_score = bulk_review(db, True, filters={"min_score": -0.145, "max_score": -0.115})
+    assert (by_score["matched"], by_score["updated"]) == (3, 2)
+    assert get_stats(db).flags_reviewed == 4
+    assert reconcile_stats(db)["drift"] == {}
+
+
+def test_bulk_review_by_ids_reports_missing_and_unreviews(db):
+    _add_flags(db)
+    ids = db.query(AnomalyFlag.id).order_by(AnomalyFlag.id).limit(3).all()
+    ids = [i for (i,) in ids]
+
+    result = bulk_review(db, True, flag_ids=ids + [999])
+    assert (result["matched"], result["updated"], result["not_found"]) == (3, 3, [999])
+    undone = bulk_review(db, False, flag_ids=ids[:1])
+    assert undone["updated"] == 1 and get_stats(db).flags_reviewed == 2
+
+    with pytest.raises(ValueError):
+        bulk_review(db, True, filters={"currently_reviewed": False})
+    with pytest.raises(ValueError):
+        bulk_review(db, True)
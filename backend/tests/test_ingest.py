@@ -0,0 +1,121 @@
+"""Tests for the streaming claims ingest service."""
+
+import pandas as pd
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app.db.bulk_load import get_claim_loader, insert_flags
+from app.db.models import Claim, AnomalyFlag
+from app.services.claim_analysis_service import backfill_flag_attributes, refresh_provider_flags
+from app.services.claim_ingest_service import ingest_claims_csv
+from app.services.stats_service import reconcile_stats
+
+def test_ingest_streams_chunks_and_skips_duplicates(db, claims_csv):
+    rows = [
+        f"CLM-{i:04d},PAT-1,PRV-1,99213,Z00.00,150.0,120.0,100.0,2024-01-0{i % 9 + 1},paid"
+        for i in range(2500)
+    ]
+    result = ingest_claims_csv(db, claims_csv(*rows, rows[0]), chunk_size=1000)
+
+    assert result.records_inserted == 2500
+    assert result.duplicates_skipped == 1
+    assert result.errors == []
+    assert db.query(Claim).count() == 2500
+    assert db.query(Claim).first().cpt_code == "99213"
+
+    again = ingest_claims_csv(db, claims_csv(*rows[:10]), chunk_size=1000)
+    assert again.records_inserted == 0
+    assert again.duplicates_skipped == 10
+
+
+def test_sqlite_loader_skips_only_claim_id_conflicts(db):
+    loader = get_claim_loader(db)
+    df = pd.DataFrame([{
+        "claim_id": "CLM-1", "patient_id": "PAT-1", "provider_id": "PRV-1", "cpt_code": "99213",
+        "icd10_code": "Z00.00", "billed_amount": 150.0, "allowed_amount": 120.0, "paid_amount": 100.0,
+        "service_date": pd.Timestamp("2024-01-01"), "claim_status": "paid",
+    }])
+    assert loader.load(df) == 1
+    assert loader.load(df) == 0
+
+    # A constraint violation is an error, not a silently skipped "duplicate"
+    broken = df.assign(claim_id="CLM-2", patient_id=None)
+    with pytest.raises(IntegrityError):
+        loader.load(broken)
+
+
+def test_ingest_reports_invalid_rows(db, claims_csv):
+    result = ingest_claims_csv(db, claims_csv(
+        "CLM-1,PAT-1,PRV-1,99213,Z00.00,150.0,120.0,100.0,2024-01-01,paid",
+        "CLM-2,PAT-1,PRV-1,99213,Z00.00,-5,120.0,100.0,2024-01-01,paid",
+        "CLM-3,PAT-1,PRV-1,99213,Z00.00,abc,120.0,100.0,not-a-date,paid",
+    ))
+
+    assert result.records_inserted == 1
+    assert result.errors[0] == "Row 1: billed_amount must be a non-negative number"
+    assert "service_date is not a valid date" in result.errors[1]
+
+
+def test_provider_refresh_flags_unflagged_claims_once(db, claims_csv):
+    rows = [
+        f"CLM-{i:03d},PAT-1,PRV-{i % 3},99213,Z00.00,{150 + i % 7}.0,120.0,100.0,2024-01-01,paid"
+        for i in range(60)
+    ] + [
+        # Bills exactly the allowed amount every time: a "consistent biller"
+        f"CLM-X{i:02d},PAT-2,PRV-X,99213,Z00.00,120.0,120.0,100.0,2024-01-01,paid"
+        for i in range(25)
+    ]
+    ingest_claims_csv(db, claims_csv(*rows))
+    db.query(Claim).update({"scored_at": Claim.created_at})
+    db.commit()
+    # Already flagged by Layers 1 / 2 before the provider looked anomalous
+    insert_flags(db, ["CLM-X00", "CLM-X01"], [-0.05, -0.3], ["duplicate claim ID", "multivariate anomaly"])
+    db.commit()
+    reconcile_stats(db)
+
+    first = refresh_provider_flags(db)
+    assert first["flagged_providers"] == 1
+    assert (first["new_flags"], first["updated_flags"]) == (23, 2)
+    again = refresh_provider_flags(db)
+    assert (again["new_flags"], again["updated_flags"]) == (0, 0)
+    assert db.query(AnomalyFlag).filter(AnomalyFlag.claim_id.like("CLM-X%")).count() == 25
+
+    updated = dict(db.query(AnomalyFlag.claim_id, AnomalyFlag.flag_reason).filter(
+        AnomalyFlag.claim_id.in_(["CLM-X00", "CLM-X01"])
+    ))
+    assert updated == {
+        "CLM-X00": "duplicate claim ID; anomalous provider pattern",
+        "CLM-X01": "anomalous provider pattern",
+    }
+    assert db.query(AnomalyFlag.anomaly_score).filter_by(claim_id="CLM-X00").scalar() == -0.12
+    assert db.query(AnomalyFlag.anomaly_score).filter_by(claim_id="CLM-X01").scalar() == -0.3
+    assert reconcile_stats(db)["drift"] == {}
+
+
+def test_insert_flags_skips_already_flagged_claims(db, claims_csv):
+    ingest_claims_csv(db, claims_csv(
+        "CLM-1,PAT-1,PRV-1,99213,Z00.00,150.0,120.0,100.0,2024-01-01,paid",
+        "CLM-2,PAT-1,PRV-1,99213,Z00.00,150.0,120.0,100.0,2024-01-01,paid",
+    ))
+
+    assert insert_flags(db, ["CLM-1"], [-0.2], ["duplicate claim ID"]) == 1
+    assert insert_flags(db, ["CLM-1", "CLM-2"], [-0.3, -0.15], ["a", "b"]) == 1
+    assert db.query(AnomalyFlag).count() == 2
+    assert db.query(AnomalyFlag).filter_by(claim_id="CLM-1").one().flag_reason == "duplicate claim ID"
+
+
+def test_flags_carry_claim_attributes_and_backfill_fills_legacy_rows(db, claims_csv):
+    ingest_claims_csv(db, claims_csv(
+        "CLM-1,PAT-1,PRV-1,99213,Z00.00,150.0,120.0,100.0,2024-01-01,paid",
+        "CLM-2,PAT-1,PRV-2,80053,Z00.00,150.0,120.0,100.0,2024-02-01,paid",
+    ))
+    insert_flags(db, ["CLM-1"], [-0.2], ["duplicate claim ID"])
+    db.add(AnomalyFlag(claim_id="CLM-2", anomaly_score=-0.3, flag_reason="legacy"))
+    db.commit()
+
+    flag = db.query(AnomalyFlag).filter_by(claim_id="CLM-1").one()
+    assert (flag.provider_id, flag.cpt_code, str(flag.service_date)) == ("PRV-1", "99213", "2024-01-01")
+
+    assert backfill_flag_attributes(db, batch_size=1)["flags_updated"] == 1
+    legacy = db.query(AnomalyFlag).filter_by(claim_id="CLM-2").one()
+    assert (legacy.provider_id, legacy.cpt_code, str(legacy.service_date)) == ("PRV-2", "80053", "2024-02-01")
@@ -0,0 +1,97 @@
+"""Tests for SQL-side provider ranking and the stored summary cache behind insights."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.db.models import AnomalyFlag, ProviderSummary
+from app.services.insights_service import current_summaries, generate_insights, load_insight_inputs
+from ml.summarizer import FakeBackend, SummarizerOptions, generate_fallback_summaries
+
+
+def test_top_providers_and_top_k_flags(db):
+    # PRV-n gets 5 * (n + 1) flags
+    for p in range(4):
+        for i in range(5 * (p + 1)):
+            db.add(AnomalyFlag(
+                claim_id=f"CLM-{p}-{i}", provider_id=f"PRV-{p}", anomaly_score=-0.1 - i * 0.01,
+                flag_reason="statistical amount outlier; duplicate claim" if i % 2 else "duplicate claim",
+            ))
+    db.commit()
+
+    grouped, stats = load_insight_inputs(db, top_providers=2, flags_per_provider=3)
+    assert list(stats) == ["PRV-3", "PRV-2"]
+    assert stats["PRV-3"]["claim_count"] == 20
+    assert stats["PRV-3"]["reason_counts"] == {"duplicate claim": 20, "statistical amount outlier": 10}
+    # Most anomalous (lowest score) first, capped at k
+    assert [f["claim_id"] for f in grouped["PRV-3"]] == ["CLM-3-19", "CLM-3-18", "CLM-3-17"]
+
+    # Summaries report whole-provider figures, not just the sample
+    summaries = generate_fallback_summaries(grouped, provider_stats=stats)
+    assert summaries[0]["claim_count"] == 20
+    assert summaries[0]["avg_anomaly_score"] == pytest.approx(-0.195)
+
+
+def test_no_flags_raises_lookup_error(db):
+    with pytest.raises(LookupError):
+        load_insight_inputs(db)
+
+
+def test_summaries_are_cached_until_a_providers_flags_change(db):
+    for p in range(3):
+        for i in range(p + 2):
+            db.add(AnomalyFlag(
+                claim_id=f"CLM-{p}-{i}", provider_id=f"PRV-{p}", anomaly_score=-0.2, flag_reason="duplicate claim",
+            ))
+    db.commit()
+    backend = FakeBackend(latency=0.0)
+    options = SummarizerOptions(rate_per_minute=0)
+
+    first = generate_insights(db, backend, options)
+    assert (first["regenerated"], first["failed"], first["cached"], backend.calls) == (3, 0, 0, 3)
+    repeat = generate_insights(db, backend, options)
+    assert (repeat["regenerated"], repeat["cached"], backend.calls) == (0, 3, 3)
+    assert all(s["cached"] for s in repeat["summaries"])
+
+    db.add(AnomalyFlag(claim_id="CLM-0-new", provider_id="PRV-0", anomaly_score=-0.5, flag_reason="duplicate claim"))
+    db.commit()
+    changed = generate_insights(db, backend, options)
+    assert (changed["regenerated"], changed["cached"], backend.calls) == (1, 2, 4)
+
+    # Served from the table; PRV-0 now ties PRV-1 at 3 flags
+    served = current_summaries(db)
+    assert [s["provider_id"] for s in served] == ["PRV-2", "PRV-0", "PRV-1"]
+    assert served[1]["claim_count"] == 3
+
+
+def test_failed_providers_keep_a_served_summary_and_old_rows_are_pruned(db):
+    for p in range(2):
+        db.add(AnomalyFlag(claim_id=f"CLM-{p}", provider_id=f"PRV-{p}", anomaly_score=-0.2, flag_reason="duplicate claim"))
+    db.commit()
+    options = SummarizerOptions(rate_per_minute=0, max_retries=0)
+    generate_insights(db, FakeBackend(latency=0.0), options)
+    before = {s["provider_id"]: s["summary"] for s in current_summaries(db)}
+
+    # PRV-0's flags change and its call fails; PRV-2 is new and fails too
+    db.add(AnomalyFlag(claim_id="CLM-0-new", provider_id="PRV-0", anomaly_score=-0.5, flag_reason="duplicate claim"))
+    db.add(AnomalyFlag(claim_id="CLM-2", provider_id="PRV-2", anomaly_score=-0.3, flag_reason="duplicate claim"))
+    db.commit()
+    failing = FakeBackend(latency=0.0, failure_rate=1.0)
+    result = generate_insights(db, failing, options)
+    assert (result["regenerated"], result["failed"], result["cached"]) == (0, 2, 1)
+    assert result["summaries"][0]["error"]
+
+    served = current_summaries(db)
+    assert [s["provider_id"] for s in served] == ["PRV-0", "PRV-1", "PRV-2"]
+    assert served[0]["summary"] == before["PRV-0"]  # the previous summary, not the error
+    assert served[2]["source"] == "rule-based"
+
+    # The failed provider is retried next run; superseded rows go once unused for long enough
+    healthy = generate_insights(db, FakeBackend(latency=0.0), options)
+    assert (healthy["regenerated"], healthy["failed"]) == (2, 0)
+    db.query(ProviderSummary).filter(ProviderSummary.is_current == False).update(  # noqa: E712
+        {"used_at": datetime.now(timezone.utc) - timedelta(days=31)}
+    )
+    db.commit()
+    assert generate_insights(db, FakeBackend(latency=0.0), options)["pruned"] == 2
+    assert db.query(ProviderSummary).count() == 3
@@ -0,0 +1,41 @@
+"""Tests for background job input cleanup."""
+
+import json
+
+from sqlalchemy.orm import sessionmaker
+
+from app.db.models import Job
+from app.services import job_service
+
+
+def _job_with_input(db, tmp_path, monkeypatch, status="queued"):
+    # Jobs open their own sessions; point them at the test database
+    monkeypatch.setattr(job_service, "SessionLocal", sessionmaker(bind=db.get_bind()))
+
+    path = tmp_path / "upload.csv"
+    path.write_text("claim_id\n")
+    db.add(Job(id="job-1", kind="ingest", status=status, params=json.dumps({"input_path": str(path)})))
+    db.commit()
+    return path
+
+
+def test_failed_job_removes_its_input(tmp_path, monkeypatch, db):
+    path = _job_with_input(db, tmp_path, monkeypatch)
+
+    def fail(db, params, ctx):
+        raise ValueError("bad upload")
+
+    monkeypatch.setitem(job_service.JOB_HANDLERS, "ingest", fail)
+    job_service._run_job("job-1")
+
+    db.expire_all()
+    assert db.get(Job, "job-1").status == "failed"
+    assert not path.exists()
+
+
+def test_cancelling_a_queued_job_removes_its_input(tmp_path, monkeypatch, db):
+    path = _job_with_input(db, tmp_path, monkeypatch)
+
+    job = job_service.request_cancel(db, db.get(Job, "job-1"))
+    assert job.status == "cancelled"
+    assert not path.exists()
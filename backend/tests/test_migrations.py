@@ -0,0 +1,55 @@
+"""Tests for the schema migration runner."""
+
+from sqlalchemy import create_engine, inspect, text
+
+from app.db.migrations import MIGRATIONS, applied_versions, run_migrations
+
+# claims / anomaly_flags as created by the first release
+LEGACY_SCHEMA = [
+    """CREATE TABLE claims (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, claim_id VARCHAR NOT NULL UNIQUE,
+        patient_id VARCHAR NOT NULL, provider_id VARCHAR NOT NULL, cpt_code VARCHAR NOT NULL,
+        icd10_code VARCHAR NOT NULL, billed_amount FLOAT NOT NULL, allowed_amount FLOAT NOT NULL,
+        paid_amount FLOAT NOT NULL, service_date DATE NOT NULL, claim_status VARCHAR NOT NULL,
+        created_at DATETIME)""",
+    """CREATE TABLE anomaly_flags (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, claim_id VARCHAR NOT NULL REFERENCES claims (claim_id),
+        anomaly_score FLOAT NOT NULL, flag_reason VARCHAR NOT NULL, reviewed BOOLEAN NOT NULL,
+        flagged_at DATETIME)""",
+    "CREATE INDEX ix_anomaly_flags_claim_id ON anomaly_flags (claim_id)",
+    """INSERT INTO claims VALUES (1, 'CLM-1', 'PAT-1', 'PRV-1', '99213', 'Z00.00',
+        150, 120, 100, '2024-01-01', 'paid', NULL)""",
+    "INSERT INTO anomaly_flags VALUES (1, 'CLM-1', -0.2, 'duplicate claim ID', 0, NULL)",
+    "INSERT INTO anomaly_flags VALUES (2, 'CLM-1', -0.3, 'duplicate claim ID', 0, NULL)",
+]
+
+
+def test_migrations_upgrade_legacy_database_once(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.execute(text(statement))
+
+    assert run_migrations(engine) == [name for _, name, _ in MIGRATIONS]
+    assert run_migrations(engine) == []
+    assert applied_versions(engine) == {version for version, _, _ in MIGRATIONS}
+
+    inspector = inspect(engine)
+    assert {"scored_at", "model_version"} <= {c["name"] for c in inspector.get_columns("claims")}
+    assert {"provider_id", "cpt_code", "service_date"} <= {c["name"] for c in inspector.get_columns("anomaly_flags")}
+    assert "jobs" in inspector.get_table_names()
+    flag_indexes = {ix["name"]: ix for ix in inspector.get_indexes("anomaly_flags")}
+    assert flag_indexes["ix_anomaly_flags_claim_id"]["unique"]
+    assert flag_indexes["ix_anomaly_flags_reviewed_score"]["column_names"] == ["reviewed", "anomaly_score", "id"]
+    assert "ix_claims_service_date" in {ix["name"] for ix in inspector.get_indexes("claims")}
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT id FROM anomaly_flags")).scalars().all() == [1]
+        seeded = conn.execute(text("SELECT claims_total, flags_total, flag_score_sum FROM pipeline_stats")).one()
+        assert tuple(seeded) == (1, 1, -0.2)
+
+
+def test_migrations_create_new_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+    run_migrations(engine)
+    assert {"claims", "anomaly_flags", "jobs", "schema_migrations"} <= set(inspect(engine).get_table_names())
@@ -0,0 +1,24 @@
+"""Tests for the versioned model registry."""
+
+from ml.registry import ModelRegistry
+
+
+def test_retrain_refits_only_changed_cpt_groups(tmp_path, make_claims):
+    registry = ModelRegistry(str(tmp_path))
+    df = make_claims()
+
+    first = registry.retrain(df, n_workers=1)
+    assert first["refitted"] == ["80053", "99213"]
+
+    # Same rows in another order: nothing to refit
+    unchanged = registry.retrain(df.sample(frac=1, random_state=1), n_workers=1)
+    assert unchanged["refitted"] == [] and unchanged["reused"] == 2
+
+    drifted = df.copy()
+    drifted.loc[drifted["cpt_code"] == "99213", "billed_amount"] *= 3
+    report = registry.retrain(drifted, n_workers=1)
+    assert report["refitted"] == ["99213"]
+    assert set(registry.load().models) == {"80053", "99213"}
+
+    assert registry.rollback() == unchanged["version"]
+    assert registry.current_version() == unchanged["version"]
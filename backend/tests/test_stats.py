@@ -0,0 +1,62 @@
+"""Tests for the pipeline stats rollup."""
+
+from datetime import date
+
+from sqlalchemy import event
+
+from app.db.bulk_load import insert_flags
+from app.db.models import AnomalyFlag, PipelineStats
+from app.routers.analyze import mark_reviewed
+from app.services.claim_ingest_service import ingest_claims_csv
+from app.services.stats_service import compute_stats, get_stats, reconcile_stats
+
+def test_writers_keep_rollup_in_step_with_tables(db, claims_csv):
+    assert get_stats(db).claims_total == 0  # Seeded on first read
+
+    rows = [f"CLM-{i},PAT-1,PRV-1,99213,Z00.00,150.0,120.0,100.0,2024-01-{i + 10},paid" for i in range(5)]
+    ingest_claims_csv(db, claims_csv(*rows, *rows[:2]))
+    insert_flags(db, ["CLM-0", "CLM-1"], [-0.2, -0.3], ["a", "b"])
+    insert_flags(db, ["CLM-1", "CLM-2"], [-0.9, -0.1], ["a", "b"])  # CLM-1 already flagged
+    db.commit()
+
+    flag_id = db.query(AnomalyFlag.id).filter_by(claim_id="CLM-2").scalar()
+    mark_reviewed(flag_id, db)
+    mark_reviewed(flag_id, db)
+    mark_reviewed(flag_id, db)
+
+    stats = get_stats(db)
+    assert (stats.claims_total, stats.flags_total, stats.flags_reviewed) == (5, 3, 1)
+    assert round(stats.flag_score_sum, 6) == -0.6
+    assert (stats.service_date_min, stats.service_date_max) == (date(2024, 1, 10), date(2024, 1, 14))
+    assert reconcile_stats(db)["drift"] == {}
+
+
+def test_reconcile_reports_and_corrects_drift(db):
+    reconcile_stats(db)
+    db.query(PipelineStats).update({"claims_total": 42})
+    db.commit()
+
+    drift = reconcile_stats(db)["drift"]
+    assert drift == {"claims_total": {"stored": 42, "actual": 0}}
+    assert get_stats(db).claims_total == compute_stats(db)["claims_total"] == 0
+
+
+def test_ingest_updates_rollup_once_just_before_commit(db, claims_csv):
+    get_stats(db)
+    db.commit()
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute",
+                 lambda conn, cursor, sql, *args: statements.append(sql.split()[0:2]))
+    event.listen(db.get_bind(), "commit", lambda conn: statements.append(["COMMIT"]))
+
+    rows = [f"CLM-{i},PAT-1,PRV-1,99213,Z00.00,150.0,120.0,100.0,2024-02-{i % 28 + 1:02d},paid" for i in range(50)]
+    ingest_claims_csv(db, claims_csv(*rows), chunk_size=10)
+
+    # Five chunks, one rollup UPDATE, issued as the transaction's last statement
+    rollup = [i for i, sql in enumerate(statements) if sql == ["UPDATE", "pipeline_stats"]]
+    assert len(rollup) == 1
+    assert statements[rollup[0] + 1] == ["COMMIT"]
+    stats = get_stats(db)
+    assert stats.claims_total == 50
+    assert (stats.service_date_min, stats.service_date_max) == (date(2024, 2, 1), date(2024, 2, 28))
+    assert reconcile_stats(db)["drift"] == {}
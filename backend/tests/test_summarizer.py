@@ -0,0 +1,52 @@
+"""Tests for concurrent, rate-limited summarization against the fake backend."""
+
+import asyncio
+import time
+
+from ml.summarizer import FakeBackend, SummarizerOptions, TokenBucket, agenerate_summaries, generate_summaries
+
+
+def _grouped(providers: int) -> dict[str, list[dict]]:
+    return {
+        f"PRV-{p}": [{"claim_id": f"CLM-{p}", "anomaly_score": -0.2, "flag_reason": "duplicate claim"}]
+        for p in range(providers)
+    }
+
+
+def test_concurrency_is_bounded_and_order_kept():
+    backend = FakeBackend(latency=0.05)
+    options = SummarizerOptions(concurrency=4, rate_per_minute=0)
+
+    start = time.perf_counter()
+    summaries = generate_summaries(_grouped(12), backend=backend, options=options)
+    elapsed = time.perf_counter() - start
+
+    assert [s["provider_id"] for s in summaries] == [f"PRV-{p}" for p in range(12)]
+    assert backend.max_in_flight == 4 and backend.calls == 12
+    assert elapsed < 12 * 0.05  # 3 waves, not 12 sequential calls
+    assert summaries[0]["source"] == "fake" and "PRV-0" in summaries[0]["summary"]
+
+
+def test_transient_failures_are_retried_and_timeouts_reported():
+    flaky = FakeBackend(latency=0.0, failure_rate=0.5, seed=1)
+    options = SummarizerOptions(rate_per_minute=0, max_retries=10, backoff_base=0.001)
+    summaries = asyncio.run(agenerate_summaries(_grouped(6), flaky, options=options))
+    assert not any(s["summary"].startswith("Unable") for s in summaries)
+    assert flaky.calls > 6
+
+    slow = FakeBackend(latency=1.0)
+    options = SummarizerOptions(rate_per_minute=0, timeout=0.02, max_retries=1, backoff_base=0.001)
+    (summary,) = asyncio.run(agenerate_summaries(_grouped(1), slow, options=options))
+    assert "timed out" in summary["summary"] and slow.calls == 2
+
+
+def test_token_bucket_paces_after_burst():
+    async def take(n):
+        bucket = TokenBucket(rate=50, capacity=2)
+        start = time.perf_counter()
+        for _ in range(n):
+            await bucket.acquire()
+        return time.perf_counter() - start
+
+    # 2 immediate, then 4 more at 50/s
+    assert asyncio.run(take(6)) >= 4 / 50 * 0.9
@@ -0,0 +1,22 @@
+"""Tests for detector telemetry."""
+
+from ml import telemetry
+from ml.anomaly_detector import AnomalyDetector
+
+
+def test_train_and_score_record_layer_and_cpt_metrics(make_claims):
+    telemetry.REGISTRY.reset()
+    df = make_claims()
+    AnomalyDetector(n_workers=1).train(df).score(df)
+
+    for layer in ["features", "duplicates", "crosswalk", "if", "provider", "total"]:
+        assert telemetry.LAYER_SECONDS.count(op="score", layer=layer) == 1
+    assert telemetry.LAYER_ROWS.value(op="score", layer="if") == 60
+    assert telemetry.LAYER_SECONDS.count(op="train", layer="if") == 1
+    assert telemetry.CPT_ROWS.value(op="train", cpt_code="99213") == 30
+    assert telemetry.CPT_SECONDS.count(op="score", cpt_code="80053") == 1
+
+    text = telemetry.render()
+    assert '# TYPE anomaly_layer_seconds histogram' in text
+    assert 'anomaly_layer_seconds_bucket{op="score",layer="if",le="+Inf"} 1' in text
+    assert 'anomaly_layer_seconds_count{op="score",layer="if"} 1' in text